@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+import os
+import json
+import shutil
+import time
+import sqlite3
+import argparse
+import platform
+import tempfile
+import threading
+import resource
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import logging
+
+from calculate_indicators import IndicatorCalculator
+from capture_kraken_5min import KrakenCollector
+from candle_store import candle_store
+from columnar_store import ColumnarExporter, ColumnarCandles
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+TABLE = "maria_helena_candles_5min"
+DEFAULT_SIZES = [1000, 100000, 1000000, 10000000]
+
+# Candles por chamada ao store_multiple_5min (como um coletor gravando em lotes)
+INSERT_BATCH = 100000
+
+# Acima disso a janela do LSTM (60 x float64 por amostra) não cabe numa máquina comum
+LSTM_MAX_ROWS = 1000000
+
+
+class RSSSampler:
+    """Amostra o RSS do processo em segundo plano para medir o pico de cada etapa"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.page_size = os.sysconf("SC_PAGE_SIZE")
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def current(self):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self.page_size
+        except OSError:
+            # Sem /proc: pico do processo inteiro (KB no Linux)
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.start_rss = self.current()
+        self.peak = self.start_rss
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def measure(stages, name, func):
+    """Executa uma etapa, registrando tempo e memória, e devolve o resultado"""
+    with RSSSampler() as sampler:
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+
+    stages[name] = {
+        "seconds": round(elapsed, 6),
+        "peak_rss_mb": round(sampler.peak / 2**20, 2),
+        "rss_growth_mb": round((sampler.peak - sampler.start_rss) / 2**20, 2),
+    }
+    logging.info(f"   ⏱️ {name}: {elapsed:.3f}s | pico {sampler.peak / 2**20:.0f} MB")
+    return result
+
+
+def synthetic_batches(rows, batch=INSERT_BATCH, seed=42):
+    """Gera candles OHLCV sintéticos de 5 min (random walk) em lotes de dicts"""
+    rng = np.random.default_rng(seed)
+    last_close = 30000.0
+    for start in range(0, rows, batch):
+        size = min(batch, rows - start)
+        close = last_close + np.cumsum(rng.normal(0, 25, size))
+        open_ = np.concatenate([[last_close], close[:-1]])
+        high = np.maximum(open_, close) + np.abs(rng.normal(0, 10, size))
+        low = np.minimum(open_, close) - np.abs(rng.normal(0, 10, size))
+        volume = np.abs(rng.normal(10, 3, size))
+        open_time = (np.arange(start, start + size, dtype=np.int64) * 300000).tolist()
+        last_close = float(close[-1])
+
+        yield [
+            {
+                "openTime": t,
+                "closeTime": t + 300000,
+                "open": o,
+                "high": h,
+                "low": l,
+                "close": c,
+                "volume": v,
+            }
+            for t, o, h, l, c, v in zip(open_time, open_.tolist(), high.tolist(),
+                                        low.tolist(), close.tolist(), volume.tolist())
+        ]
+
+
+def lstm_windows(close, lookback=60):
+    """Mesma janela deslizante dos scripts LSTM (CÉLULA 3), com MinMax em NumPy"""
+    data = close.reshape(-1, 1)
+    scaled = (data - data.min()) / (data.max() - data.min())
+
+    X_train = []
+    y_train = []
+    for i in range(lookback, len(scaled)):
+        X_train.append(scaled[i-lookback:i, 0])
+        y_train.append(scaled[i, 0])
+
+    X_train = np.array(X_train)
+    y_train = np.array(y_train)
+    return np.reshape(X_train, (X_train.shape[0], X_train.shape[1], 1)), y_train
+
+
+def run_size(rows, workdir):
+    """Roda todas as etapas para uma tabela de `rows` candles"""
+    logging.info(f"📊 {rows:,} candles")
+    db_path = os.path.join(workdir, f"bench_{rows}.sqlite")
+    stages = {}
+
+    collector = KrakenCollector(db_path=db_path)
+
+    def insert():
+        for batch in synthetic_batches(rows):
+            if not collector.store_multiple_5min(batch):
+                raise RuntimeError("store_multiple_5min falhou")
+
+    measure(stages, "insert", insert)
+
+    calc = IndicatorCalculator(db_path=db_path)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    calc.ensure_indicator_columns(cursor, TABLE)
+    conn.commit()
+
+    columns = measure(stages, "read", lambda: calc.read_columns(conn, TABLE))
+
+    close = pd.Series(columns['close'], copy=False)
+    high = pd.Series(columns['high'], copy=False)
+    low = pd.Series(columns['low'], copy=False)
+    volume = pd.Series(columns['volume'], copy=False)
+
+    indicators = {
+        "ema_200": lambda: calc.calculate_ema(close, period=200),
+        "sma_short": lambda: calc.calculate_sma(close, period=20),
+        "sma_long": lambda: calc.calculate_sma(close, period=50),
+        "rsi_14": lambda: calc.calculate_rsi(close, period=14),
+        "atr_14": lambda: calc.calculate_atr(high, low, close, period=14),
+        "bollinger": lambda: calc.calculate_bollinger_bands(close, period=20),
+        "macd": lambda: calc.calculate_macd(close),
+        "donchian": lambda: calc.calculate_donchian_channels(high, low, period=20),
+        "obv": lambda: calc.calculate_obv(close, volume),
+    }
+    for name, func in indicators.items():
+        measure(stages, f"compute.{name}", func)
+
+    values, _ = measure(stages, "compute.all", lambda: calc.compute_into(columns))
+
+    def write_back():
+        updated = calc.write_indicators(cursor, columns['id'], values, TABLE)
+        conn.commit()
+        return updated
+
+    measure(stages, "write_back", write_back)
+    conn.close()
+
+    # Ponta a ponta, como no cron (valores já gravados: mede leitura + cálculo + diff)
+    measure(stages, "update_indicators", lambda: calc.update_indicators(tables=[TABLE], full=True))
+
+    # Cópia colunar: exportação completa e abertura a frio + último dia (não depende do tamanho)
+    columnar_dir = os.path.join(workdir, f"columnar_{rows}")
+    measure(stages, "columnar.export",
+            lambda: ColumnarExporter(columnar_dir, db_path).sync_all(tables=[TABLE]))
+    measure(stages, "columnar.open_last_day", lambda: float(
+        ColumnarCandles(columnar_dir, TABLE, "BTCUSD").window(start=(rows - 288) * 300000)["close"].sum()
+    ))
+    shutil.rmtree(columnar_dir)
+
+    if rows <= LSTM_MAX_ROWS:
+        measure(stages, "lstm_windowing", lambda: lstm_windows(columns['close'].astype(np.float64)))
+    else:
+        stages["lstm_windowing"] = {"skipped": f"acima de {LSTM_MAX_ROWS} candles"}
+
+    candle_store(db_path).close()
+    stages["db_size_mb"] = round(os.path.getsize(db_path) / 2**20, 2)
+    for path in (db_path, db_path + "-wal", db_path + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    return {"rows": rows, "stages": stages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de indicadores, gravação e janelas LSTM")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="tamanhos das tabelas sintéticas (candles)")
+    parser.add_argument("--output", default=None, help="arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument("--workdir", default=None, help="diretório dos bancos temporários")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        for rows in args.sizes:
+            report["results"].append(run_size(rows, workdir))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        logging.info(f"✅ Resultados em {args.output}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,52 @@ import numpy as np
 import pandas as pd
 from datetime import datetime
 import logging
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from candle_normalizer import DEFAULT_SYMBOL
+from candle_store import DEFAULT_DB_PATH, TABLE_INTERVALS
 
 logging.basicConfig(level=logging.INFO)
 
+INDICATOR_COLUMNS = [
+    "ema_200", "sma_short", "sma_long", "rsi_14", "atr_14",
+    "bb_upper", "bb_lower", "macd", "macd_signal",
+    "donchian_high", "donchian_low", "obv",
+]
+
+# Estado recursivo (EMAs e OBV) que o modo incremental continua
+STATE_COLUMNS = ["ema_200", "ema_fast", "ema_slow", "macd_signal", "obv"]
+
+# Tabelas de candles com indicadores e o timeframe de cada uma (os pares vêm da coluna symbol)
+CANDLE_TABLES = {table: {"timeframe": interval} for table, interval in TABLE_INTERVALS.items()}
+
+# Maior janela rolling (sma_long): candles anteriores lidos como aquecimento
+WARMUP_CANDLES = 50
+
+# Fechamentos usados para refazer as EMAs de 12/26 ao recuar o estado: o peso do início
+# da janela, (1 - 2/27)^1000, some abaixo da precisão do float64
+REWIND_CANDLES = 1000
+
+# Candles por bloco no backfill paralelo
+BACKFILL_CHUNK_SIZE = 100000
+
+# Linhas por fetchmany/executemany nos caminhos de leitura e escrita em arrays
+IO_BATCH_SIZE = 50000
+
 class IndicatorCalculator:
-    def __init__(self, db_path="/root/.n8n/database.sqlite"):
+    def __init__(self, db_path=DEFAULT_DB_PATH, dtype=np.float64):
         self.db_path = db_path
+        # dtype dos preços/volumes carregados e dos indicadores gerados (float32 economiza metade)
+        self.dtype = dtype
     
-    def calculate_ema(self, data, period=200):
-        """Calcula EMA (Exponential Moving Average)"""
+    def calculate_ema(self, data, period=200, seed=None):
+        """Calcula EMA (Exponential Moving Average), continuando de `seed` se informado"""
+        if seed is not None:
+            seeded = pd.concat([pd.Series([seed], dtype=float), data])
+            return seeded.ewm(span=period, adjust=False).mean().iloc[1:]
         return data.ewm(span=period, adjust=False).mean()
     
     def calculate_sma(self, data, period=50):
@@ -53,11 +90,14 @@ class IndicatorCalculator:
         atr = tr.rolling(window=period).mean()
         return atr
     
-    def calculate_obv(self, close, volume):
-        """Calcula OBV (On Balance Volume)"""
+    def calculate_obv(self, close, volume, seed=0.0, prev_close=None):
+        """Calcula OBV (On Balance Volume), continuando de `seed` se informado"""
+        previous = close.shift(1)
+        if prev_close is not None and len(previous):
+            previous.iloc[0] = prev_close
         obv = volume.copy()
-        obv[close < close.shift(1)] *= -1
-        return obv.cumsum()
+        obv[close < previous] *= -1
+        return obv.cumsum() + seed
     
     def calculate_donchian_channels(self, high, low, period=20):
         """Calcula Donchian Channels"""
@@ -65,97 +105,543 @@ class IndicatorCalculator:
         donchian_low = low.rolling(window=period).min()
         return donchian_high, donchian_low
     
-    def update_indicators(self):
-        """Atualiza todos os indicadores no banco"""
-        try:
-            # Ler dados do banco
-            conn = sqlite3.connect(self.db_path)
-            df = pd.read_sql_query(
-                "SELECT id, close, high, low, volume FROM maria_helena_candles ORDER BY openTime ASC",
-                conn
+    def _rolling_series(self, close, high, low, warmup):
+        """Gera (coluna, valores) dos indicadores de janela, um por vez, a partir de `warmup`"""
+        yield 'sma_short', self.calculate_sma(close, period=20).iloc[warmup:]
+        yield 'sma_long', self.calculate_sma(close, period=50).iloc[warmup:]
+        yield 'rsi_14', self.calculate_rsi(close, period=14).iloc[warmup:]
+        yield 'atr_14', self.calculate_atr(high, low, close, period=14).iloc[warmup:]
+        
+        # Bollinger Bands
+        bb_upper, bb_lower = self.calculate_bollinger_bands(close, period=20)
+        yield 'bb_upper', bb_upper.iloc[warmup:]
+        yield 'bb_lower', bb_lower.iloc[warmup:]
+        
+        # Donchian Channels
+        donchian_high, donchian_low = self.calculate_donchian_channels(high, low, period=20)
+        yield 'donchian_high', donchian_high.iloc[warmup:]
+        yield 'donchian_low', donchian_low.iloc[warmup:]
+    
+    def _recursive_series(self, close, volume, state, warmup):
+        """Indicadores recursivos a partir de `warmup`, continuando EMAs/OBV de `state`"""
+        state = state or {}
+        new_close = close.iloc[warmup:]
+        ema_200 = self.calculate_ema(new_close, period=200, seed=state.get('ema_200'))
+        
+        # MACD
+        ema_fast = self.calculate_ema(new_close, period=12, seed=state.get('ema_fast'))
+        ema_slow = self.calculate_ema(new_close, period=26, seed=state.get('ema_slow'))
+        macd = ema_fast - ema_slow
+        macd_signal = self.calculate_ema(macd, period=9, seed=state.get('macd_signal'))
+        
+        # OBV
+        prev_close = close.iloc[warmup - 1] if warmup else None
+        obv = self.calculate_obv(
+            new_close, volume.iloc[warmup:], seed=state.get('obv') or 0.0, prev_close=prev_close
+        )
+        
+        new_state = {
+            "ema_200": float(ema_200.iloc[-1]),
+            "ema_fast": float(ema_fast.iloc[-1]),
+            "ema_slow": float(ema_slow.iloc[-1]),
+            "macd_signal": float(macd_signal.iloc[-1]),
+            "obv": float(obv.iloc[-1]),
+        }
+        series = [('ema_200', ema_200), ('macd', macd), ('macd_signal', macd_signal), ('obv', obv)]
+        return series, new_state
+    
+    def compute_rolling(self, df, warmup=0):
+        """Indicadores de janela das linhas após `warmup` (usam os candles de aquecimento)"""
+        out = pd.DataFrame(index=df.index[warmup:])
+        for col, values in self._rolling_series(df['close'], df['high'], df['low'], warmup):
+            out[col] = values
+        return out
+    
+    def compute_recursive(self, df, state=None, warmup=0):
+        """Indicadores recursivos das linhas após `warmup`, continuando EMAs/OBV de `state`"""
+        out = df.iloc[warmup:].copy()
+        series, new_state = self._recursive_series(df['close'], df['volume'], state, warmup)
+        for col, values in series:
+            out[col] = values
+        
+        new_state["last_open_time"] = int(out['openTime'].iloc[-1])
+        return out, new_state
+    
+    def compute_indicators(self, df, state=None, warmup=0):
+        """Calcula os indicadores das linhas após `warmup`, continuando EMAs/OBV de `state`"""
+        out, new_state = self.compute_recursive(df, state=state, warmup=warmup)
+        return out.join(self.compute_rolling(df, warmup=warmup)), new_state
+    
+    def compute_into(self, columns, state=None, warmup=0, out=None):
+        """Versão enxuta do compute_indicators: arrays NumPy de entrada, saída pré-alocada
+        
+        `columns` vem de read_columns; `out` é (linhas após warmup, len(INDICATOR_COLUMNS))
+        na ordem de INDICATOR_COLUMNS. Cada indicador é copiado para `out` e descartado.
+        """
+        close = pd.Series(columns['close'], copy=False)
+        high = pd.Series(columns['high'], copy=False)
+        low = pd.Series(columns['low'], copy=False)
+        volume = pd.Series(columns['volume'], copy=False)
+        
+        rows = len(close) - warmup
+        if out is None:
+            out = np.empty((rows, len(INDICATOR_COLUMNS)), dtype=self.dtype)
+        slot = {col: i for i, col in enumerate(INDICATOR_COLUMNS)}
+        
+        for col, values in self._rolling_series(close, high, low, warmup):
+            out[:, slot[col]] = values.to_numpy()
+        
+        series, new_state = self._recursive_series(close, volume, state, warmup)
+        for col, values in series:
+            out[:, slot[col]] = values.to_numpy()
+        
+        new_state["last_open_time"] = int(columns['openTime'][-1])
+        return out, new_state
+    
+    def read_columns(self, conn, table, where="", params=(), limit=None, descending=False,
+                     symbol=DEFAULT_SYMBOL):
+        """Lê id/openTime/OHLCV de `symbol` direto para arrays NumPy pré-alocados
+        
+        `where` é uma condição extra sobre as linhas do par (ex.: "openTime > ?").
+        ids e openTime em int64; preços e volume no dtype do calculador. Resultado sempre
+        em ordem crescente de openTime (mesmo com `descending`, usado com `limit`).
+        """
+        params = (symbol,) + tuple(params)
+        where = f"WHERE symbol = ? AND {where}" if where else "WHERE symbol = ?"
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {table} {where}", params)
+        rows = cursor.fetchone()[0]
+        if limit is not None:
+            rows = min(rows, limit)
+        
+        columns = {
+            'id': np.empty(rows, dtype=np.int64),
+            'openTime': np.empty(rows, dtype=np.int64),
+        }
+        for col in ('close', 'high', 'low', 'volume'):
+            columns[col] = np.empty(rows, dtype=self.dtype)
+        
+        order = "DESC" if descending else "ASC"
+        cursor.execute(
+            f"SELECT id, openTime, close, high, low, volume FROM {table} {where} "
+            f"ORDER BY openTime {order} LIMIT ?",
+            params + (rows,)
+        )
+        
+        pos = 0
+        while pos < rows:
+            batch = cursor.fetchmany(IO_BATCH_SIZE)
+            if not batch:
+                break
+            
+            # openTime (ms) e id cabem exatamente em float64 (< 2^53)
+            block = np.array(batch, dtype=np.float64)
+            end = pos + len(block)
+            for i, col in enumerate(('id', 'openTime', 'close', 'high', 'low', 'volume')):
+                columns[col][pos:end] = block[:, i]
+            pos = end
+        
+        if pos < rows:
+            columns = {col: values[:pos] for col, values in columns.items()}
+        if descending:
+            columns = {col: values[::-1] for col, values in columns.items()}
+        return columns
+    
+    def ensure_state_table(self, cursor):
+        """Cria a tabela de estado dos indicadores recursivos (uma linha por tabela e par)"""
+        cursor.execute("PRAGMA table_info(maria_helena_indicator_state)")
+        existing = [row[1] for row in cursor.fetchall()]
+        if existing and "symbol" not in existing:
+            # Estado anterior à coluna symbol: era todo do par padrão
+            cursor.execute("ALTER TABLE maria_helena_indicator_state RENAME TO maria_helena_indicator_state_old")
+        
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS maria_helena_indicator_state (
+                table_name TEXT,
+                symbol TEXT NOT NULL DEFAULT '{DEFAULT_SYMBOL}',
+                last_open_time INTEGER,
+                ema_200 REAL,
+                ema_fast REAL,
+                ema_slow REAL,
+                macd_signal REAL,
+                obv REAL,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (table_name, symbol)
+            )
+        """)
+        
+        if existing and "symbol" not in existing:
+            copied = ", ".join(existing)
+            cursor.execute(f"""
+                INSERT INTO maria_helena_indicator_state ({copied})
+                SELECT {copied} FROM maria_helena_indicator_state_old
+            """)
+            cursor.execute("DROP TABLE maria_helena_indicator_state_old")
+        
+        # Histórico dos recuos: quem copia os indicadores para fora (columnar_store) sabe
+        # de onde refazer a cópia mesmo que o recálculo já tenha alcançado o ponto anterior
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS maria_helena_indicator_rewinds (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT,
+                symbol TEXT,
+                open_time INTEGER,
+                rewound_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
+        """)
+    
+    def load_state(self, cursor, table, symbol=DEFAULT_SYMBOL):
+        """Lê o estado salvo da última execução (None se não houver)"""
+        cursor.execute(f"""
+            SELECT last_open_time, {', '.join(STATE_COLUMNS)}
+            FROM maria_helena_indicator_state WHERE table_name = ? AND symbol = ?
+        """, (table, symbol))
+        row = cursor.fetchone()
+        
+        if row is None or any(value is None for value in row):
+            return None
+        
+        return dict(zip(["last_open_time"] + STATE_COLUMNS, row))
+    
+    def save_state(self, cursor, table, state, symbol=DEFAULT_SYMBOL):
+        """Grava o estado recursivo após o último candle calculado"""
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO maria_helena_indicator_state
+            (table_name, symbol, last_open_time, {', '.join(STATE_COLUMNS)}, updated_at)
+            VALUES (?, ?, ?, {', '.join('?' for _ in STATE_COLUMNS)}, CURRENT_TIMESTAMP)
+        """, [table, symbol, state["last_open_time"]] + [state[col] for col in STATE_COLUMNS])
+    
+    def rewind_state(self, conn, table, open_time, symbol=DEFAULT_SYMBOL):
+        """Volta o estado incremental para antes de `open_time` (candle inserido/alterado no passado)
+        
+        EMA 200, sinal do MACD e OBV vêm gravados no candle anterior; as EMAs rápida/lenta
+        do MACD são refeitas sobre os últimos REWIND_CANDLES fechamentos. O próximo
+        update_indicators recalcula e grava só a partir de `open_time`.
+        """
+        cursor = conn.cursor()
+        self.ensure_state_table(cursor)
+        state = self.load_state(cursor, table, symbol)
+        if state is None or open_time > state["last_open_time"]:
+            return
+        
+        cursor.execute("INSERT INTO maria_helena_indicator_rewinds (table_name, symbol, open_time) VALUES (?, ?, ?)",
+                       (table, symbol, open_time))
+        
+        cursor.execute(f"""
+            SELECT openTime, ema_200, macd_signal, obv FROM {table}
+            WHERE symbol = ? AND openTime < ? ORDER BY openTime DESC LIMIT 1
+        """, (symbol, open_time))
+        previous = cursor.fetchone()
+        
+        if previous is None or any(value is None for value in previous):
+            # Sem candle anterior já calculado: o próximo cálculo é completo
+            cursor.execute("DELETE FROM maria_helena_indicator_state WHERE table_name = ? AND symbol = ?",
+                           (table, symbol))
+            logging.info(f"⏪ {table} {symbol}: estado descartado, próximo cálculo será completo")
+            return
+        
+        window = self.read_columns(conn, table, "openTime < ?", (open_time,),
+                                   limit=REWIND_CANDLES, descending=True, symbol=symbol)
+        close = pd.Series(window['close'], copy=False)
+        state = {
+            "last_open_time": previous[0],
+            "ema_200": previous[1],
+            "ema_fast": float(self.calculate_ema(close, period=12).iloc[-1]),
+            "ema_slow": float(self.calculate_ema(close, period=26).iloc[-1]),
+            "macd_signal": previous[2],
+            "obv": previous[3],
+        }
+        self.save_state(cursor, table, state, symbol)
+        logging.info(f"⏪ {table} {symbol}: estado recuado para {datetime.fromtimestamp(previous[0] / 1000)}")
+    
+    def write_indicators(self, cursor, ids, values, table):
+        """Grava os indicadores em lote: staging em tabela TEMP + um único UPDATE das linhas alteradas
+        
+        `values` é um array (linhas, len(INDICATOR_COLUMNS)) na ordem de INDICATOR_COLUMNS.
+        """
+        cursor.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS indicator_staging (
+                id INTEGER PRIMARY KEY,
+                {', '.join(f'{col} REAL' for col in INDICATOR_COLUMNS)}
+            )
+        """)
+        cursor.execute("DELETE FROM indicator_staging")
+        
+        # tolist() devolve int/float nativos (NaN vira NULL no SQLite); em blocos para poupar memória
+        for start in range(0, len(ids), IO_BATCH_SIZE):
+            block_ids = np.asarray(ids[start:start + IO_BATCH_SIZE]).tolist()
+            block = np.asarray(values[start:start + IO_BATCH_SIZE]).tolist()
+            cursor.executemany(f"""
+                INSERT INTO indicator_staging (id, {', '.join(INDICATOR_COLUMNS)})
+                VALUES (?, {', '.join('?' for _ in INDICATOR_COLUMNS)})
+            """, [(row_id, *row) for row_id, row in zip(block_ids, block)])
+        
+        # Só toca linhas cujo valor mudou (IS NOT trata NULL corretamente)
+        changed = " OR ".join(f"s.{col} IS NOT c.{col}" for col in INDICATOR_COLUMNS)
+        cursor.execute(f"""
+            UPDATE {table}
+            SET ({', '.join(INDICATOR_COLUMNS)}) = (
+                SELECT {', '.join(INDICATOR_COLUMNS)}
+                FROM indicator_staging s WHERE s.id = {table}.id
+            )
+            WHERE id IN (
+                SELECT s.id FROM indicator_staging s
+                JOIN {table} c ON c.id = s.id
+                WHERE {changed}
+            )
+        """)
+        updated = cursor.rowcount
+        cursor.execute("DELETE FROM indicator_staging")
+        return updated
+    
+    def ensure_indicator_columns(self, cursor, table):
+        """Adiciona as colunas de indicadores que faltarem no schema da tabela"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        
+        for col in INDICATOR_COLUMNS:
+            if col not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col} REAL")
+                logging.info(f"🔧 Coluna {col} adicionada em {table}")
+    
+    def read_candles(self, conn, table, full=False, symbol=DEFAULT_SYMBOL):
+        """Lê o que precisa ser calculado: (colunas, estado, aquecimento) ou None se já está em dia"""
+        cursor = conn.cursor()
+        state = None if full else self.load_state(cursor, table, symbol)
+        
+        if state is None:
+            columns = self.read_columns(conn, table, symbol=symbol)
             
-            if len(df) < 60:
-                logging.warning(f"⚠️ Apenas {len(df)} candles. Precisa de 60+ pra calcular indicadores.")
-                conn.close()
-                return False
+            if len(columns['id']) < 60:
+                logging.warning(f"⚠️ {table} {symbol}: apenas {len(columns['id'])} candles. Precisa de 60+ pra calcular indicadores.")
+                return None
             
-            logging.info(f"📊 Calculando indicadores para {len(df)} candles...")
+            logging.info(f"📊 {table} {symbol}: {len(columns['id'])} candles (recálculo completo)")
+            return columns, None, 0
+        
+        new_rows = self.read_columns(conn, table, "openTime > ?", (state["last_open_time"],), symbol=symbol)
+        
+        if len(new_rows['id']) == 0:
+            logging.info(f"✅ {table} {symbol}: indicadores já estão em dia")
+            return None
+        
+        # Aquecimento: últimos candles já calculados, para as janelas rolling
+        warmup = self.read_columns(conn, table, "openTime <= ?", (state["last_open_time"],),
+                                   limit=WARMUP_CANDLES, descending=True, symbol=symbol)
+        
+        logging.info(f"📊 {table} {symbol}: {len(new_rows['id'])} candles novos")
+        columns = {col: np.concatenate([warmup[col], new_rows[col]]) for col in new_rows}
+        return columns, state, len(warmup['id'])
+    
+    def ensure_symbol_column(self, cursor, table):
+        """Tabelas anteriores à coluna symbol passam pela migração do CandleStore"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if "symbol" not in {row[1] for row in cursor.fetchall()}:
+            from candle_store import candle_store
+            candle_store(self.db_path).ensure_table(table)
+    
+    def update_indicators(self, tables=None, full=False, conn=None, symbols=None):
+        """Atualiza os indicadores de todas as tabelas registradas numa única conexão
+        
+        Cada par (coluna symbol) de cada tabela é uma série independente, com seu próprio
+        estado; `symbols` restringe o cálculo a alguns pares. `conn` permite reaproveitar
+        uma conexão já aberta (ex.: o daemon de coleta); nesse caso ela não é fechada ao final.
+        """
+        tables = tables or list(CANDLE_TABLES)
+        own_conn = conn is None
+        
+        try:
+            if own_conn:
+                conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            self.ensure_state_table(cursor)
             
-            # Calcular indicadores
-            df['ema_200'] = self.calculate_ema(df['close'], period=200)
-            df['sma_short'] = self.calculate_sma(df['close'], period=20)
-            df['sma_long'] = self.calculate_sma(df['close'], period=50)
-            df['rsi_14'] = self.calculate_rsi(df['close'], period=14)
-            df['atr_14'] = self.calculate_atr(df['high'], df['low'], df['close'], period=14)
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            existing = {row[0] for row in cursor.fetchall()}
             
-            # Bollinger Bands
-            bb_upper, bb_lower = self.calculate_bollinger_bands(df['close'], period=20)
-            df['bb_upper'] = bb_upper
-            df['bb_lower'] = bb_lower
+            for table in [t for t in tables if t not in existing]:
+                logging.warning(f"⚠️ Tabela {table} não existe, ignorando")
+            tables = [t for t in tables if t in existing]
             
-            # MACD
-            macd_line, signal_line = self.calculate_macd(df['close'], fast=12, slow=26, signal=9)
-            df['macd'] = macd_line
-            df['macd_signal'] = signal_line
+            for table in tables:
+                self.ensure_symbol_column(cursor, table)
+                self.ensure_indicator_columns(cursor, table)
             
-            # Donchian Channels
-            donchian_high, donchian_low = self.calculate_donchian_channels(df['high'], df['low'], period=20)
-            df['donchian_high'] = donchian_high
-            df['donchian_low'] = donchian_low
+            # Migrações acima já gravadas; leitura de todas as séries numa única transação (snapshot consistente)
+            conn.commit()
+            cursor.execute("BEGIN")
+            series = [
+                (table, symbol)
+                for table in tables
+                for (symbol,) in cursor.execute(f"SELECT DISTINCT symbol FROM {table}").fetchall()
+                if symbols is None or symbol in symbols
+            ]
+            pending = {
+                (table, symbol): self.read_candles(conn, table, full=full, symbol=symbol)
+                for table, symbol in series
+            }
+            conn.commit()
             
-            # OBV
-            df['obv'] = self.calculate_obv(df['close'], df['volume'])
+            # Cálculo independente por série
+            results = {}
+            ok = True
+            for (table, symbol), job in pending.items():
+                if job is None:
+                    continue
+                
+                columns, state, warmup = job
+                info = CANDLE_TABLES.get(table, {})
+                try:
+                    values, new_state = self.compute_into(columns, state=state, warmup=warmup)
+                    results[table, symbol] = (columns['id'][warmup:], values, new_state)
+                except Exception as e:
+                    logging.error(f"❌ Erro ao calcular indicadores de {table} "
+                                  f"({symbol} {info.get('timeframe')}): {str(e)}")
+                    ok = False
             
             # Atualizar banco
+            for (table, symbol), (ids, values, new_state) in results.items():
+                updated = self.write_indicators(cursor, ids, values, table)
+                self.save_state(cursor, table, new_state, symbol)
+                logging.info(f"✅ {table} {symbol}: {len(ids)} candles calculados, {updated} atualizados com indicadores!")
+            
+            conn.commit()
+            return ok
+        
+        except Exception as e:
+            logging.error(f"❌ Erro ao calcular indicadores: {str(e)}")
+            # Desfaz o BEGIN e gravações parciais: o próximo commit do chamador não as leva junto
+            if conn is not None:
+                conn.rollback()
+            return False
+        
+        finally:
+            if own_conn and conn is not None:
+                conn.close()
+    
+    def iter_chunks(self, conn, table, chunk_size, symbol=DEFAULT_SYMBOL):
+        """Lê os candles do par em blocos ordenados por openTime (paginação por chave, sem OFFSET)"""
+        last_open_time = None
+        while True:
+            if last_open_time is None:
+                chunk = pd.read_sql_query(
+                    f"SELECT id, openTime, close, high, low, volume FROM {table} "
+                    "WHERE symbol = ? ORDER BY openTime ASC LIMIT ?",
+                    conn, params=(symbol, chunk_size)
+                )
+            else:
+                chunk = pd.read_sql_query(
+                    f"SELECT id, openTime, close, high, low, volume FROM {table} "
+                    "WHERE symbol = ? AND openTime > ? ORDER BY openTime ASC LIMIT ?",
+                    conn, params=(symbol, last_open_time, chunk_size)
+                )
+            
+            if chunk.empty:
+                return
+            
+            yield chunk
+            last_open_time = int(chunk['openTime'].iloc[-1])
+    
+    def backfill_indicators(self, table="maria_helena_candles", chunk_size=BACKFILL_CHUNK_SIZE, workers=None,
+                            symbol=DEFAULT_SYMBOL):
+        """Recalcula a série inteira de `symbol` em blocos, com as janelas rolling num pool de processos
+        
+        EMAs/OBV são calculados em sequência no processo principal, levando o estado de
+        um bloco para o outro; a memória fica limitada ao tamanho do bloco.
+        """
+        try:
+            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
+            self.ensure_state_table(cursor)
+            self.ensure_symbol_column(cursor, table)
+            self.ensure_indicator_columns(cursor, table)
+            conn.commit()
+            
+            workers = workers or os.cpu_count() or 1
+            state = None
+            tail = None
+            pending = deque()
+            total = 0
             
-            for idx, row in df.iterrows():
-                cursor.execute("""
-                    UPDATE maria_helena_candles
-                    SET 
-                        ema_200 = ?,
-                        sma_short = ?,
-                        sma_long = ?,
-                        rsi_14 = ?,
-                        atr_14 = ?,
-                        bb_upper = ?,
-                        bb_lower = ?,
-                        macd = ?,
-                        macd_signal = ?,
-                        donchian_high = ?,
-                        donchian_low = ?,
-                        obv = ?
-                    WHERE id = ?
-                """, (
-                    row['ema_200'],
-                    row['sma_short'],
-                    row['sma_long'],
-                    row['rsi_14'],
-                    row['atr_14'],
-                    row['bb_upper'],
-                    row['bb_lower'],
-                    row['macd'],
-                    row['macd_signal'],
-                    row['donchian_high'],
-                    row['donchian_low'],
-                    row['obv'],
-                    row['id']
-                ))
+            def flush():
+                nonlocal total
+                future, recursive = pending.popleft()
+                result = recursive.join(future.result())
+                self.write_indicators(cursor, result['id'].to_numpy(), result[INDICATOR_COLUMNS].to_numpy(), table)
+                conn.commit()
+                total += len(result)
+                logging.info(f"💾 {table} {symbol}: {total} candles gravados")
+            
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for chunk in self.iter_chunks(conn, table, chunk_size, symbol):
+                    frame = chunk if tail is None else pd.concat([tail, chunk], ignore_index=True)
+                    warmup = 0 if tail is None else len(tail)
+                    
+                    recursive, state = self.compute_recursive(frame, state=state, warmup=warmup)
+                    pending.append((pool.submit(_rolling_chunk, frame, warmup), recursive))
+                    tail = chunk.iloc[-WARMUP_CANDLES:]
+                    
+                    # Limita os blocos em memória a ~2 por worker
+                    while len(pending) > 2 * workers:
+                        flush()
+                
+                while pending:
+                    flush()
+            
+            if state is None:
+                logging.warning(f"⚠️ {table} {symbol}: nenhum candle para calcular")
+                conn.close()
+                return False
             
+            self.save_state(cursor, table, state, symbol)
             conn.commit()
             conn.close()
             
-            logging.info(f"✅ {len(df)} candles atualizados com indicadores!")
+            logging.info(f"✅ {table} {symbol}: backfill concluído ({total} candles)")
             return True
         
         except Exception as e:
-            logging.error(f"❌ Erro ao calcular indicadores: {str(e)}")
+            logging.error(f"❌ Erro no backfill de {table}: {str(e)}")
             return False
 
+
+def _rolling_chunk(df, warmup):
+    """Executado nos processos do pool (função de módulo para poder ser serializada)"""
+    return IndicatorCalculator().compute_rolling(df, warmup=warmup)
+
 def main():
-    calc = IndicatorCalculator()
-    calc.update_indicators()
+    parser = argparse.ArgumentParser(description="Calcula indicadores técnicos")
+    parser.add_argument("--full", action="store_true", help="recalcula as tabelas inteiras")
+    parser.add_argument("--table", action="append", choices=list(CANDLE_TABLES),
+                        help="tabela a calcular (padrão: todas as registradas)")
+    parser.add_argument("--backfill", action="store_true",
+                        help="recálculo completo em blocos paralelos (históricos grandes)")
+    parser.add_argument("--symbol", action="append", default=None,
+                        help="par a calcular, ex.: BTCUSD (padrão: todos os da tabela)")
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--float32", action="store_true",
+                        help="carrega preços e calcula em float32 (metade da memória)")
+    args = parser.parse_args()
+    
+    calc = IndicatorCalculator(dtype=np.float32 if args.float32 else np.float64)
+    if args.backfill:
+        from candle_store import candle_store
+        for table in args.table or list(CANDLE_TABLES):
+            for symbol in args.symbol or candle_store(calc.db_path).symbols(table):
+                calc.backfill_indicators(table, chunk_size=args.chunk_size, workers=args.workers,
+                                         symbol=symbol)
+    else:
+        from candle_store import candle_store
+        writer = candle_store(calc.db_path).writer
+        try:
+            # Escritor único no ar: o cálculo roda nele, entre os lotes de candles
+            if writer is not None:
+                return writer.update_indicators(tables=args.table, full=args.full, symbols=args.symbol,
+                                                dtype=np.dtype(calc.dtype).name)
+        except (ConnectionError, FileNotFoundError) as e:
+            logging.warning(f"⚠️ Escritor único indisponível ({str(e)}), calculando direto")
+        calc.update_indicators(tables=args.table, full=args.full, symbols=args.symbol)
 
 if __name__ == "__main__":
     main()
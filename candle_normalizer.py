@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Normalização de candles: converte o formato de cada exchange no dict usado pelo banco
+
+Todos os coletores produzem o mesmo formato:
+{"symbol", "openTime", "closeTime", "open", "high", "low", "close", "volume"} (tempos em ms).
+
+`symbol` é o par canônico (ex.: "BTCUSD"). Cada série tem uma única fonte: o mesmo par de
+duas fontes na mesma tabela se sobrescreveria a cada coleta. A Kraken é a referência (gap
+repair, backfill, stream) e usa o par puro; a Binance cota em stablecoin ("BTCUSDT") e o
+preço agregado da CoinGecko (OHLC simulado) fica em "BTCUSD.CG".
+"""
+
+# Par dos dados gravados antes da coluna symbol existir (tudo era BTC/USD)
+DEFAULT_SYMBOL = "BTCUSD"
+
+# Códigos de ativo próprios de cada exchange -> ticker comum
+ASSET_ALIASES = {"XBT": "BTC", "XDG": "DOGE"}
+
+# Moedas de cotação reconhecidas, da mais longa para a mais curta; stablecoins são mercados
+# próprios (BTCUSDT da Binance não é o BTCUSD da Kraken)
+QUOTE_ASSETS = {"USDT": "USDT", "USDC": "USDC", "USD": "USD", "EUR": "EUR", "BTC": "BTC", "ETH": "ETH"}
+
+# Sufixo das séries da CoinGecko: preço agregado, não é o mercado de nenhuma exchange
+COINGECKO_SUFFIX = ".CG"
+
+# ids da CoinGecko -> ticker (ids fora da lista viram o próprio id em maiúsculas)
+COINGECKO_IDS = {
+    "bitcoin": "BTC", "ethereum": "ETH", "solana": "SOL", "ripple": "XRP", "cardano": "ADA",
+    "dogecoin": "DOGE", "litecoin": "LTC", "polkadot": "DOT", "chainlink": "LINK",
+}
+
+
+# Amplitude do OHLC simulado da CoinGecko: (dias desde 01/01/2009, fração do preço)
+GENESIS_MS = 1230768000000
+COINGECKO_VOLATILITY = [(365, 0.05), (1825, 0.04), (3650, 0.03), (float("inf"), 0.02)]
+
+
+def canonical_symbol(pair, quote="USD"):
+    """Par da exchange -> par canônico: "XXBTZUSD" e "BTC/USD" viram "BTCUSD", "BTCUSDT" fica
+    "BTCUSDT" e o id "bitcoin" da CoinGecko vira "BTCUSD.CG"
+
+    `quote` só é usado para ids da CoinGecko, que não trazem a moeda de cotação.
+    """
+    if pair.lower() in COINGECKO_IDS:
+        return COINGECKO_IDS[pair.lower()] + quote.upper() + COINGECKO_SUFFIX
+
+    pair = pair.upper().replace("/", "").replace("-", "")
+    # Pares antigos da Kraken: X<ativo>Z<moeda> (ex.: XXBTZUSD, XETHZEUR)
+    if len(pair) == 8 and pair[0] in "XZ" and pair[4] in "XZ":
+        base, quote_asset = pair[1:4], pair[5:]
+    else:
+        quote_asset = next((q for q in QUOTE_ASSETS if pair.endswith(q) and len(pair) > len(q)), None)
+        if quote_asset is None:
+            return pair
+        base = pair[:-len(quote_asset)]
+
+    return ASSET_ALIASES.get(base, base) + QUOTE_ASSETS.get(quote_asset, quote_asset)
+
+
+def make_candle(open_time, close_time, open_, high, low, close, volume, symbol=DEFAULT_SYMBOL):
+    """Candle no formato das tabelas maria_helena_candles*"""
+    return {
+        "symbol": symbol,
+        "openTime": int(open_time),
+        "closeTime": int(close_time),
+        "open": float(open_),
+        "high": float(high),
+        "low": float(low),
+        "close": float(close),
+        "volume": float(volume),
+    }
+
+
+def from_binance_kline(kline, symbol=DEFAULT_SYMBOL):
+    """Kline da Binance: [openTime, open, high, low, close, volume, closeTime, quoteVolume, ...]
+
+    Usa o volume em quote (USDT), como os coletores sempre fizeram.
+    """
+    return make_candle(kline[0], kline[6], kline[1], kline[2], kline[3], kline[4], kline[7], symbol)
+
+
+def from_kraken_ohlc(row, interval_minutes, symbol=DEFAULT_SYMBOL):
+    """Linha OHLC da Kraken: [time (s), open, high, low, close, vwap, volume, count]"""
+    open_time = int(row[0] * 1000)
+    return make_candle(open_time, open_time + interval_minutes * 60000,
+                       row[1], row[2], row[3], row[4], row[6], symbol)
+
+
+def coingecko_volatility(timestamp, price):
+    """Amplitude simulada de um dia da CoinGecko: maior nos primeiros anos do bitcoin"""
+    if price <= 0:
+        return 0.01
+    days_from_start = (int(timestamp) - GENESIS_MS) // 86400000
+    for days, ratio in COINGECKO_VOLATILITY:
+        if days_from_start < days:
+            return price * ratio
+    return price * COINGECKO_VOLATILITY[-1][1]
+
+
+def from_coingecko_market_chart(data, symbol):
+    """market_chart da CoinGecko ({"prices", "volumes"}: [[ms, valor], ...]) -> candles diários
+
+    A CoinGecko só dá o preço do dia: o OHLC é simulado (close = preço, amplitude por
+    coingecko_volatility). Todo coletor da CoinGecko passa por aqui, para que o mesmo dia
+    gravado por coletores diferentes tenha sempre os mesmos valores.
+    """
+    volumes = data.get('volumes', [])
+    candles = []
+    for i, (timestamp, price) in enumerate(data.get('prices', [])):
+        volume = volumes[i][1] if i < len(volumes) else 0
+        volatility = coingecko_volatility(timestamp, price)
+        candles.append(make_candle(
+            timestamp,
+            int(timestamp) + 86400000,
+            round(max(price - volatility, 0.01), 8),
+            round(price + volatility * 1.5, 8),
+            round(max(price - volatility * 1.5, 0.01), 8),
+            round(price, 8),
+            round(volume, 2),
+            symbol
+        ))
+    return candles
+
+
+def kraken_result(data, pair):
+    """Extrai as linhas OHLC de uma resposta da Kraken; levanta erro se a API reportar falha
+
+    A Kraken responde com o nome interno do par (pedido "ETHUSD" volta como "XETHZUSD");
+    se `pair` não estiver no resultado, usa a única chave que não é o cursor `last`.
+    """
+    if data.get('error'):
+        raise ValueError(f"Erro Kraken: {data['error']}")
+    result = data.get('result', {})
+    if pair not in result:
+        keys = [key for key in result if key != "last"]
+        return result[keys[0]] if len(keys) == 1 else []
+    return result[pair]
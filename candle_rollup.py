@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+import time
+import argparse
+from datetime import datetime
+import numpy as np
+import logging
+
+from candle_store import candle_store, DEFAULT_DB_PATH
+from candle_normalizer import make_candle
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+SOURCE_TABLE = "maria_helena_candles_5min"
+SOURCE_INTERVAL_MS = 5 * 60000
+
+# Tabelas agregadas e o tamanho do bucket de cada uma (minutos)
+ROLLUPS = {
+    "maria_helena_candles_15min": 15,
+    "maria_helena_candles_1h": 60,
+    "maria_helena_candles_4h": 240,
+    "maria_helena_candles_1d": 1440,
+}
+
+# Candles 5min lidos por vez (alinhado ao maior bucket): ~26 mil linhas por par
+CHUNK_MS = 90 * 86400000
+
+# Linhas apagadas por transação na retenção: os coletores gravam entre um lote e outro
+RETENTION_BATCH = 50000
+
+
+def ensure_invalidation_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS maria_helena_rollup_invalidations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT,
+            symbol TEXT,
+            open_time INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS maria_helena_rollup_invalidations_series
+        ON maria_helena_rollup_invalidations (table_name, symbol, id)
+    """)
+
+
+def record_changes(conn, table, first):
+    """Registra o primeiro openTime inserido/alterado de cada par (`first`: {symbol: openTime})
+
+    Chamado pelo CandleStore (merge, insert com conflict="update", replace_all) dentro da
+    transação da gravação, exista ou não estado de indicadores: é daqui que o rollup
+    sabe quais buckets refazer.
+    """
+    if table != SOURCE_TABLE or not first:
+        return
+    ensure_invalidation_table(conn)
+    conn.executemany(
+        "INSERT INTO maria_helena_rollup_invalidations (table_name, symbol, open_time) VALUES (?, ?, ?)",
+        [(table, symbol, open_time) for symbol, open_time in first.items()]
+    )
+
+
+class CandleRollup:
+    """Agrega os candles de 5 minutos em 15m/1h/4h/1d, só os buckets já fechados
+
+    Cada tabela agregada guarda, por par, a marca d'água do último bucket gravado; cada
+    rodada lê só os candles 5min depois dela. Candles alterados no passado (registrados
+    pelo CandleStore em maria_helena_rollup_invalidations) fazem os buckets afetados serem
+    refeitos. A retenção apaga os candles 5min antigos que já estão agregados em todas as
+    tabelas.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.store = candle_store(db_path)
+        self._ready = False
+
+    def ensure_state_table(self):
+        if self._ready:
+            return
+        with self.store.transaction() as conn:
+            ensure_invalidation_table(conn)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS maria_helena_rollup_state (
+                    table_name TEXT,
+                    symbol TEXT,
+                    last_bucket INTEGER,
+                    invalidation_id INTEGER DEFAULT 0,
+                    compacted_before INTEGER DEFAULT 0,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (table_name, symbol)
+                )
+            """)
+            # Estado criado quando os recuos vinham de maria_helena_indicator_rewinds (outros ids)
+            columns = {row[1] for row in conn.execute("PRAGMA main.table_info(maria_helena_rollup_state)")}
+            if "invalidation_id" not in columns:
+                conn.execute("ALTER TABLE maria_helena_rollup_state ADD COLUMN invalidation_id INTEGER DEFAULT 0")
+        for table in ROLLUPS:
+            self.store.ensure_table(table)
+        self._ready = True
+
+    def load_state(self, table, symbol):
+        """(último bucket gravado ou None, última invalidação vista, início dos 5min ainda guardados)"""
+        row = self.store.conn.execute("""
+            SELECT last_bucket, invalidation_id, compacted_before FROM maria_helena_rollup_state
+            WHERE table_name = ? AND symbol = ?
+        """, (table, symbol)).fetchone()
+        return row or (None, 0, 0)
+
+    def save_state(self, table, symbol, last_bucket, invalidation_id, compacted_before):
+        self.store.conn.execute("""
+            INSERT OR REPLACE INTO maria_helena_rollup_state
+            (table_name, symbol, last_bucket, invalidation_id, compacted_before, updated_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (table, symbol, last_bucket, invalidation_id, compacted_before))
+
+    def aggregate(self, columns, bucket_ms, symbol):
+        """Candles agregados dos arrays do range(): abertura do primeiro, máxima, mínima,
+        fechamento do último e volume somado de cada bucket"""
+        buckets = columns["openTime"] - columns["openTime"] % bucket_ms
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)] - 1
+        return [
+            make_candle(t, t + bucket_ms, o, h, l, c, v, symbol)
+            for t, o, h, l, c, v in zip(
+                buckets[starts].tolist(),
+                columns["open"][starts].tolist(),
+                np.maximum.reduceat(columns["high"], starts).tolist(),
+                np.minimum.reduceat(columns["low"], starts).tolist(),
+                columns["close"][ends].tolist(),
+                np.add.reduceat(columns["volume"], starts).tolist(),
+            )
+        ]
+
+    def rollup(self, table, symbol, now_ms=None):
+        """Grava os buckets fechados de `symbol` em `table` após a marca d'água; devolve quantos"""
+        bucket_ms = ROLLUPS[table] * 60000
+        store = self.store
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+
+        with store.transaction() as conn:
+            last_bucket, invalidation_id, compacted_before = self.load_state(table, symbol)
+            rewind_from, new_invalidation_id = conn.execute("""
+                SELECT MIN(open_time), MAX(id) FROM maria_helena_rollup_invalidations
+                WHERE table_name = ? AND symbol = ? AND id > ?
+            """, (SOURCE_TABLE, symbol, invalidation_id)).fetchone()
+
+            last_source = store.last_open_time(SOURCE_TABLE, symbol)
+            if last_source is None:
+                return 0
+            # Bucket fechado: terminou no relógio e já tem o último candle 5min dele
+            end = min(last_source + SOURCE_INTERVAL_MS, now_ms)
+            end -= end % bucket_ms
+
+            first_source = conn.execute(f"SELECT MIN(openTime) FROM {SOURCE_TABLE} WHERE symbol = ?",
+                                        (symbol,)).fetchone()[0]
+            start = first_source if last_bucket is None else last_bucket + bucket_ms
+            if rewind_from is not None:
+                start = max(min(start, rewind_from), first_source)
+            # Antes de compacted_before os 5min foram apagados: buckets dali não são refeitos
+            start = max(start - start % bucket_ms, compacted_before)
+
+            written = 0
+            for chunk_start in range(start, end, CHUNK_MS):
+                columns = store.range(symbol, "5m", chunk_start, min(chunk_start + CHUNK_MS, end))
+                if len(columns["openTime"]) == 0:
+                    continue
+                candles = self.aggregate(columns, bucket_ms, symbol)
+                store.merge(table, candles)
+                written += len(candles)
+                last_bucket = max(last_bucket or 0, candles[-1]["openTime"])
+
+            self.save_state(table, symbol, last_bucket, new_invalidation_id or invalidation_id, compacted_before)
+        return written
+
+    def run(self, symbols=None, now_ms=None):
+        """Atualiza todas as tabelas agregadas de todos os pares do 5min"""
+        self.ensure_state_table()
+        started = time.perf_counter()
+        total = 0
+        for symbol in symbols or self.store.symbols(SOURCE_TABLE):
+            for table in ROLLUPS:
+                written = self.rollup(table, symbol, now_ms=now_ms)
+                if written:
+                    logging.info(f"🧮 {table} {symbol}: {written} buckets agregados")
+                total += written
+            self.prune_invalidations(symbol)
+        logging.info(f"✅ Rollup: {total} buckets em {time.perf_counter() - started:.2f}s")
+        return total
+
+    def compacted_before(self, symbol):
+        """openTime antes do qual os candles 5min de `symbol` já foram apagados pela retenção (0: nenhum)"""
+        self.ensure_state_table()
+        return max(self.load_state(table, symbol)[2] for table in ROLLUPS)
+
+    def prune_invalidations(self, symbol):
+        """Apaga as invalidações de `symbol` já vistas por todas as tabelas agregadas"""
+        with self.store.transaction() as conn:
+            seen = min(self.load_state(table, symbol)[1] for table in ROLLUPS)
+            conn.execute("""
+                DELETE FROM maria_helena_rollup_invalidations WHERE table_name = ? AND symbol = ? AND id <= ?
+            """, (SOURCE_TABLE, symbol, seen))
+
+    def compact(self, retention_days, symbols=None, now_ms=None):
+        """Apaga os candles 5min com mais de `retention_days` dias já agregados em todas as tabelas
+
+        O corte fica num limite de dia (vale para todos os buckets) e nunca passa da marca
+        d'água de nenhuma tabela agregada. Devolve quantas linhas foram apagadas.
+        """
+        self.ensure_state_table()
+        store = self.store
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        day_ms = max(ROLLUPS.values()) * 60000
+        deleted = 0
+
+        for symbol in symbols or store.symbols(SOURCE_TABLE):
+            states = [self.load_state(table, symbol) for table in ROLLUPS]
+            if any(last_bucket is None for last_bucket, _, _ in states):
+                logging.info(f"⏭️ {symbol}: rollup ainda não rodou em todas as tabelas, nada a compactar")
+                continue
+            cutoff = min(
+                [now_ms - retention_days * 86400000]
+                + [last_bucket + minutes * 60000 for (last_bucket, _, _), minutes in zip(states, ROLLUPS.values())]
+            )
+            cutoff -= cutoff % day_ms
+            if cutoff <= min(compacted for _, _, compacted in states):
+                continue
+
+            removed = 0
+            while True:
+                with store.transaction() as conn:
+                    cursor = conn.execute(f"""
+                        DELETE FROM {SOURCE_TABLE} WHERE id IN (
+                            SELECT id FROM {SOURCE_TABLE} WHERE symbol = ? AND openTime < ? LIMIT ?
+                        )
+                    """, (symbol, cutoff, RETENTION_BATCH))
+                    removed += cursor.rowcount
+                if cursor.rowcount < RETENTION_BATCH:
+                    break
+
+            with store.transaction():
+                for table, (last_bucket, invalidation_id, compacted) in zip(ROLLUPS, states):
+                    self.save_state(table, symbol, last_bucket, invalidation_id, max(compacted, cutoff))
+            deleted += removed
+            logging.info(f"🗜️ {SOURCE_TABLE} {symbol}: {removed} candles anteriores a "
+                         f"{datetime.fromtimestamp(cutoff / 1000):%Y-%m-%d} apagados (já agregados)")
+
+        if deleted:
+            with store.lock:
+                # Só devolve páginas ao disco em bancos criados com auto_vacuum incremental;
+                # executescript vai até o fim (execute liberaria uma página por passo)
+                store.conn.executescript("PRAGMA incremental_vacuum;")
+        return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrega os candles 5min em 15m/1h/4h/1d e aplica a retenção")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--symbol", action="append", default=None, help="par a agregar (padrão: todos)")
+    parser.add_argument("--retention-days", type=int, default=None,
+                        help="apaga os candles 5min mais antigos que isso, depois de agregados")
+    args = parser.parse_args()
+
+    rollup = CandleRollup(args.db_path)
+    rollup.run(symbols=args.symbol)
+    if args.retention_days is not None:
+        rollup.compact(args.retention_days, symbols=args.symbol)
+
+if __name__ == "__main__":
+    main()
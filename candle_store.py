@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import threading
+from operator import itemgetter
+from contextlib import contextmanager
+import numpy as np
+import logging
+
+from candle_normalizer import DEFAULT_SYMBOL, canonical_symbol
+
+# Banco próprio das séries temporais, fora do database.sqlite do n8n: as gravações
+# de candles e indicadores não disputam o lock de escrita dos workflows
+DEFAULT_DB_PATH = "/root/maria-helena-scripts/candles.sqlite"
+N8N_DB_PATH = "/root/.n8n/database.sqlite"
+
+# Socket do escritor único (ingest_queue.py); com a variável definida, insert e merge
+# de todos os processos passam por ele
+INGEST_SOCKET_ENV = "MARIA_HELENA_INGEST_SOCKET"
+
+# Tabelas de candles e o intervalo de cada uma; todas são criadas junto com o banco.
+# As de 15min a 1d (agregadas) são geradas pelo candle_rollup a partir do 5min.
+TABLE_INTERVALS = {
+    "maria_helena_candles": "1d",
+    "maria_helena_candles_5min": "5m",
+    "maria_helena_candles_15min": "15m",
+    "maria_helena_candles_1h": "1h",
+    "maria_helena_candles_4h": "4h",
+    "maria_helena_candles_1d": "1d",
+}
+STORE_TABLES = tuple(TABLE_INTERVALS)
+
+# Tabela lida pelo range() em cada intervalo: a primeira registrada (o "1d" é o diário
+# coletado; o agregado sai com table="maria_helena_candles_1d")
+INTERVAL_TABLES = {}
+for _table, _interval in TABLE_INTERVALS.items():
+    INTERVAL_TABLES.setdefault(_interval, _table)
+
+# PRAGMA user_version do schema atual; bancos com versão menor são atualizados ao abrir
+SCHEMA_VERSION = 3
+
+# Colunas gravadas pelos coletores (na ordem dos INSERTs): chave (symbol, openTime) + OHLCV
+CANDLE_FIELDS = ("symbol", "openTime", "closeTime", "open", "high", "low", "close", "volume")
+KEY_FIELDS = CANDLE_FIELDS[:2]
+VALUE_FIELDS = CANDLE_FIELDS[2:]
+
+_candle_values = itemgetter(*CANDLE_FIELDS[1:])
+
+
+def _candle_row(candle):
+    # Candles sem symbol (montados à mão, arquivos antigos) são do par padrão
+    return (candle.get("symbol", DEFAULT_SYMBOL),) + _candle_values(candle)
+
+# Schema completo das tabelas de candles, incluindo as colunas de indicadores
+CANDLE_TABLE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol TEXT NOT NULL DEFAULT '{default_symbol}',
+        openTime INTEGER,
+        closeTime INTEGER,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        ema_200 REAL,
+        sma_short REAL,
+        sma_long REAL,
+        rsi_14 REAL,
+        atr_14 REAL,
+        bb_upper REAL,
+        bb_lower REAL,
+        macd REAL,
+        macd_signal REAL,
+        donchian_high REAL,
+        donchian_low REAL,
+        obv REAL,
+        UNIQUE (symbol, openTime)
+    )
+"""
+
+# Índices das tabelas de candles. O de OHLCV cobre as leituras por par e período
+# (range, read_columns dos indicadores): todo índice já carrega o rowid (id), então
+# essas consultas não tocam a tabela. O de timestamp atende o MAX(timestamp) do health check.
+CANDLE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS {table}_ohlcv ON {table} (symbol, openTime, open, high, low, close, volume)",
+    "CREATE INDEX IF NOT EXISTS {table}_timestamp ON {table} (timestamp)",
+)
+
+# Colunas padrão do range() e as que saem como int64
+RANGE_COLUMNS = ("openTime", "open", "high", "low", "close", "volume")
+INTEGER_COLUMNS = {"id", "openTime", "closeTime"}
+
+# Ajustes para séries temporais só de acréscimo. page_size e auto_vacuum vêm antes do
+# WAL: só valem num banco novo (depois exigiriam VACUUM fora do WAL); com auto_vacuum
+# incremental a retenção devolve ao disco as páginas liberadas. WAL: leitores (n8n, indicadores)
+# não bloqueiam a escrita; NORMAL é seguro em WAL. mmap evita cópias nas leituras de
+# colunas inteiras; checkpoints menos frequentes e o WAL truncado depois de cada um.
+PRAGMAS = {
+    "page_size": 8192,
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+    "cache_size": -65536,  # 64 MB
+    "mmap_size": 268435456,  # 256 MB
+    "wal_autocheckpoint": 4000,  # páginas (32 MB)
+    "journal_size_limit": 67108864,  # 64 MB
+}
+
+# O módulo sqlite3 reaproveita statements preparados por texto SQL
+STATEMENT_CACHE = 256
+
+# O que fazer quando o openTime já existe
+CONFLICT_CLAUSES = {
+    "ignore": "ON CONFLICT(symbol, openTime) DO NOTHING",
+    "update": """ON CONFLICT(symbol, openTime) DO UPDATE SET
+        closeTime = excluded.closeTime, open = excluded.open, high = excluded.high,
+        low = excluded.low, close = excluded.close, volume = excluded.volume,
+        timestamp = CURRENT_TIMESTAMP""",
+}
+
+
+class CandleStore:
+    """Gravação de candles numa conexão SQLite persistente
+
+    Todos os coletores passam por aqui: o schema é garantido uma vez por tabela,
+    os lotes entram com um único `executemany` por transação e os textos SQL são
+    montados uma vez, para o cache de statements do sqlite3 reaproveitá-los.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        # Compartilhada entre threads (engine, ingester); o lock serializa o acesso
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        for name, value in PRAGMAS.items():
+            self.conn.execute(f"PRAGMA {name} = {value}")
+        self.lock = threading.RLock()
+        self._tables = set()
+        self._statements = {}
+        self._depth = 0
+        self._owner = None
+        # Escritor único opcional (IngestClient ou IngestWriter): insert/merge vão para a fila dele
+        self.writer = None
+        self.ensure_schema()
+
+    @contextmanager
+    def transaction(self):
+        """Transação única (reentrante): commit no fim, rollback se algo falhar"""
+        with self.lock:
+            self._depth += 1
+            self._owner = threading.get_ident()
+            try:
+                yield self.conn
+                if self._depth == 1:
+                    self.conn.commit()
+            except BaseException:
+                if self._depth == 1:
+                    self.conn.rollback()
+                raise
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._owner = None
+
+    def schema_version(self):
+        with self.lock:
+            return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def ensure_schema(self):
+        """Cria/atualiza as tabelas de candles de um banco com user_version antigo"""
+        if self.schema_version() >= SCHEMA_VERSION:
+            return
+        with self.transaction() as conn:
+            for table in STORE_TABLES:
+                self.ensure_table(table)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        logging.info(f"🗄️ {self.db_path}: schema na versão {SCHEMA_VERSION}")
+
+    def ensure_table(self, table):
+        if table in self._tables:
+            return
+        with self.transaction() as conn:
+            columns = [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+            if columns and "symbol" not in columns:
+                self._migrate_table(conn, table, columns)
+            conn.execute(CANDLE_TABLE_SCHEMA.format(table=table, default_symbol=DEFAULT_SYMBOL))
+            for sql in CANDLE_INDEXES:
+                conn.execute(sql.format(table=table))
+        self._tables.add(table)
+
+    def _migrate_table(self, conn, table, columns):
+        """Recria uma tabela anterior à coluna symbol (openTime UNIQUE sozinho)
+
+        SQLite não altera constraints: copia as linhas (mesmos ids e indicadores) para
+        uma tabela com o schema novo, com symbol = DEFAULT_SYMBOL, e troca os nomes.
+        """
+        staging = f"{table}_migration"
+        conn.execute(f"DROP TABLE IF EXISTS {staging}")
+        conn.execute(CANDLE_TABLE_SCHEMA.format(table=staging, default_symbol=DEFAULT_SYMBOL))
+        target = {row[1] for row in conn.execute(f"PRAGMA table_info({staging})")}
+        copied = ", ".join(col for col in columns if col in target)
+        conn.execute(f"INSERT INTO {staging} ({copied}) SELECT {copied} FROM {table}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+        logging.info(f"🔧 {table}: coluna symbol adicionada ({DEFAULT_SYMBOL} nas linhas existentes)")
+
+    def _insert_sql(self, table, conflict):
+        key = (table, conflict)
+        if key not in self._statements:
+            self._statements[key] = f"""
+                INSERT INTO {table} ({", ".join(CANDLE_FIELDS)})
+                VALUES ({", ".join("?" * len(CANDLE_FIELDS))})
+                {CONFLICT_CLAUSES[conflict]}
+            """
+        return self._statements[key]
+
+    def _delegate(self, op, **payload):
+        """Gravação pelo escritor único; None se ele estiver fora do ar (o chamador grava direto)
+
+        Dentro de uma transação aberta por esta thread a gravação é sempre direta: os candles
+        precisam entrar no mesmo commit que o chamador (checkpoint do backfill, marca d'água
+        do rollup), o que o escritor único, em outra conexão, não garante.
+        """
+        if self._owner == threading.get_ident():
+            return None
+        try:
+            return self.writer.submit(op, **payload)
+        except (ConnectionError, FileNotFoundError) as e:
+            logging.warning(f"⚠️ Escritor único indisponível ({str(e)}), gravando direto")
+            return None
+
+    def insert(self, table, candles, conflict="ignore"):
+        """Grava candles num único executemany; devolve quantas linhas mudaram
+
+        conflict="ignore" mantém o candle já gravado; "update" sobrescreve o OHLCV.
+        """
+        if self.writer is not None:
+            candles = list(candles)
+            result = self._delegate("insert", table=table, candles=candles, conflict=conflict)
+            if result is not None:
+                return result
+        return self._insert(table, candles, conflict)
+
+    def _insert(self, table, candles, conflict="ignore"):
+        self.ensure_table(table)
+        if conflict == "update":
+            # Pode reescrever candles antigos: o rollup precisa saber
+            candles = list(candles)
+        rows = map(_candle_row, candles)
+        with self.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(self._insert_sql(table, conflict), rows)
+            if conflict == "update":
+                first = {}
+                for candle in candles:
+                    symbol = candle.get("symbol", DEFAULT_SYMBOL)
+                    first[symbol] = min(first.get(symbol, candle["openTime"]), candle["openTime"])
+                self._record_changes(table, first)
+            return conn.total_changes - before
+
+    def _record_changes(self, table, first):
+        """Primeiro openTime inserido/alterado de cada par, para o rollup refazer os buckets"""
+        from candle_rollup import record_changes
+        record_changes(self.conn, table, first)
+
+    def rewind_indicators(self, table, open_time, symbol=DEFAULT_SYMBOL):
+        """Faz o próximo update_indicators recalcular `symbol` em `table` a partir de `open_time`"""
+        from calculate_indicators import IndicatorCalculator
+        with self.transaction() as conn:
+            IndicatorCalculator(self.db_path).rewind_state(conn, table, open_time, symbol=symbol)
+
+    def merge(self, table, candles, rewind_indicators=True):
+        """Mescla candles por (symbol, openTime): insere os novos e atualiza só os que mudaram
+
+        Linhas existentes mantêm id e colunas de indicadores; tudo numa transação, que
+        também recua o estado dos indicadores de cada par para o primeiro candle
+        inserido/alterado. Devolve (inseridos, atualizados, menor openTime inserido/alterado
+        ou None).
+        """
+        if self.writer is not None:
+            candles = list(candles)
+            result = self._delegate("merge", table=table, candles=candles, rewind_indicators=rewind_indicators)
+            if result is not None:
+                return tuple(result)
+        self.ensure_table(table)
+        values = ", ".join(VALUE_FIELDS)
+        same_key = " AND ".join(f"c.{field} = s.{field}" for field in KEY_FIELDS)
+        changed = " OR ".join(f"s.{field} IS NOT c.{field}" for field in VALUE_FIELDS)
+        differs = f"""
+            SELECT s.symbol, s.openTime FROM candle_staging s
+            JOIN {table} c ON {same_key}
+            WHERE {changed}
+        """
+        is_new = f"NOT EXISTS (SELECT 1 FROM {table} c WHERE {same_key})"
+
+        with self.transaction() as conn:
+            conn.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS candle_staging (
+                    symbol TEXT,
+                    openTime INTEGER,
+                    {", ".join(f"{field} REAL" for field in VALUE_FIELDS)},
+                    PRIMARY KEY (symbol, openTime)
+                )
+            """)
+            conn.execute("DELETE FROM candle_staging")
+            conn.executemany(f"""
+                INSERT OR REPLACE INTO candle_staging ({", ".join(CANDLE_FIELDS)})
+                VALUES ({", ".join("?" * len(CANDLE_FIELDS))})
+            """, map(_candle_row, candles))
+
+            # Primeiro candle inserido/alterado de cada par
+            first = dict(conn.execute(f"""
+                SELECT symbol, MIN(openTime) FROM (
+                    {differs}
+                    UNION ALL
+                    SELECT s.symbol, s.openTime FROM candle_staging s WHERE {is_new}
+                ) GROUP BY symbol
+            """).fetchall())
+
+            cursor = conn.execute(f"""
+                UPDATE {table}
+                SET ({values}) = (
+                    SELECT {values} FROM candle_staging s
+                    WHERE s.symbol = {table}.symbol AND s.openTime = {table}.openTime
+                ), timestamp = CURRENT_TIMESTAMP
+                WHERE (symbol, openTime) IN ({differs})
+            """)
+            updated = cursor.rowcount
+
+            cursor = conn.execute(f"""
+                INSERT INTO {table} ({", ".join(CANDLE_FIELDS)})
+                SELECT {", ".join(CANDLE_FIELDS)} FROM candle_staging s
+                WHERE {is_new}
+                ORDER BY openTime
+            """)
+            inserted = cursor.rowcount
+            conn.execute("DELETE FROM candle_staging")
+            # Independe do estado dos indicadores (e de rewind_indicators)
+            self._record_changes(table, first)
+
+            if rewind_indicators:
+                for symbol, open_time in first.items():
+                    self.rewind_indicators(table, open_time, symbol=symbol)
+        return inserted, updated, min(first.values(), default=None)
+
+    def replace_all(self, table, candles, symbol=DEFAULT_SYMBOL):
+        """Substitui os candles de `symbol` na tabela pelos candles dados, numa transação"""
+        self.ensure_table(table)
+        with self.transaction() as conn:
+            conn.execute(f"DELETE FROM {table} WHERE symbol = ?", (symbol,))
+            inserted = self._insert(table, candles)
+            # Ids novos e indicadores vazios: o próximo cálculo é completo
+            self.rewind_indicators(table, 0, symbol=symbol)
+            self._record_changes(table, {symbol: 0})
+            return inserted
+
+    def symbols(self, table):
+        """Pares presentes na tabela"""
+        self.ensure_table(table)
+        with self.lock:
+            return [row[0] for row in self.conn.execute(f"SELECT DISTINCT symbol FROM {table} ORDER BY symbol")]
+
+    def last_open_time(self, table, symbol=DEFAULT_SYMBOL):
+        self.ensure_table(table)
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT MAX(openTime) FROM {table} WHERE symbol = ?", (symbol,)
+            ).fetchone()[0]
+
+    def find_gaps(self, table, interval_ms, start=None, end=None, symbol=DEFAULT_SYMBOL):
+        """Lacunas de openTime de `symbol` numa passada: [(início, fim)) em ms, fim exclusivo
+
+        Lê só a coluna openTime pelo índice (symbol, openTime) e procura saltos maiores que
+        o intervalo. `start`/`end` delimitam a janela; faltas nas pontas também contam.
+        """
+        self.ensure_table(table)
+        # start=0 (época) é um limite válido: só None deixa a ponta em aberto
+        bounded_start, bounded_end = start is not None, end is not None
+        start = 0 if start is None else start
+        end = np.iinfo(np.int64).max if end is None else end
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT openTime FROM {table} WHERE symbol = ? AND openTime >= ? AND openTime < ? "
+                "ORDER BY openTime",
+                (symbol, start, end)
+            )
+            times = np.fromiter((row[0] for row in rows), dtype=np.int64)
+
+        if len(times) == 0:
+            # Tabela vazia: só é lacuna se a janela foi delimitada
+            return [(start, end)] if bounded_start and bounded_end else []
+
+        jumps = np.flatnonzero(np.diff(times) > interval_ms)
+        gaps = list(zip((times[jumps] + interval_ms).tolist(), times[jumps + 1].tolist()))
+
+        if bounded_start and times[0] - start >= interval_ms:
+            gaps.insert(0, (start, int(times[0])))
+        if bounded_end and end - times[-1] > interval_ms:
+            gaps.append((int(times[-1]) + interval_ms, end))
+        return gaps
+
+    def range(self, symbol, interval, start=None, end=None, columns=RANGE_COLUMNS, limit=None, table=None):
+        """Candles de `symbol` com start <= openTime < end (ms) como arrays NumPy contíguos
+
+        Uma única leitura (fetchall) pelo índice de OHLCV. Devolve {coluna: array} em
+        ordem crescente de openTime: id/openTime/closeTime em int64, o resto em float64
+        (NULL vira NaN). `limit` fica com os últimos candles da janela; `table` escolhe
+        outra tabela do mesmo intervalo (ex.: o diário agregado).
+        """
+        table = table or INTERVAL_TABLES.get(interval)
+        if table is None:
+            raise ValueError(f"Intervalo sem tabela: {interval} (disponíveis: {', '.join(INTERVAL_TABLES)})")
+        self.ensure_table(table)
+        columns = list(columns)
+
+        where, params = ["symbol = ?"], [canonical_symbol(symbol)]
+        if start is not None:
+            where.append("openTime >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("openTime < ?")
+            params.append(end)
+        sql = (f"SELECT {', '.join(columns)} FROM {table} WHERE {' AND '.join(where)} "
+               f"ORDER BY openTime {'DESC LIMIT ?' if limit else 'ASC'}")
+        if limit:
+            params.append(limit)
+
+        with self.lock:
+            known = {row[1] for row in self.conn.execute(f"PRAGMA main.table_info({table})")}
+            unknown = [col for col in columns if col not in known or col in ("symbol", "timestamp")]
+            if unknown:
+                raise ValueError(f"Colunas inválidas para {table}: {', '.join(unknown)}")
+            rows = self.conn.execute(sql, params).fetchall()
+
+        # openTime (ms) e id cabem exatamente em float64 (< 2^53)
+        block = np.array(rows, dtype=np.float64).reshape(len(rows), len(columns))
+        if limit:
+            block = block[::-1]
+        # Transposta copiada: cada coluna fica contígua na memória
+        block = np.ascontiguousarray(block.T)
+        return {
+            col: block[i].astype(np.int64) if col in INTEGER_COLUMNS else block[i]
+            for i, col in enumerate(columns)
+        }
+
+    def count(self, table, symbol=None):
+        """Candles na tabela (de `symbol`, se informado)"""
+        self.ensure_table(table)
+        with self.lock:
+            if symbol is None:
+                return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            return self.conn.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE symbol = ?", (symbol,)
+            ).fetchone()[0]
+
+    def close(self):
+        with _stores_lock:
+            if _stores.get(self.db_path) is self:
+                del _stores[self.db_path]
+        if self.writer is not None:
+            self.writer.close()
+        with self.lock:
+            self.conn.close()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def candle_store(db_path=DEFAULT_DB_PATH):
+    """Store único por banco no processo: uma conexão compartilhada por todos os coletores"""
+    with _stores_lock:
+        if db_path not in _stores:
+            _stores[db_path] = CandleStore(db_path)
+            logging.debug(f"🗄️ CandleStore aberto: {db_path}")
+            if os.environ.get(INGEST_SOCKET_ENV):
+                from ingest_queue import IngestClient
+                _stores[db_path].writer = IngestClient(os.environ[INGEST_SOCKET_ENV])
+        return _stores[db_path]
@@ -1,70 +1,62 @@
 #!/usr/bin/env python3
-import requests
-import sqlite3
 from datetime import datetime, timedelta
 import logging
 
+from http_client import shared_client
+from candle_store import candle_store, DEFAULT_DB_PATH
+from candle_normalizer import canonical_symbol, from_coingecko_market_chart
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
 class BitcoinHistoryCollector:
-    def __init__(self, db_path="/root/.n8n/database.sqlite"):
+    def __init__(self, db_path=DEFAULT_DB_PATH):
         self.db_path = db_path
+        # Série própria da CoinGecko ("BTCUSD.CG"): não sobrescreve o diário da Kraken
+        self.symbol = canonical_symbol("bitcoin")
         self.api_url = "https://api.coingecko.com/api/v3"
     
+    def _params(self):
+        return {
+            "vs_currency": "usd",
+            "days": "5475",
+            "interval": "daily"
+        }
+    
+    def parse_market_chart(self, data):
+        """Gera candles diários a partir dos preços/volumes do market_chart"""
+        return from_coingecko_market_chart(data, self.symbol)
+    
+    def jobs(self):
+        """Requisições de um ciclo de coleta, para o CollectionEngine"""
+        return [
+            {
+                "name": "coingecko.bitcoin.15years",
+                "url": f"{self.api_url}/coins/bitcoin/market_chart",
+                "params": self._params(),
+                "timeout": 20,
+                "parse": self.parse_market_chart,
+                "store": self.store_candles,
+            },
+        ]
+    
     def fetch_15years_bitcoin(self):
         """Busca 15 anos completos de Bitcoin"""
         try:
             logging.info("🔍 Consultando API CoinGecko para 15 anos de Bitcoin...")
             
             url = f"{self.api_url}/coins/bitcoin/market_chart"
-            params = {
-                "vs_currency": "usd",
-                "days": "5475",
-                "interval": "daily"
-            }
-            
-            response = requests.get(url, params=params, timeout=20)
+            response = shared_client().get(url, params=self._params(), timeout=20)
             response.raise_for_status()
             
-            data = response.json()
-            prices = data.get('prices', [])
-            volumes = data.get('volumes', [])
-            
-            logging.info(f"✅ Recebido: {len(prices)} dias de histórico")
-            
-            candles = []
-            for i, (timestamp, price) in enumerate(prices):
-                volume = volumes[i][1] if i < len(volumes) else 0
-                
-                date = datetime.fromtimestamp(timestamp / 1000)
-                days_from_start = (date - datetime(2009, 1, 1)).days
-                
-                if days_from_start < 365:
-                    volatility = price * 0.05 if price > 0 else 0.01
-                elif days_from_start < 1825:
-                    volatility = price * 0.04 if price > 0 else 0.01
-                elif days_from_start < 3650:
-                    volatility = price * 0.03 if price > 0 else 0.01
-                else:
-                    volatility = price * 0.02 if price > 0 else 0.01
-                
-                candle = {
-                    "openTime": int(timestamp),
-                    "closeTime": int(timestamp) + 86400000,
-                    "open": round(max(price - volatility, 0.01), 8),
-                    "high": round(price + volatility * 1.5, 8),
-                    "low": round(max(price - volatility * 1.5, 0.01), 8),
-                    "close": round(price, 8),
-                    "volume": round(volume, 2)
-                }
-                
-                candles.append(candle)
+            candles = self.parse_market_chart(response.json())
             
+            logging.info(f"✅ Recebido: {len(candles)} dias de histórico")
             logging.info(f"📊 Total de candles gerados: {len(candles)}")
-            logging.info(f"📅 Período: {datetime.fromtimestamp(prices[0][0]/1000)} até {datetime.fromtimestamp(prices[-1][0]/1000)}")
+            if candles:
+                logging.info(f"📅 Período: {datetime.fromtimestamp(candles[0]['openTime']/1000)} até {datetime.fromtimestamp(candles[-1]['openTime']/1000)}")
             
             return candles
         
@@ -72,36 +64,22 @@ class BitcoinHistoryCollector:
             logging.error(f"❌ Erro ao buscar histórico: {str(e)}")
             return []
     
-    def store_candles(self, candles):
-        """Armazena candles no banco"""
+    def store_candles(self, candles, mode="merge"):
+        """Armazena candles no banco
+        
+        mode="merge" grava só o que é novo ou mudou, preservando ids e indicadores;
+        mode="replace" apaga os candles da série da CoinGecko e regrava tudo.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("DELETE FROM maria_helena_candles")
-            logging.info("🗑️ Banco limpo")
-            
-            for candle in candles:
-                cursor.execute("""
-                    INSERT INTO maria_helena_candles 
-                    (openTime, closeTime, open, high, low, close, volume)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    candle["openTime"],
-                    candle["closeTime"],
-                    candle["open"],
-                    candle["high"],
-                    candle["low"],
-                    candle["close"],
-                    candle["volume"]
-                ))
-            
-            conn.commit()
-            
-            cursor.execute("SELECT COUNT(*) FROM maria_helena_candles")
-            total = cursor.fetchone()[0]
+            store = candle_store(self.db_path)
+            if mode == "replace":
+                store.replace_all("maria_helena_candles", candles, symbol=self.symbol)
+                logging.info("🗑️ Banco limpo")
+            else:
+                inserted, updated, _ = store.merge("maria_helena_candles", candles)
+                logging.info(f"🔀 {inserted} candles novos, {updated} alterados")
             
-            conn.close()
+            total = store.count("maria_helena_candles")
             
             logging.info(f"✅ {total} candles armazenados com sucesso!")
             return True
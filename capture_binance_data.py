@@ -1,46 +1,127 @@
 #!/usr/bin/env python3
-import requests
 import json
-import sqlite3
 import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import logging
 
+from http_client import shared_client
+from candle_store import candle_store, DEFAULT_DB_PATH, INTERVAL_TABLES
+from candle_normalizer import from_binance_kline, canonical_symbol
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Duração de cada intervalo de kline em ms
+INTERVAL_MS = {
+    "1m": 60000,
+    "5m": 300000,
+    "15m": 900000,
+    "1h": 3600000,
+    "4h": 14400000,
+    "1d": 86400000,
+}
+
+# /klines: até 1000 candles por chamada, peso 2; limite da conta 6000/min (usamos 80%)
+KLINES_PAGE = 1000
+KLINES_WEIGHT = 2
+BINANCE_WEIGHT_BUDGET = 4800
+
+
+class WeightBudget:
+    """Orçamento de peso por minuto da Binance, compartilhado entre as threads do backfill"""
+    
+    def __init__(self, limit=BINANCE_WEIGHT_BUDGET, window=60.0):
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.spent = deque()  # (instante, peso)
+        self.reported = (0.0, 0)  # (instante, X-MBX-USED-WEIGHT-1M)
+    
+    def acquire(self, weight):
+        """Bloqueia até caber `weight` na janela do último minuto"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.spent and now - self.spent[0][0] >= self.window:
+                    self.spent.popleft()
+                
+                used = sum(w for _, w in self.spent)
+                reported_at, reported = self.reported
+                if now - reported_at < self.window:
+                    used = max(used, reported)
+                
+                if used + weight <= self.limit:
+                    self.spent.append((now, weight))
+                    return
+                
+                wait = self.window - (now - self.spent[0][0]) if self.spent else 1.0
+            time.sleep(max(wait, 0.05))
+    
+    def report(self, used_weight):
+        """Atualiza com o peso usado informado pela própria Binance"""
+        with self.lock:
+            self.reported = (time.monotonic(), int(used_weight))
+
+
 class BinanceCollector:
-    def __init__(self, symbol="BTCUSDT", interval="5m", db_path="/root/.n8n/database.sqlite"):
-        self.symbol = symbol
+    def __init__(self, symbol="BTCUSDT", interval="5m", db_path=DEFAULT_DB_PATH, symbols=None):
+        # `symbols` coleta vários pares no mesmo ciclo; `symbol` é o primeiro deles
+        self.symbols = list(symbols or [symbol])
+        self.symbol = self.symbols[0]
         self.interval = interval
+        # Tabela do intervalo (5m -> maria_helena_candles_5min), nunca a diária
+        self.table = INTERVAL_TABLES[interval]
         self.db_path = db_path
         self.api_url = "https://api.binance.com/api/v3/klines"
         
+    def _params(self, limit, symbol=None):
+        return {
+            "symbol": symbol or self.symbol,
+            "interval": self.interval,
+            "limit": limit
+        }
+    
+    def parse_klines(self, data, symbol=None):
+        """Converte a resposta de /klines de `symbol` em candles normalizados"""
+        pair = canonical_symbol(symbol or self.symbol)
+        return [from_binance_kline(kline, pair) for kline in data]
+    
+    def parse_latest(self, data, symbol=None):
+        """Último candle da resposta (ou None se vazia)"""
+        candles = self.parse_klines(data, symbol)
+        return candles[-1] if candles else None
+    
+    def jobs(self, historical_limit=200):
+        """Requisições de um ciclo de coleta, para o CollectionEngine
+        
+        /klines não aceita vários pares: uma requisição por par, que o CollectionEngine
+        dispara em paralelo. O histórico já traz o candle mais recente (o em andamento),
+        então não há uma segunda chamada com limit=1.
+        """
+        return [
+            {
+                "name": f"binance.{symbol}.historical",
+                "url": self.api_url,
+                "params": self._params(historical_limit, symbol),
+                "timeout": 10,
+                "parse": lambda data, symbol=symbol: self.parse_klines(data, symbol),
+                "store": self.store_historical_candles,
+            }
+            for symbol in self.symbols
+        ]
+    
     def fetch_latest_candle(self):
         """Busca o candle mais recente de 5 min"""
         try:
-            params = {
-                "symbol": self.symbol,
-                "interval": self.interval,
-                "limit": 1
-            }
-            response = requests.get(self.api_url, params=params, timeout=10)
+            response = shared_client().get(self.api_url, params=self._params(1), timeout=10)
             response.raise_for_status()
-            
-            data = response.json()
-            if data:
-                candle = data[0]
-                return {
-                    "openTime": int(candle[0]),
-                    "closeTime": int(candle[6]),
-                    "open": float(candle[1]),
-                    "high": float(candle[2]),
-                    "low": float(candle[3]),
-                    "close": float(candle[4]),
-                    "volume": float(candle[7])
-                }
+            return self.parse_latest(response.json())
         except Exception as e:
             logging.error(f"Erro ao buscar candle: {str(e)}")
         
@@ -49,27 +130,9 @@ class BinanceCollector:
     def fetch_historical_candles(self, limit=200):
         """Busca últimos N candles históricos"""
         try:
-            params = {
-                "symbol": self.symbol,
-                "interval": self.interval,
-                "limit": limit
-            }
-            response = requests.get(self.api_url, params=params, timeout=10)
+            response = shared_client().get(self.api_url, params=self._params(limit), timeout=10)
             response.raise_for_status()
-            
-            candles = []
-            for candle in response.json():
-                candles.append({
-                    "openTime": int(candle[0]),
-                    "closeTime": int(candle[6]),
-                    "open": float(candle[1]),
-                    "high": float(candle[2]),
-                    "low": float(candle[3]),
-                    "close": float(candle[4]),
-                    "volume": float(candle[7])
-                })
-            
-            return candles
+            return self.parse_klines(response.json())
         
         except Exception as e:
             logging.error(f"Erro ao buscar histórico: {str(e)}")
@@ -79,27 +142,9 @@ class BinanceCollector:
     def store_candle(self, candle):
         """Armazena candle no SQLite"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT OR IGNORE INTO maria_helena_candles 
-                (openTime, closeTime, open, high, low, close, volume)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                candle["openTime"],
-                candle["closeTime"],
-                candle["open"],
-                candle["high"],
-                candle["low"],
-                candle["close"],
-                candle["volume"]
-            ))
+            candle_store(self.db_path).insert(self.table, [candle])
             
-            conn.commit()
-            conn.close()
-            
-            logging.info(f"✅ Candle armazenado: {self.symbol} @ {candle['close']}")
+            logging.info(f"✅ Candle armazenado: {candle['symbol']} @ {candle['close']}")
             return True
         
         except Exception as e:
@@ -109,26 +154,7 @@ class BinanceCollector:
     def store_historical_candles(self, candles):
         """Armazena múltiplos candles"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            for candle in candles:
-                cursor.execute("""
-                    INSERT OR IGNORE INTO maria_helena_candles 
-                    (openTime, closeTime, open, high, low, close, volume)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    candle["openTime"],
-                    candle["closeTime"],
-                    candle["open"],
-                    candle["high"],
-                    candle["low"],
-                    candle["close"],
-                    candle["volume"]
-                ))
-            
-            conn.commit()
-            conn.close()
+            candle_store(self.db_path).insert(self.table, candles)
             
             logging.info(f"✅ {len(candles)} candles históricos armazenados")
             return True
@@ -136,19 +162,99 @@ class BinanceCollector:
         except Exception as e:
             logging.error(f"❌ Erro ao armazenar histórico: {str(e)}")
             return False
+    
+    def fetch_range(self, budget, start_ms, end_ms):
+        """Busca os klines de [start_ms, end_ms) numa chamada (até KLINES_PAGE candles)"""
+        params = {
+            "symbol": self.symbol,
+            "interval": self.interval,
+            "startTime": start_ms,
+            "endTime": end_ms - 1,  # endTime da Binance é inclusivo
+            "limit": KLINES_PAGE
+        }
+        
+        # 429 (com Retry-After) é refeito pelo HttpClient; se persistir, ou num 418 (IP banido), o shard falha
+        budget.acquire(KLINES_WEIGHT)
+        response = shared_client().get(self.api_url, params=params, timeout=15)
+        
+        if "X-MBX-USED-WEIGHT-1M" in response.headers:
+            budget.report(response.headers["X-MBX-USED-WEIGHT-1M"])
+        
+        response.raise_for_status()
+        return self.parse_klines(response.json())
+    
+    def backfill(self, start_ms, end_ms, workers=4):
+        """Backfill de [start_ms, end_ms) em shards paralelos, gravados em ordem de openTime"""
+        try:
+            step = INTERVAL_MS[self.interval] * KLINES_PAGE
+            shards = [(s, min(s + step, end_ms)) for s in range(start_ms, end_ms, step)]
+            logging.info(f"📊 Backfill {self.symbol} {self.interval}: {len(shards)} shards, {workers} workers")
+            
+            budget = WeightBudget()
+            store = candle_store(self.db_path)
+            total = 0
+            
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(self.fetch_range, budget, s, e): index
+                    for index, (s, e) in enumerate(shards)
+                }
+                
+                # Shards chegam fora de ordem: segura até o próximo da sequência chegar
+                ready = {}
+                next_index = 0
+                for future in as_completed(futures):
+                    try:
+                        ready[futures[future]] = future.result()
+                    except Exception:
+                        # Shard recusado de vez: os seguintes não seriam gravados, não busca mais
+                        for pending in futures:
+                            pending.cancel()
+                        raise
+                    
+                    while next_index in ready:
+                        candles = {c["openTime"]: c for c in ready.pop(next_index)}
+                        store.insert(self.table, list(candles.values()))
+                        total += len(candles)
+                        next_index += 1
+            
+            logging.info(f"✅ Backfill concluído: {total} candles recebidos")
+            return True
+        
+        except Exception as e:
+            logging.error(f"❌ Erro no backfill Binance: {str(e)}")
+            return False
 
 def main():
-    collector = BinanceCollector()
-    
-    logging.info("📊 Coletando 200 candles históricos...")
-    historical = collector.fetch_historical_candles(limit=200)
-    if historical:
-        collector.store_historical_candles(historical)
+    parser = argparse.ArgumentParser(description="Coleta Binance")
+    parser.add_argument("--backfill-days", type=int, default=None,
+                        help="backfill paralelo dos últimos N dias em vez da coleta normal")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--symbols", nargs="+", default=["BTCUSDT"], help="pares da Binance, ex.: BTCUSDT ETHUSDT")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--api-url", default=None, help="URL alternativa do /klines (ex.: fake_exchange.py)")
+    args = parser.parse_args()
     
-    logging.info("📈 Coletando candle mais recente...")
-    latest = collector.fetch_latest_candle()
-    if latest:
-        collector.store_candle(latest)
+    for symbol in args.symbols:
+        collector = BinanceCollector(symbol=symbol, db_path=args.db_path)
+        if args.api_url:
+            collector.api_url = args.api_url
+        
+        if args.backfill_days:
+            end_ms = int(time.time() * 1000)
+            start_ms = end_ms - args.backfill_days * 86400000
+            collector.backfill(start_ms, end_ms, workers=args.workers)
+            continue
+        
+        logging.info(f"📊 Coletando 200 candles históricos de {symbol}...")
+        historical = collector.fetch_historical_candles(limit=200)
+        if historical:
+            collector.store_historical_candles(historical)
+        
+        logging.info("📈 Coletando candle mais recente...")
+        latest = collector.fetch_latest_candle()
+        if latest:
+            collector.store_candle(latest)
     
     logging.info("✅ Coleta concluída!")
 
@@ -1,60 +1,76 @@
 #!/usr/bin/env python3
-import requests
-import sqlite3
 from datetime import datetime, timedelta
 import logging
 import time
 
+from http_client import shared_client
+from candle_store import candle_store, DEFAULT_DB_PATH
+from candle_normalizer import from_kraken_ohlc, kraken_result, canonical_symbol
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
 class KrakenCollector:
-    def __init__(self, db_path="/root/.n8n/database.sqlite"):
+    def __init__(self, db_path=DEFAULT_DB_PATH, pairs=None):
         self.db_path = db_path
         # Kraken API pública (sem autenticação)
         self.api_url = "https://api.kraken.com/0/public"
-        self.symbol = "XXBTZUSD"  # Bitcoin em USD
+        # Pares coletados a cada ciclo; `symbol` é o primeiro (Bitcoin em USD por padrão)
+        self.pairs = list(pairs or ["XXBTZUSD"])
+        self.symbol = self.pairs[0]
+    
+    def _params(self, since=None, pair=None):
+        params = {
+            "pair": pair or self.symbol,
+            "interval": 5  # 5 minutos
+        }
+        if since is not None:
+            params["since"] = since
+        return params
+    
+    def parse_ohlc(self, data, pair=None):
+        """Converte a resposta de /OHLC de `pair` em candles de 5 min normalizados"""
+        pair = pair or self.symbol
+        return [from_kraken_ohlc(row, 5, canonical_symbol(pair)) for row in kraken_result(data, pair)]
+    
+    def parse_latest(self, data, pair=None):
+        """Último candle de 5 min da resposta (ou None se vazia)"""
+        candles = self.parse_ohlc(data, pair)
+        return candles[-1] if candles else None
+    
+    def jobs(self, historical_limit=288):
+        """Requisições de um ciclo de coleta, para o CollectionEngine
+        
+        /OHLC aceita um par por chamada: uma requisição por par, em paralelo até o limite
+        da Kraken. As últimas 24h já terminam no candle atual, sem chamada separada.
+        """
+        since = int((datetime.now() - timedelta(hours=24)).timestamp())
+        return [
+            {
+                "name": f"kraken.{pair}.5min.historical",
+                "url": f"{self.api_url}/OHLC",
+                "params": self._params(since, pair),
+                "timeout": 10,
+                "parse": lambda data, pair=pair: self.parse_ohlc(data, pair)[-historical_limit:],
+                "store": self.store_multiple_5min,
+            }
+            for pair in self.pairs
+        ]
     
     def fetch_ohlc_5min(self):
         """Busca OHLC de 5 minutos em tempo real"""
         try:
-            url = f"{self.api_url}/OHLC"
-            params = {
-                "pair": self.symbol,
-                "interval": 5  # 5 minutos
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
+            response = shared_client().get(f"{self.api_url}/OHLC", params=self._params(), timeout=10)
             response.raise_for_status()
             
-            data = response.json()
-            
-            if data.get('error'):
-                logging.error(f"❌ Erro Kraken: {data['error']}")
-                return None
-            
-            # Kraken retorna dados em formato específico
-            ohlc_data = data.get('result', {}).get(self.symbol, [])
+            candle = self.parse_latest(response.json())
             
-            if not ohlc_data:
+            if candle is None:
                 logging.warning("⚠️ Nenhum dado OHLC recebido")
                 return None
             
-            # Último candle de 5 min
-            latest = ohlc_data[-1]
-            
-            candle = {
-                "openTime": int(latest[0] * 1000),
-                "closeTime": int(latest[0] * 1000) + 300000,  # 5 min em ms
-                "open": float(latest[1]),
-                "high": float(latest[2]),
-                "low": float(latest[3]),
-                "close": float(latest[4]),
-                "volume": float(latest[6])
-            }
-            
             logging.info(f"✅ Candle 5min recebido: BTC @ ${candle['close']:.2f}")
             return candle
         
@@ -65,30 +81,11 @@ class KrakenCollector:
     def fetch_historical_5min(self, limit=288):
         """Busca últimos N candles de 5 min (288 = 1 dia)"""
         try:
-            url = f"{self.api_url}/OHLC"
-            params = {
-                "pair": self.symbol,
-                "interval": 5,
-                "since": int((datetime.now() - timedelta(hours=24)).timestamp())
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
+            since = int((datetime.now() - timedelta(hours=24)).timestamp())
+            response = shared_client().get(f"{self.api_url}/OHLC", params=self._params(since), timeout=10)
             response.raise_for_status()
             
-            data = response.json()
-            ohlc_data = data.get('result', {}).get(self.symbol, [])
-            
-            candles = []
-            for candle in ohlc_data[-limit:]:
-                candles.append({
-                    "openTime": int(candle[0] * 1000),
-                    "closeTime": int(candle[0] * 1000) + 300000,
-                    "open": float(candle[1]),
-                    "high": float(candle[2]),
-                    "low": float(candle[3]),
-                    "close": float(candle[4]),
-                    "volume": float(candle[6])
-                })
+            candles = self.parse_ohlc(response.json())[-limit:]
             
             logging.info(f"✅ {len(candles)} candles 5min históricos recebidos")
             return candles
@@ -100,41 +97,7 @@ class KrakenCollector:
     def store_5min_candle(self, candle):
         """Armazena candle 5min em tabela separada"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Cria tabela se não existir
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS maria_helena_candles_5min (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    openTime INTEGER UNIQUE,
-                    closeTime INTEGER,
-                    open REAL,
-                    high REAL,
-                    low REAL,
-                    close REAL,
-                    volume REAL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            cursor.execute("""
-                INSERT OR IGNORE INTO maria_helena_candles_5min 
-                (openTime, closeTime, open, high, low, close, volume)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                candle["openTime"],
-                candle["closeTime"],
-                candle["open"],
-                candle["high"],
-                candle["low"],
-                candle["close"],
-                candle["volume"]
-            ))
-            
-            conn.commit()
-            conn.close()
-            
+            candle_store(self.db_path).insert("maria_helena_candles_5min", [candle])
             return True
         
         except Exception as e:
@@ -144,41 +107,7 @@ class KrakenCollector:
     def store_multiple_5min(self, candles):
         """Armazena múltiplos candles 5min"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Cria tabela se não existir
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS maria_helena_candles_5min (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    openTime INTEGER UNIQUE,
-                    closeTime INTEGER,
-                    open REAL,
-                    high REAL,
-                    low REAL,
-                    close REAL,
-                    volume REAL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            for candle in candles:
-                cursor.execute("""
-                    INSERT OR IGNORE INTO maria_helena_candles_5min 
-                    (openTime, closeTime, open, high, low, close, volume)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    candle["openTime"],
-                    candle["closeTime"],
-                    candle["open"],
-                    candle["high"],
-                    candle["low"],
-                    candle["close"],
-                    candle["volume"]
-                ))
-            
-            conn.commit()
-            conn.close()
+            candle_store(self.db_path).insert("maria_helena_candles_5min", candles)
             
             logging.info(f"✅ {len(candles)} candles 5min armazenados")
             return True
@@ -1,97 +1,90 @@
 #!/usr/bin/env python3
-import requests
-import sqlite3
 from datetime import datetime, timedelta
 import logging
 import time
 
+from http_client import shared_client
+from candle_store import candle_store, DEFAULT_DB_PATH
+from candle_normalizer import from_kraken_ohlc, kraken_result, canonical_symbol
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
 class KrakenHistoricalCollector:
-    def __init__(self, db_path="/root/.n8n/database.sqlite"):
+    def __init__(self, db_path=DEFAULT_DB_PATH, pairs=None):
         self.db_path = db_path
         self.api_url = "https://api.kraken.com/0/public"
-        self.symbol = "XXBTZUSD"
+        self.pairs = list(pairs or ["XXBTZUSD"])
+        self.symbol = self.pairs[0]
+    
+    def _params(self, days, pair=None):
+        return {
+            "pair": pair or self.symbol,
+            "interval": 1440,  # 1 dia em minutos
+            "since": int((datetime.now() - timedelta(days=days)).timestamp())
+        }
+    
+    def parse_daily(self, data, pair=None):
+        """Converte a resposta de /OHLC de `pair` em candles diários normalizados"""
+        pair = pair or self.symbol
+        return [from_kraken_ohlc(row, 1440, canonical_symbol(pair)) for row in kraken_result(data, pair)]
+    
+    def jobs(self, days=5475):
+        """Requisições de um ciclo de coleta, para o CollectionEngine (uma por par)"""
+        return [
+            {
+                "name": f"kraken.{pair}.daily",
+                "url": f"{self.api_url}/OHLC",
+                "params": self._params(days, pair),
+                "timeout": 15,
+                "parse": lambda data, pair=pair: self.parse_daily(data, pair),
+                "store": self.store_candles,
+            }
+            for pair in self.pairs
+        ]
     
     def fetch_historical_daily(self, days=5475):
         """Busca histórico diário completo"""
         try:
             logging.info(f"📊 Buscando ~{days} dias de histórico diário...")
+            if days > 720:
+                logging.warning("⚠️ /OHLC devolve só os 720 candles mais recentes; "
+                                "para histórico completo use kraken_backfill.py --interval 1440")
             
-            url = f"{self.api_url}/OHLC"
-            since = int((datetime.now() - timedelta(days=days)).timestamp())
-            
-            params = {
-                "pair": self.symbol,
-                "interval": 1440,  # 1 dia em minutos
-                "since": since
-            }
-            
-            response = requests.get(url, params=params, timeout=15)
+            response = shared_client().get(f"{self.api_url}/OHLC", params=self._params(days), timeout=15)
             response.raise_for_status()
             
-            data = response.json()
-            
-            if data.get('error'):
-                logging.error(f"❌ Erro Kraken: {data['error']}")
-                return []
-            
-            ohlc_data = data.get('result', {}).get(self.symbol, [])
-            
-            logging.info(f"✅ {len(ohlc_data)} candles diários recebidos")
-            
-            candles = []
-            for candle in ohlc_data:
-                candles.append({
-                    "openTime": int(candle[0] * 1000),
-                    "closeTime": int(candle[0] * 1000) + 86400000,
-                    "open": float(candle[1]),
-                    "high": float(candle[2]),
-                    "low": float(candle[3]),
-                    "close": float(candle[4]),
-                    "volume": float(candle[6])
-                })
+            candles = self.parse_daily(response.json())
             
+            logging.info(f"✅ {len(candles)} candles diários recebidos")
             return candles
         
         except Exception as e:
             logging.error(f"❌ Erro ao buscar histórico diário: {str(e)}")
             return []
     
-    def store_candles(self, candles):
-        """Armazena candles"""
+    def store_candles(self, candles, mode="merge"):
+        """Armazena candles
+        
+        mode="merge" grava só o que é novo ou mudou, preservando ids e indicadores;
+        mode="replace" apaga os candles dos pares recebidos e regrava tudo.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Limpar dados antigos
-            cursor.execute("DELETE FROM maria_helena_candles")
-            logging.info("🗑️ Banco limpo")
-            
-            for candle in candles:
-                cursor.execute("""
-                    INSERT INTO maria_helena_candles 
-                    (openTime, closeTime, open, high, low, close, volume)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    candle["openTime"],
-                    candle["closeTime"],
-                    candle["open"],
-                    candle["high"],
-                    candle["low"],
-                    candle["close"],
-                    candle["volume"]
-                ))
-            
-            conn.commit()
-            
-            cursor.execute("SELECT COUNT(*) FROM maria_helena_candles")
-            total = cursor.fetchone()[0]
+            store = candle_store(self.db_path)
+            if mode == "replace":
+                # Limpar dados antigos (só dos pares recebidos)
+                with store.transaction():
+                    for symbol in sorted({c["symbol"] for c in candles}):
+                        store.replace_all("maria_helena_candles",
+                                          [c for c in candles if c["symbol"] == symbol], symbol=symbol)
+                logging.info("🗑️ Banco limpo")
+            else:
+                inserted, updated, _ = store.merge("maria_helena_candles", candles)
+                logging.info(f"🔀 {inserted} candles novos, {updated} alterados")
             
-            conn.close()
+            total = store.count("maria_helena_candles")
             
             logging.info(f"✅ {total} candles armazenados!")
             return True
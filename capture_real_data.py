@@ -1,9 +1,9 @@
 #!/usr/bin/env python3
-import requests
-import sqlite3
-from datetime import datetime, timedelta
 import logging
-import time
+
+from http_client import shared_client
+from candle_store import candle_store, DEFAULT_DB_PATH
+from candle_normalizer import canonical_symbol, from_coingecko_market_chart
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,26 +11,68 @@ logging.basicConfig(
 )
 
 class RealMarketCollector:
-    def __init__(self, symbol="bitcoin", db_path="/root/.n8n/database.sqlite"):
-        self.symbol = symbol
+    def __init__(self, symbol="bitcoin", db_path=DEFAULT_DB_PATH, symbols=None):
+        # ids da CoinGecko coletados a cada ciclo; `symbol` é o primeiro
+        self.symbols = list(symbols or [symbol])
+        self.symbol = self.symbols[0]
         self.db_path = db_path
         
         # CoinGecko API (sem bloqueio!)
         self.api_url = "https://api.coingecko.com/api/v3"
     
+    def _market_params(self):
+        return {
+            # simple/price aceita vários ids numa só chamada
+            "ids": ",".join(self.symbols),
+            "vs_currencies": "usd",
+            "include_market_cap": "true",
+            "include_24hr_vol": "true",
+            "include_market_cap_change_24h": "true"
+        }
+    
+    def _history_params(self, days):
+        return {
+            "vs_currency": "usd",
+            "days": days,
+            "interval": "daily"
+        }
+    
+    def parse_market_chart(self, data, coin=None):
+        """Candles diários do market_chart de `coin` (OHLC simulado, igual ao do histórico de 15 anos)"""
+        return from_coingecko_market_chart(data, canonical_symbol(coin or self.symbol))
+    
+    def jobs(self, days=14):
+        """Requisições de um ciclo de coleta, para o CollectionEngine
+        
+        market_chart é por moeda (uma requisição cada, em paralelo); os preços atuais de
+        todas as moedas vêm numa única chamada a simple/price.
+        """
+        return [
+            {
+                "name": f"coingecko.{coin}.historical",
+                "url": f"{self.api_url}/coins/{coin}/market_chart",
+                "params": self._history_params(days),
+                "timeout": 10,
+                "parse": lambda data, coin=coin: self.parse_market_chart(data, coin),
+                "store": self.store_multiple_candles,
+            }
+            for coin in self.symbols
+        ] + [
+            {
+                "name": f"coingecko.{','.join(self.symbols)}.price",
+                "url": f"{self.api_url}/simple/price",
+                "params": self._market_params(),
+                "timeout": 10,
+                "parse": lambda data: data,
+                "store": None,
+            },
+        ]
+    
     def fetch_market_data(self):
         """Busca dados REAIS do mercado"""
         try:
             url = f"{self.api_url}/simple/price"
-            params = {
-                "ids": self.symbol,
-                "vs_currencies": "usd",
-                "include_market_cap": "true",
-                "include_24hr_vol": "true",
-                "include_market_cap_change_24h": "true"
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
+            response = shared_client().get(url, params=self._market_params(), timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -45,39 +87,12 @@ class RealMarketCollector:
         """Busca 14 dias de dados históricos REAIS"""
         try:
             url = f"{self.api_url}/coins/{self.symbol}/market_chart"
-            params = {
-                "vs_currency": "usd",
-                "days": days,
-                "interval": "daily"
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
+            response = shared_client().get(url, params=self._history_params(days), timeout=10)
             response.raise_for_status()
             
-            data = response.json()
-            prices = data.get('prices', [])
-            volumes = data.get('volumes', [])
-            
-            logging.info(f"✅ {len(prices)} dias de histórico recebidos")
-            
-            candles = []
-            for i, (timestamp, price) in enumerate(prices):
-                candle_time = datetime.fromtimestamp(timestamp / 1000)
-                volume = volumes[i][1] if i < len(volumes) else 0
-                
-                # Simula OHLC a partir do preço diário
-                variation = price * 0.02  # 2% de variação
-                
-                candles.append({
-                    "openTime": int(timestamp),
-                    "closeTime": int(timestamp) + 86400000,
-                    "open": round(price - variation, 2),
-                    "high": round(price + variation, 2),
-                    "low": round(price - variation, 2),
-                    "close": round(price, 2),
-                    "volume": round(volume, 2)
-                })
+            candles = self.parse_market_chart(response.json())
             
+            logging.info(f"✅ {len(candles)} dias de histórico recebidos")
             return candles
         
         except Exception as e:
@@ -87,26 +102,7 @@ class RealMarketCollector:
     def store_candle(self, candle):
         """Armazena candle no banco"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT OR IGNORE INTO maria_helena_candles 
-                (openTime, closeTime, open, high, low, close, volume)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                candle["openTime"],
-                candle["closeTime"],
-                candle["open"],
-                candle["high"],
-                candle["low"],
-                candle["close"],
-                candle["volume"]
-            ))
-            
-            conn.commit()
-            conn.close()
-            
+            candle_store(self.db_path).insert("maria_helena_candles", [candle])
             return True
         
         except Exception as e:
@@ -116,26 +112,7 @@ class RealMarketCollector:
     def store_multiple_candles(self, candles):
         """Armazena múltiplos candles"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            for candle in candles:
-                cursor.execute("""
-                    INSERT OR IGNORE INTO maria_helena_candles 
-                    (openTime, closeTime, open, high, low, close, volume)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    candle["openTime"],
-                    candle["closeTime"],
-                    candle["open"],
-                    candle["high"],
-                    candle["low"],
-                    candle["close"],
-                    candle["volume"]
-                ))
-            
-            conn.commit()
-            conn.close()
+            candle_store(self.db_path).insert("maria_helena_candles", candles)
             
             logging.info(f"✅ {len(candles)} candles REAIS armazenados!")
             return True
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+import asyncio
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlparse
+import logging
+
+from http_client import shared_client, enable_archive
+from candle_store import DEFAULT_DB_PATH
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Requisições simultâneas por host (limites públicos de cada API)
+HOST_LIMITS = {
+    "api.binance.com": 10,
+    "api.kraken.com": 2,
+    "api.coingecko.com": 2,
+}
+DEFAULT_HOST_LIMIT = 4
+
+
+class CollectionEngine:
+    """Executa os jobs de vários coletores em paralelo sobre o HttpClient compartilhado
+
+    Cada job é um dict montado pelo `jobs()` do coletor:
+    {"name", "url", "params", "timeout", "parse": f(json) -> candles, "store": f(candles) -> bool}
+    As requisições rodam concorrentes (limitadas por host); as gravações no SQLite rodam
+    em sequência depois, para não disputar o lock de escrita.
+    """
+
+    def __init__(self, host_limits=None, client=None):
+        self.host_limits = dict(HOST_LIMITS, **(host_limits or {}))
+        self.client = client or shared_client()
+        self._semaphores = {}
+        # Threads para todas as requisições simultâneas permitidas (o executor padrão do
+        # asyncio tem cpu_count + 4 e limitaria os pares em paralelo em máquinas pequenas)
+        self.executor = ThreadPoolExecutor(
+            max_workers=sum(self.host_limits.values()) + DEFAULT_HOST_LIMIT,
+            thread_name_prefix="collect",
+        )
+
+    def _semaphore(self, url):
+        host = urlparse(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.host_limits.get(host, DEFAULT_HOST_LIMIT))
+        return self._semaphores[host]
+
+    async def fetch_json(self, url, params=None, timeout=10):
+        """GET assíncrono: a chamada bloqueante roda numa thread, limitada pelo semáforo do host"""
+        async with self._semaphore(url):
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, partial(self.client.get_json, url, params, timeout)
+            )
+
+    async def _run_job(self, job):
+        start = time.perf_counter()
+        try:
+            data = await self.fetch_json(job["url"], job.get("params"), job.get("timeout", 10))
+            return job, job["parse"](data), None, time.perf_counter() - start
+        except Exception as e:
+            logging.error(f"❌ {job['name']}: {str(e)}")
+            return job, None, e, time.perf_counter() - start
+
+    async def collect(self, jobs):
+        """Busca e normaliza todos os jobs concorrentemente"""
+        # Semáforos pertencem ao event loop corrente: recria a cada ciclo
+        self._semaphores = {}
+        return await asyncio.gather(*(self._run_job(job) for job in jobs))
+
+    def run_cycle(self, jobs):
+        """Ciclo completo: busca concorrente e depois gravação sequencial. Devolve {job: ok}"""
+        start = time.perf_counter()
+        results = asyncio.run(self.collect(jobs))
+        fetch_time = time.perf_counter() - start
+
+        summary = {}
+        for job, result, error, elapsed in results:
+            ok = error is None and result is not None
+            if ok and job.get("store"):
+                ok = bool(job["store"](result))
+            summary[job["name"]] = ok
+            logging.info(f"{'✅' if ok else '❌'} {job['name']} ({elapsed:.2f}s)")
+
+        logging.info(f"⏱️ Busca: {fetch_time:.2f}s | ciclo total: {time.perf_counter() - start:.2f}s")
+        return summary
+
+
+# Exchange de cada fonte (chave de `pairs` e `api_urls`)
+SOURCE_EXCHANGES = {
+    "binance": "binance",
+    "kraken": "kraken",
+    "kraken_daily": "kraken",
+    "coingecko_15y": "coingecko",
+    "coingecko": "coingecko",
+}
+
+
+def build_jobs(sources, db_path, pairs=None, api_urls=None):
+    """Jobs de coleta das fontes pedidas
+
+    `pairs` dá a lista de pares por exchange ({"binance": [...], "kraken": [...],
+    "coingecko": [...]}); exchanges ausentes coletam só o par padrão (BTC). `api_urls`
+    troca o `api_url` dos coletores de uma exchange (ex.: fake_exchange.py local).
+    """
+    from capture_binance_data import BinanceCollector
+    from capture_kraken_5min import KrakenCollector
+    from capture_kraken_historical import KrakenHistoricalCollector
+    from capture_15years_bitcoin import BitcoinHistoryCollector
+    from capture_real_data import RealMarketCollector
+
+    pairs = pairs or {}
+    api_urls = api_urls or {}
+
+    adapters = {
+        "binance": lambda: BinanceCollector(db_path=db_path, symbols=pairs.get("binance")),
+        "kraken": lambda: KrakenCollector(db_path=db_path, pairs=pairs.get("kraken")),
+        "kraken_daily": lambda: KrakenHistoricalCollector(db_path=db_path, pairs=pairs.get("kraken")),
+        "coingecko_15y": lambda: BitcoinHistoryCollector(db_path=db_path),
+        "coingecko": lambda: RealMarketCollector(db_path=db_path, symbols=pairs.get("coingecko")),
+    }
+
+    jobs = []
+    for source in sources:
+        collector = adapters[source]()
+        if api_urls.get(SOURCE_EXCHANGES[source]):
+            collector.api_url = api_urls[SOURCE_EXCHANGES[source]]
+        jobs.extend(collector.jobs())
+    return jobs
+
+
+def add_pair_arguments(parser):
+    """Opções de linha de comando com a lista de pares de cada exchange"""
+    parser.add_argument("--binance-symbols", nargs="+", default=None, help="ex.: BTCUSDT ETHUSDT")
+    parser.add_argument("--kraken-pairs", nargs="+", default=None, help="ex.: XXBTZUSD ETHUSD")
+    parser.add_argument("--coingecko-ids", nargs="+", default=None, help="ex.: bitcoin ethereum")
+
+
+def pair_lists(args):
+    return {"binance": args.binance_symbols, "kraken": args.kraken_pairs, "coingecko": args.coingecko_ids}
+
+
+def add_api_url_arguments(parser):
+    """Opção --api-url EXCHANGE URL, repetível: aponta os coletores para outra API (ex.: fake_exchange.py)"""
+    parser.add_argument("--api-url", nargs=2, action="append", metavar=("EXCHANGE", "URL"), default=[],
+                        help="api_url alternativo de uma exchange (binance: URL do /klines; "
+                             "kraken: base /0/public; coingecko: base /api/v3)")
+
+
+def api_url_map(args):
+    urls = dict(args.api_url)
+    unknown = set(urls) - set(SOURCE_EXCHANGES.values())
+    if unknown:
+        raise SystemExit(f"--api-url: exchange desconhecida: {', '.join(sorted(unknown))}")
+    return urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coleta concorrente Binance/Kraken/CoinGecko")
+    parser.add_argument("--sources", nargs="+", default=["binance", "kraken", "coingecko"],
+                        choices=["binance", "kraken", "kraken_daily", "coingecko_15y", "coingecko"])
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--archive-dir", default=None,
+                        help="arquiva as respostas brutas das APIs (replay: response_archive.py)")
+    add_pair_arguments(parser)
+    add_api_url_arguments(parser)
+    args = parser.parse_args()
+
+    if args.archive_dir:
+        enable_archive(args.archive_dir)
+
+    logging.info("=" * 60)
+    logging.info("🚀 COLETA CONCORRENTE")
+    logging.info("=" * 60)
+
+    engine = CollectionEngine()
+    summary = engine.run_cycle(build_jobs(args.sources, args.db_path, pair_lists(args), api_url_map(args)))
+
+    logging.info(f"✅ {sum(summary.values())}/{len(summary)} jobs OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+import time
+import signal
+import argparse
+import threading
+import logging
+
+from collection_engine import (
+    CollectionEngine, build_jobs, add_pair_arguments, pair_lists, add_api_url_arguments, api_url_map
+)
+from calculate_indicators import IndicatorCalculator
+from health_check import HealthCheck
+from candle_store import candle_store, DEFAULT_DB_PATH
+from gap_repair import GapRepair, GAP_TABLES
+from candle_rollup import CandleRollup
+from http_client import shared_client, enable_archive
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Segundos após o fechamento de cada intervalo: dá tempo de a exchange publicar o candle
+DEFAULT_OFFSET = 5.0
+
+
+class ScheduledJob:
+    """Job periódico, alinhado aos múltiplos de `interval` (+ `offset`) no relógio"""
+
+    def __init__(self, name, interval, func, offset=DEFAULT_OFFSET):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.offset = offset
+        self.next_run = 0.0  # roda no primeiro ciclo
+        self.runs = 0
+        self.failures = 0
+
+    def schedule_next(self, now):
+        """Próximo múltiplo do intervalo; execuções perdidas não se acumulam"""
+        self.next_run = now - (now - self.offset) % self.interval + self.interval
+
+    def run(self):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            ok = self.func() is not False
+        except Exception as e:
+            logging.error(f"❌ {self.name}: {str(e)}")
+            ok = False
+
+        self.runs += 1
+        self.failures += not ok
+        logging.info(f"{'✅' if ok else '❌'} {self.name}: {time.perf_counter() - wall:.2f}s "
+                     f"(CPU {time.process_time() - cpu:.2f}s)")
+        return ok
+
+
+class CollectorDaemon:
+    """Coleta, indicadores e health check num único processo de longa duração
+
+    Os módulos são importados uma vez; o HttpClient compartilhado mantém as conexões
+    keep-alive entre ciclos e coletores, indicadores e health check usam a mesma conexão
+    SQLite (a do CandleStore). Cada job tem seu próprio intervalo; jobs vencidos no mesmo instante rodam na
+    ordem em que foram registrados (captura antes dos indicadores).
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, pairs=None, api_urls=None):
+        self.db_path = db_path
+        # Pares e URLs alternativas por exchange, como em build_jobs
+        self.pairs = pairs or {}
+        self.api_urls = api_urls or {}
+        self.engine = CollectionEngine()
+        self.calculator = IndicatorCalculator(db_path=db_path)
+        self.health = HealthCheck(db_path=db_path)
+        self.gap_repairs = [
+            GapRepair(db_path=db_path, pair=pair) for pair in self.pairs.get("kraken") or ["XXBTZUSD"]
+        ]
+        if self.api_urls.get("kraken"):
+            for repair in self.gap_repairs:
+                repair.api_url = self.api_urls["kraken"]
+        self.store = candle_store(db_path)
+        self.conn = self.store.conn
+        self.jobs = []
+        self.stop_event = threading.Event()
+
+    def add_job(self, name, interval, func, offset=DEFAULT_OFFSET):
+        self.jobs.append(ScheduledJob(name, interval, func, offset))
+
+    def capture(self, sources):
+        summary = self.engine.run_cycle(build_jobs(sources, self.db_path, self.pairs, self.api_urls))
+        return all(summary.values())
+
+    def indicators(self):
+        try:
+            if self.store.writer is not None:
+                return self.store.writer.update_indicators()
+        except (ConnectionError, FileNotFoundError) as e:
+            logging.warning(f"⚠️ Escritor único indisponível ({str(e)}), calculando direto")
+        with self.store.lock:
+            return self.calculator.update_indicators(conn=self.conn)
+
+    def rollup(self, rollup, retention_days=None):
+        rollup.run()
+        if retention_days is not None:
+            rollup.compact(retention_days)
+
+    def export_columnar(self, exporter):
+        with self.store.lock:
+            exporter.sync_all(conn=self.conn)
+
+    def repair_gaps(self):
+        """Preenche lacunas recentes (ex.: ciclos perdidos) com uma chamada por tabela e par"""
+        for repair in self.gap_repairs:
+            for table in GAP_TABLES:
+                repair.repair_recent(table)
+
+    def health_check(self):
+        with self.store.lock:
+            result = self.health.check_database(conn=self.conn)
+        if "error" in result:
+            logging.error(f"🏥 Banco: {result['error']}")
+            return False
+        logging.info(f"🏥 Banco: {result['total_candles']} candles, última atualização {result['last_update']}")
+        return True
+
+    def run_once(self):
+        """Roda todos os jobs uma vez, em ordem (substitui uma execução do cron)"""
+        return all([job.run() for job in self.jobs])
+
+    def run(self):
+        """Loop do agendador até SIGINT/SIGTERM"""
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: self.stop_event.set())
+
+        logging.info(f"🕒 Daemon iniciado: {', '.join(f'{j.name}/{j.interval:.0f}s' for j in self.jobs)}")
+        while not self.stop_event.is_set():
+            for job in self.jobs:
+                if self.stop_event.is_set():
+                    break
+                if time.time() >= job.next_run:
+                    job.run()
+                    job.schedule_next(time.time())
+
+            wait = min(job.next_run for job in self.jobs) - time.time()
+            self.stop_event.wait(max(wait, 0))
+
+        self.close()
+        logging.info("🛑 Daemon encerrado")
+
+    def close(self):
+        self.store.close()
+        if shared_client().archive is not None:
+            shared_client().archive.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daemon de coleta (captura, indicadores e health check)")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--sources", nargs="+", default=["binance", "kraken", "coingecko"],
+                        choices=["binance", "kraken", "kraken_daily", "coingecko_15y", "coingecko"])
+    parser.add_argument("--capture-interval", type=float, default=300)
+    parser.add_argument("--daily-interval", type=float, default=86400,
+                        help="intervalo da coleta diária histórica (CoinGecko 15 anos)")
+    parser.add_argument("--indicators-interval", type=float, default=300)
+    parser.add_argument("--health-interval", type=float, default=900)
+    parser.add_argument("--gaps-interval", type=float, default=3600)
+    parser.add_argument("--once", action="store_true", help="roda cada job uma vez e sai")
+    add_pair_arguments(parser)
+    add_api_url_arguments(parser)
+    parser.add_argument("--archive-dir", default=None,
+                        help="arquiva as respostas brutas das APIs (replay: response_archive.py)")
+    parser.add_argument("--retention-days", type=int, default=None,
+                        help="apaga os candles 5min mais antigos que isso, depois de agregados (15m a 1d)")
+    parser.add_argument("--columnar-dir", default=None,
+                        help="mantém a cópia colunar (memmap) em dia após os indicadores")
+    args = parser.parse_args()
+
+    if args.archive_dir:
+        enable_archive(args.archive_dir)
+
+    daemon = CollectorDaemon(db_path=args.db_path, pairs=pair_lists(args), api_urls=api_url_map(args))
+    daemon.add_job("capture", args.capture_interval, lambda: daemon.capture(args.sources))
+    daemon.add_job("capture_daily", args.daily_interval, lambda: daemon.capture(["coingecko_15y"]))
+    # Agregação antes dos indicadores: as tabelas 15m a 1d são calculadas no mesmo ciclo
+    rollup = CandleRollup(args.db_path)
+    daemon.add_job("rollup", args.indicators_interval, lambda: daemon.rollup(rollup, args.retention_days))
+    daemon.add_job("indicators", args.indicators_interval, daemon.indicators)
+    if args.columnar_dir:
+        from columnar_store import ColumnarExporter
+        exporter = ColumnarExporter(args.columnar_dir, args.db_path)
+        daemon.add_job("columnar", args.indicators_interval, lambda: daemon.export_columnar(exporter))
+    daemon.add_job("gaps", args.gaps_interval, daemon.repair_gaps)
+    daemon.add_job("health", args.health_interval, daemon.health_check)
+
+    if args.once:
+        ok = daemon.run_once()
+        daemon.close()
+        raise SystemExit(0 if ok else 1)
+
+    daemon.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+import logging
+
+from candle_store import DEFAULT_DB_PATH
+from calculate_indicators import IndicatorCalculator, CANDLE_TABLES, INDICATOR_COLUMNS, IO_BATCH_SIZE
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+COLUMNAR_DIR = "/root/maria-helena-scripts/columnar"
+
+# Uma coluna por arquivo, largura fixa, little-endian; NULL vira NaN
+COLUMN_DTYPES = dict(
+    [("openTime", "<i8")]
+    + [(col, "<f8") for col in ("open", "high", "low", "close", "volume")]
+    + [(col, "<f8") for col in INDICATOR_COLUMNS]
+)
+
+FORMAT_VERSION = 1
+HEADER_FILE = "header.json"
+
+
+class ColumnarCandles:
+    """Série de um par em formato colunar: <raiz>/<tabela>/<symbol>/<coluna>.bin + header.json
+
+    O header diz quantas linhas são válidas; bytes além disso (exportação em andamento)
+    são ignorados. As colunas são abertas com numpy.memmap: abrir não lê o histórico e
+    `window` devolve fatias (views) dos mapas, sem cópia. Para ver linhas exportadas
+    depois da abertura, basta abrir de novo.
+    """
+
+    def __init__(self, root, table, symbol):
+        self.path = os.path.join(root, table, symbol)
+        with open(os.path.join(self.path, HEADER_FILE)) as f:
+            self.header = json.load(f)
+        self.rows = self.header["rows"]
+        self._columns = {}
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def columns(self):
+        return list(self.header["columns"])
+
+    def column(self, name):
+        """Coluna inteira como memmap somente leitura"""
+        if name not in self._columns:
+            dtype = np.dtype(self.header["columns"][name])
+            if self.rows == 0:
+                self._columns[name] = np.empty(0, dtype=dtype)
+            else:
+                self._columns[name] = np.memmap(os.path.join(self.path, f"{name}.bin"),
+                                                dtype=dtype, mode="r", shape=(self.rows,))
+        return self._columns[name]
+
+    def window(self, start=None, end=None, columns=None):
+        """{coluna: view} dos candles com start <= openTime < end (ms), por busca binária"""
+        open_time = self.column("openTime")
+        first = 0 if start is None else int(np.searchsorted(open_time, start, side="left"))
+        last = self.rows if end is None else int(np.searchsorted(open_time, end, side="left"))
+        return {name: self.column(name)[first:last] for name in columns or self.columns}
+
+    def frame(self, start=None, end=None, columns=None):
+        """DataFrame da janela (copia só as linhas pedidas)"""
+        return pd.DataFrame(self.window(start, end, columns))
+
+
+class ColumnarExporter:
+    """Mantém a cópia colunar das tabelas de candles em dia com o SQLite
+
+    Só entram candles com indicadores já calculados (até o last_open_time do estado do
+    calculador). Candles alterados no passado recuam o estado e ficam registrados em
+    maria_helena_indicator_rewinds: a exportação seguinte regrava a partir do menor
+    recuo ainda não visto. Fora isso, cada rodada só acrescenta as linhas novas.
+    """
+
+    def __init__(self, root=COLUMNAR_DIR, db_path=DEFAULT_DB_PATH):
+        self.root = root
+        self.db_path = db_path
+
+    def _read_header(self, path):
+        try:
+            with open(os.path.join(path, HEADER_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_header(self, path, header):
+        # Troca atômica: leitores nunca veem um header pela metade
+        tmp = os.path.join(path, HEADER_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(header, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(path, HEADER_FILE))
+
+    def _column_file(self, path, name):
+        file_path = os.path.join(path, f"{name}.bin")
+        return open(file_path, "r+b" if os.path.exists(file_path) else "w+b")
+
+    def sync(self, conn, table, symbol):
+        """Exporta o que mudou de `symbol` em `table`; devolve quantas linhas foram gravadas"""
+        path = os.path.join(self.root, table, symbol)
+        os.makedirs(path, exist_ok=True)
+        header = self._read_header(path) or {
+            "version": FORMAT_VERSION,
+            "table": table,
+            "symbol": symbol,
+            "timeframe": CANDLE_TABLES.get(table, {}).get("timeframe"),
+            "columns": COLUMN_DTYPES,
+            "rows": 0,
+            "last_open_time": None,
+            "rewind_id": 0,
+        }
+
+        cursor = conn.cursor()
+        state = IndicatorCalculator(self.db_path).load_state(cursor, table, symbol)
+        watermark = None if state is None else state["last_open_time"]
+        rewind_from, rewind_id = cursor.execute("""
+            SELECT MIN(open_time), MAX(id) FROM maria_helena_indicator_rewinds
+            WHERE table_name = ? AND symbol = ? AND id > ?
+        """, (table, symbol, header["rewind_id"])).fetchone()
+
+        # Linhas mantidas: antes do menor recuo e até o estado atual do calculador
+        keep = header["rows"]
+        if keep and (watermark is None or rewind_from is not None or watermark < header["last_open_time"]):
+            open_time = np.memmap(os.path.join(path, "openTime.bin"), dtype="<i8", mode="r", shape=(keep,))
+            cut = 0 if watermark is None else watermark + 1
+            if rewind_from is not None:
+                cut = min(cut, rewind_from)
+            keep = int(np.searchsorted(open_time, cut, side="left"))
+            last_kept = int(open_time[keep - 1]) if keep else None
+            del open_time
+            if keep < header["rows"]:
+                # Encolhe o header antes de sobrescrever: uma queda no meio não expõe linhas misturadas
+                header.update(rows=keep, last_open_time=last_kept)
+                self._write_header(path, header)
+                logging.info(f"⏪ {table} {symbol}: cópia colunar refeita a partir da linha {keep}")
+        if rewind_id is not None:
+            header["rewind_id"] = rewind_id
+
+        written = 0
+        if watermark is not None:
+            names = list(COLUMN_DTYPES)
+            cursor.execute(f"""
+                SELECT {", ".join(names)} FROM {table}
+                WHERE symbol = ? AND openTime > ? AND openTime <= ?
+                ORDER BY openTime
+            """, (symbol, -1 if header["last_open_time"] is None else header["last_open_time"], watermark))
+
+            files = {name: self._column_file(path, name) for name in names}
+            try:
+                for name, f in files.items():
+                    f.seek(keep * np.dtype(COLUMN_DTYPES[name]).itemsize)
+                while True:
+                    batch = cursor.fetchmany(IO_BATCH_SIZE)
+                    if not batch:
+                        break
+                    # openTime (ms) cabe exatamente em float64 (< 2^53); NULL vira NaN
+                    block = np.array(batch, dtype=np.float64)
+                    for i, name in enumerate(names):
+                        files[name].write(block[:, i].astype(COLUMN_DTYPES[name]).tobytes())
+                    written += len(block)
+                    last_open_time = int(block[-1, 0])
+                for f in files.values():
+                    f.flush()
+                    os.fsync(f.fileno())
+            finally:
+                for f in files.values():
+                    f.close()
+
+            if written:
+                header.update(rows=keep + written, last_open_time=last_open_time)
+
+        self._write_header(path, header)
+        return written
+
+    def sync_all(self, tables=None, symbols=None, conn=None):
+        """Exporta todas as séries registradas numa única transação de leitura
+
+        `conn` permite reaproveitar uma conexão já aberta (ex.: a do daemon de coleta).
+        """
+        own_conn = conn is None
+        if own_conn:
+            conn = sqlite3.connect(self.db_path)
+        started = time.perf_counter()
+        total = 0
+        try:
+            cursor = conn.cursor()
+            IndicatorCalculator(self.db_path).ensure_state_table(cursor)
+            existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            conn.commit()
+            cursor.execute("BEGIN")
+            for table in [t for t in tables or list(CANDLE_TABLES) if t in existing]:
+                for (symbol,) in cursor.execute(f"SELECT DISTINCT symbol FROM {table}").fetchall():
+                    if symbols is None or symbol in symbols:
+                        written = self.sync(conn, table, symbol)
+                        total += written
+                        if written:
+                            logging.info(f"🧱 {table} {symbol}: {written} candles exportados")
+            conn.commit()
+        finally:
+            if own_conn:
+                conn.close()
+        logging.info(f"✅ Exportação colunar: {total} candles em {time.perf_counter() - started:.2f}s")
+        return total
+
+    def series(self):
+        """(tabela, symbol) já exportados"""
+        if not os.path.isdir(self.root):
+            return []
+        return [
+            (table, symbol)
+            for table in sorted(os.listdir(self.root))
+            for symbol in sorted(os.listdir(os.path.join(self.root, table)))
+            if os.path.exists(os.path.join(self.root, table, symbol, HEADER_FILE))
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cópia colunar (memmap) das tabelas de candles")
+    parser.add_argument("--root", default=COLUMNAR_DIR)
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--table", action="append", choices=list(CANDLE_TABLES),
+                        help="tabela a exportar (padrão: todas as registradas)")
+    parser.add_argument("--symbol", action="append", default=None, help="par a exportar (padrão: todos)")
+    parser.add_argument("--list", action="store_true", help="só lista as séries exportadas")
+    args = parser.parse_args()
+
+    exporter = ColumnarExporter(args.root, args.db_path)
+    if not args.list:
+        exporter.sync_all(tables=args.table, symbols=args.symbol)
+
+    for table, symbol in exporter.series():
+        candles = ColumnarCandles(args.root, table, symbol)
+        last = candles.header["last_open_time"]
+        logging.info(f"📦 {table} {symbol}: {len(candles)} candles"
+                     + (f", até {pd.Timestamp(last, unit='ms')}" if last is not None else ""))
+
+if __name__ == "__main__":
+    main()
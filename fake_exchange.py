@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""Servidor HTTP local que imita as APIs de mercado usadas pelos coletores (testes e benchmarks)
+
+Responde no formato real de cada exchange, com preços sintéticos e determinísticos:
+- Binance: /api/v3/klines (startTime/endTime inclusivos, limit)
+- Kraken:  /0/public/OHLC (só os 720 candles mais recentes, como a API real) e
+           /0/public/Trades (um trade a cada TRADE_SPACING s, páginas de 1000, cursor em ns)
+- CoinGecko: /api/v3/coins/<id>/market_chart e /api/v3/simple/price
+
+`--delay` simula a latência da rede em cada resposta. Os coletores apontam para cá com
+--api-url (ex.: capture_binance_data.py --api-url http://127.0.0.1:8780/api/v3/klines).
+"""
+import json
+import math
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+DEFAULT_PORT = 8780
+
+BINANCE_INTERVALS = {"1m": 1, "5m": 5, "15m": 15, "1h": 60, "4h": 240, "1d": 1440}
+KLINES_LIMIT = 1000
+OHLC_LIMIT = 720
+TRADES_PAGE = 1000
+TRADE_SPACING = 7
+
+# Nome interno que a Kraken devolve para os pares pedidos pelo ticker comum
+KRAKEN_NAMES = {"XBTUSD": "XXBTZUSD", "BTCUSD": "XXBTZUSD", "ETHUSD": "XETHZUSD", "XBTEUR": "XXBTZEUR"}
+
+
+def price_at(ms):
+    """Preço sintético no instante `ms`: ondas de 1 dia e de 6 horas em torno de 30000"""
+    t = ms / 3600000
+    return round(30000 + 800 * math.sin(t / 24 * 2 * math.pi) + 150 * math.sin(t / 6 * 2 * math.pi), 2)
+
+
+def ohlc_at(open_ms, interval_ms):
+    """(open, high, low, close, volume) do candle sintético que começa em `open_ms`"""
+    open_ = price_at(open_ms)
+    close = price_at(open_ms + interval_ms)
+    spread = max(abs(close - open_), 1.0)
+    return open_, max(open_, close) + spread / 2, min(open_, close) - spread / 2, close, round(interval_ms / 60000 * 1.5, 4)
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def binance_klines(query):
+    interval_ms = BINANCE_INTERVALS[query.get("interval", "5m")] * 60000
+    limit = min(int(query.get("limit", 500)), KLINES_LIMIT)
+    current = now_ms() - now_ms() % interval_ms
+    if "startTime" in query:
+        start = int(query["startTime"])
+        start += -start % interval_ms
+    else:
+        start = current - (limit - 1) * interval_ms
+    # endTime é inclusivo; o candle em andamento também vem (parcial)
+    end = min(int(query.get("endTime", current)), current)
+
+    klines = []
+    for open_ms in range(start, end + 1, interval_ms):
+        if len(klines) == limit:
+            break
+        open_, high, low, close, volume = ohlc_at(open_ms, interval_ms)
+        klines.append([open_ms, f"{open_:.2f}", f"{high:.2f}", f"{low:.2f}", f"{close:.2f}", f"{volume}",
+                       open_ms + interval_ms - 1, f"{volume * close:.2f}", 10, f"{volume / 2}",
+                       f"{volume * close / 2:.2f}", "0"])
+    return klines
+
+
+def kraken_ohlc(query):
+    pair = query.get("pair", "XXBTZUSD")
+    interval_ms = int(query.get("interval", 1)) * 60000
+    current = now_ms() - now_ms() % interval_ms
+    start = current - (OHLC_LIMIT - 1) * interval_ms
+    if "since" in query:
+        # `since` é exclusivo
+        since = int(query["since"]) * 1000
+        start = max(start, since - since % interval_ms + interval_ms)
+
+    rows = []
+    for open_ms in range(start, current + 1, interval_ms):
+        open_, high, low, close, volume = ohlc_at(open_ms, interval_ms)
+        rows.append([open_ms // 1000, f"{open_:.1f}", f"{high:.1f}", f"{low:.1f}", f"{close:.1f}",
+                     f"{(open_ + close) / 2:.1f}", f"{volume:.8f}", 10])
+    # `last`: o último candle fechado
+    last = rows[-2][0] if len(rows) > 1 else (start - interval_ms) // 1000
+    return {"error": [], "result": {KRAKEN_NAMES.get(pair, pair): rows, "last": last}}
+
+
+def kraken_trades(query):
+    pair = query.get("pair", "XXBTZUSD")
+    since = int(query.get("since", 0))
+    # Cursor em ns (como o `last` devolvido) ou em segundos
+    since_s = since / 1e9 if since > 1e12 else since
+    first = (int(since_s) // TRADE_SPACING + 1) * TRADE_SPACING
+    end = min(now_ms() // 1000, first + TRADE_SPACING * TRADES_PAGE)
+
+    trades = [[f"{price_at(t * 1000):.1f}", "0.05000000", float(t), "b" if t % 2 else "s", "l", "", t]
+              for t in range(first, end, TRADE_SPACING)]
+    last = str(int(trades[-1][2] * 1e9)) if trades else str(since)
+    return {"error": [], "result": {KRAKEN_NAMES.get(pair, pair): trades, "last": last}}
+
+
+def coingecko_market_chart(query):
+    days = query.get("days", "14")
+    days = 5475 if days == "max" else int(days)
+    today = now_ms() - now_ms() % 86400000
+    times = range(today - days * 86400000, today + 1, 86400000)
+    return {
+        "prices": [[t, price_at(t)] for t in times],
+        "market_caps": [[t, price_at(t) * 19.5e6] for t in times],
+        "total_volumes": [[t, 2.5e10] for t in times],
+        "volumes": [[t, 2.5e10] for t in times],
+    }
+
+
+def coingecko_price(query):
+    price = price_at(now_ms())
+    return {
+        coin: {"usd": price, "usd_market_cap": price * 19.5e6, "usd_24h_vol": 2.5e10, "usd_24h_change": 0.0}
+        for coin in query.get("ids", "bitcoin").split(",")
+    }
+
+
+ROUTES = [
+    ("/api/v3/klines", binance_klines),
+    ("/0/public/OHLC", kraken_ohlc),
+    ("/0/public/Trades", kraken_trades),
+    ("/market_chart", coingecko_market_chart),
+    ("/simple/price", coingecko_price),
+]
+
+
+class _ExchangeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+
+    def log_message(self, format, *args):
+        logging.debug(f"🌐 {self.address_string()} {format % args}")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        handler = next((func for suffix, func in ROUTES if url.path.endswith(suffix)), None)
+
+        time.sleep(self.delay)
+        if handler is None:
+            status, body = 404, {"error": f"rota desconhecida: {url.path}"}
+        else:
+            try:
+                status, body = 200, handler(query)
+            except (KeyError, ValueError) as e:
+                status, body = 400, {"error": f"parâmetro inválido: {str(e)}"}
+
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(port=0, delay=0.0, host="127.0.0.1"):
+    """Sobe o servidor numa thread daemon; devolve (servidor, URL base). `port=0` escolhe uma livre"""
+    handler = type("ExchangeHandler", (_ExchangeHandler,), {"delay": delay})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-exchange").start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="APIs de mercado simuladas (Binance, Kraken, CoinGecko) para testes")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--delay", type=float, default=0.0, help="latência simulada por resposta (s)")
+    args = parser.parse_args()
+
+    server, url = serve(args.port, args.delay, args.host)
+    logging.info(f"🧪 APIs simuladas em {url} (latência {args.delay:.2f}s)")
+    logging.info(f"   Binance:   {url}/api/v3/klines")
+    logging.info(f"   Kraken:    {url}/0/public")
+    logging.info(f"   CoinGecko: {url}/api/v3")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
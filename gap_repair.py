@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import time
+import argparse
+from datetime import datetime, timedelta
+import logging
+
+from http_client import shared_client
+from candle_store import candle_store, DEFAULT_DB_PATH
+from candle_normalizer import from_kraken_ohlc, kraken_result, canonical_symbol
+from candle_rollup import CandleRollup, SOURCE_TABLE
+from kraken_backfill import KrakenBackfill
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Intervalo (minutos, na Kraken) de cada tabela de candles
+GAP_TABLES = {
+    "maria_helena_candles_5min": 5,
+    "maria_helena_candles": 1440,
+}
+
+# /OHLC só alcança os 720 candles mais recentes
+OHLC_LIMIT = 720
+
+
+class GapRepair:
+    """Encontra lacunas nas tabelas de candles e busca só o que falta
+
+    Lacunas dentro da janela do /OHLC saem todas de uma única chamada; as mais antigas
+    são buscadas uma a uma pelo backfill de trades, restrito ao intervalo faltante.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, pair="XXBTZUSD"):
+        self.db_path = db_path
+        self.pair = pair
+        self.symbol = canonical_symbol(pair)
+        self.api_url = "https://api.kraken.com/0/public"
+        self.store = candle_store(db_path)
+
+    def find_gaps(self, table, start=None, end=None):
+        interval_ms = GAP_TABLES[table] * 60000
+        if table == SOURCE_TABLE:
+            # O que a retenção apagou já está nos agregados: não é lacuna
+            compacted = CandleRollup(self.db_path).compacted_before(self.symbol)
+            if compacted:
+                start = compacted if start is None else max(start, compacted)
+        if start is not None and start % interval_ms:
+            start += interval_ms - start % interval_ms
+        if end is None:
+            # Até o último candle já fechado
+            now_ms = int(time.time() * 1000)
+            end = now_ms - now_ms % interval_ms
+        return self.store.find_gaps(table, interval_ms, start=start, end=end, symbol=self.symbol)
+
+    def fetch_recent(self, interval, since_ms):
+        """Candles de `since_ms` em diante numa única chamada ao /OHLC"""
+        data = shared_client().get_json(
+            f"{self.api_url}/OHLC",
+            # `since` é exclusivo: parte do candle anterior
+            params={"pair": self.pair, "interval": interval, "since": (since_ms - interval * 60000) // 1000},
+            timeout=15
+        )
+        return [from_kraken_ohlc(row, interval, self.symbol) for row in kraken_result(data, self.pair)]
+
+    def repair(self, table, start=None, end=None, dry_run=False):
+        """Preenche as lacunas de `table`; devolve quantos candles foram gravados"""
+        interval = GAP_TABLES[table]
+        interval_ms = interval * 60000
+        gaps = self.find_gaps(table, start=start, end=end)
+        missing = sum((e - s) // interval_ms for s, e in gaps)
+        logging.info(f"🔎 {table} {self.symbol}: {len(gaps)} lacunas, {missing} candles faltando")
+        if dry_run or not gaps:
+            for s, e in gaps:
+                logging.info(f"   {datetime.fromtimestamp(s / 1000)} → {datetime.fromtimestamp(e / 1000)}")
+            return 0
+
+        now_ms = int(time.time() * 1000)
+        cutoff = now_ms - now_ms % interval_ms - (OHLC_LIMIT - 1) * interval_ms
+
+        # Lacuna que atravessa o limite do /OHLC é dividida em duas
+        recent = [(max(s, cutoff), e) for s, e in gaps if e > cutoff]
+        old = [(s, min(e, cutoff)) for s, e in gaps if s < cutoff]
+
+        filled = 0
+        if recent:
+            candles = [
+                c for c in self.fetch_recent(interval, recent[0][0])
+                if any(s <= c["openTime"] < e for s, e in recent)
+            ]
+            filled += self.store.merge(table, candles)[0]
+
+        for s, e in old:
+            before = self.store.count(table, self.symbol)
+            backfill = KrakenBackfill(self.db_path, pair=self.pair, interval=interval, table=table)
+            backfill.api_url = self.api_url
+            backfill.run(datetime.fromtimestamp(s / 1000), datetime.fromtimestamp(e / 1000), checkpoint=False)
+            filled += self.store.count(table, self.symbol) - before
+
+        # Candles preenchidos no passado invalidam os indicadores dali em diante
+        if filled and old:
+            self.store.rewind_indicators(table, old[0][0], symbol=self.symbol)
+
+        logging.info(f"✅ {table} {self.symbol}: {filled} candles preenchidos ({1 if recent else 0} chamada /OHLC, "
+                     f"{len(old)} intervalos via trades)")
+        return filled
+
+    def repair_recent(self, table):
+        """Só a janela alcançável pelo /OHLC: no máximo uma chamada por tabela"""
+        interval_ms = GAP_TABLES[table] * 60000
+        now_ms = int(time.time() * 1000)
+        return self.repair(table, start=now_ms - now_ms % interval_ms - (OHLC_LIMIT - 1) * interval_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detecta e preenche lacunas nas tabelas de candles")
+    parser.add_argument("--table", action="append", choices=list(GAP_TABLES),
+                        help="tabela a verificar (padrão: todas)")
+    parser.add_argument("--days", type=int, default=None, help="só os últimos N dias")
+    parser.add_argument("--dry-run", action="store_true", help="só lista as lacunas")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--pair", nargs="+", default=["XXBTZUSD"], help="pares da Kraken a verificar")
+    parser.add_argument("--api-url", default=None, help="base alternativa da API (ex.: fake_exchange.py)")
+    args = parser.parse_args()
+
+    start = None
+    if args.days:
+        start = int((datetime.now() - timedelta(days=args.days)).timestamp() * 1000)
+
+    for pair in args.pair:
+        repair = GapRepair(db_path=args.db_path, pair=pair)
+        if args.api_url:
+            repair.api_url = args.api_url
+        for table in args.table or list(GAP_TABLES):
+            repair.repair(table, start=start, dry_run=args.dry_run)
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,20 @@ import os
 from datetime import datetime
 import logging
 
+from candle_store import DEFAULT_DB_PATH
+
 logging.basicConfig(level=logging.INFO)
 
 class HealthCheck:
-    def __init__(self, db_path="/root/.n8n/database.sqlite"):
+    def __init__(self, db_path=DEFAULT_DB_PATH):
         self.db_path = db_path
     
-    def check_database(self):
-        """Verifica se banco está OK"""
+    def check_database(self, conn=None):
+        """Verifica se banco está OK (usando `conn` se já houver uma conexão aberta)"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            own_conn = conn is None
+            if own_conn:
+                conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute("SELECT COUNT(*) FROM maria_helena_candles")
@@ -22,7 +26,8 @@ class HealthCheck:
             cursor.execute("SELECT MAX(timestamp) FROM maria_helena_candles")
             last_update = cursor.fetchone()[0]
             
-            conn.close()
+            if own_conn:
+                conn.close()
             
             return {
                 "status": "✅ OK",
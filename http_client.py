@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+import time
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import logging
+
+# Limite por exchange: (requisições por segundo, rajada máxima)
+RATE_LIMITS = {
+    "api.binance.com": (20.0, 40),
+    "api.kraken.com": (1.0, 3),
+    "api.coingecko.com": (0.4, 5),
+}
+
+# Conexões keep-alive mantidas por host
+POOL_SIZE = 10
+
+# Retentativas com backoff exponencial (0.5s, 1s, 2s, ...) para falhas transitórias
+RETRY_TOTAL = 5
+RETRY_BACKOFF = 0.5
+RETRY_STATUS = (500, 502, 503, 504)
+
+# 429 (limite excedido) fica fora do retry do urllib3: é refeito em `get`, respeitando o
+# Retry-After e passando de novo pelo rate limit do host a cada tentativa. O 418 (IP banido
+# pela Binance, por minutos a dias) volta direto para o chamador
+RATE_LIMIT_STATUS = (429,)
+RATE_LIMIT_RETRIES = 5
+RATE_LIMIT_BACKOFF = 2.0
+# Espera máxima por tentativa, qualquer que seja o Retry-After
+RATE_LIMIT_MAX_WAIT = 120.0
+
+
+class _Retry(Retry):
+    """Retry do urllib3 sem o retry implícito de 413/429 com Retry-After (só o 503 respeita o header)"""
+
+    RETRY_AFTER_STATUS_CODES = frozenset({503})
+
+
+def retry_after(response, attempt):
+    """Segundos a esperar antes de refazer `response`: Retry-After (segundos ou data HTTP), senão backoff"""
+    wait = RATE_LIMIT_BACKOFF * 2 ** attempt
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            wait = float(value)
+        except ValueError:
+            try:
+                wait = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                logging.warning(f"⚠️ Retry-After inválido ({value!r}), usando backoff de {wait:.0f}s")
+    return min(max(wait, 0.0), RATE_LIMIT_MAX_WAIT)
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `rate` tokens/s, acumulando até `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Bloqueia até haver `tokens` disponíveis e os consome"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HttpClient:
+    """Sessão HTTP compartilhada: pool keep-alive por host, retry com backoff e rate limit por exchange"""
+
+    def __init__(self, rate_limits=None, pool_size=POOL_SIZE):
+        retry = _Retry(
+            total=RETRY_TOTAL,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=["GET"],
+            respect_retry_after_header=True,
+            # Devolve a última resposta (ex.: 429) em vez de levantar: o chamador decide
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.buckets = {
+            host: TokenBucket(rate, capacity)
+            for host, (rate, capacity) in (rate_limits or RATE_LIMITS).items()
+        }
+        # ResponseArchive opcional: cada resposta bruta é gravada antes do parse
+        self.archive = None
+
+    def get(self, url, params=None, timeout=10, **kwargs):
+        """GET respeitando o rate limit do host (hosts sem limite configurado passam direto)
+
+        Respostas 429 são refeitas até RATE_LIMIT_RETRIES vezes; depois disso (e no 418) a
+        resposta é devolvida e o chamador decide (raise_for_status, por exemplo).
+        """
+        host = urlparse(url).netloc
+        bucket = self.buckets.get(host)
+        for attempt in range(RATE_LIMIT_RETRIES):
+            if bucket is not None:
+                bucket.acquire()
+            response = self.session.get(url, params=params, timeout=timeout, **kwargs)
+            if self.archive is not None:
+                try:
+                    self.archive.append(url, params, response)
+                except Exception as e:
+                    # O arquivo é auxiliar: uma falha nele não derruba a coleta
+                    logging.warning(f"⚠️ Falha ao arquivar resposta de {url}: {str(e)}")
+
+            if response.status_code not in RATE_LIMIT_STATUS or attempt == RATE_LIMIT_RETRIES - 1:
+                return response
+            wait = retry_after(response, attempt)
+            logging.warning(f"⚠️ {host} {response.status_code}, aguardando {wait:.0f}s")
+            time.sleep(wait)
+
+    def get_json(self, url, params=None, timeout=10):
+        response = self.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def shared_client():
+    """Cliente único do processo: todos os coletores dividem conexões e rate limits"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient()
+            logging.debug("🌐 HttpClient compartilhado criado")
+        return _shared_client
+
+
+def enable_archive(root):
+    """Passa a arquivar as respostas do cliente compartilhado em `root`"""
+    from response_archive import ResponseArchive
+    client = shared_client()
+    if client.archive is None:
+        client.archive = ResponseArchive(root)
+        logging.info(f"📦 Arquivando respostas em {root}")
+    return client.archive
@@ -1,52 +1,32 @@
 #!/usr/bin/env python3
-import subprocess
 import logging
-from datetime import datetime
+
+from collector_daemon import CollectorDaemon
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def run_script(script_path, description):
-    """Executa script e mostra resultado"""
-    try:
-        logging.info(f"▶️  {description}...")
-        result = subprocess.run(
-            ["python3", script_path],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        
-        if result.returncode == 0:
-            logging.info(f"✅ {description} - OK")
-            return True
-        else:
-            logging.error(f"❌ {description} - ERRO")
-            logging.error(result.stderr)
-            return False
-    
-    except Exception as e:
-        logging.error(f"❌ Erro ao executar {description}: {str(e)}")
-        return False
-
 def main():
     logging.info("=" * 70)
     logging.info("🚀 SISTEMA HÍBRIDO - COLETA DADOS DIÁRIOS + 5MIN")
     logging.info("=" * 70)
     
-    scripts = [
-        ("/root/maria-helena-scripts/capture_15years_bitcoin.py", "📊 Coleta 15 anos (dados diários históricos)"),
-        ("/root/maria-helena-scripts/capture_kraken_5min.py", "📈 Coleta Kraken 5min (tempo real)"),
-        ("/root/maria-helena-scripts/calculate_indicators.py", "🔧 Calcula indicadores técnicos"),
-    ]
+    # Etapas rodam no mesmo processo (antes: um subprocess por script).
+    # Para execução contínua, prefira `collector_daemon.py` no lugar do cron.
+    daemon = CollectorDaemon()
+    daemon.add_job("📊 Coleta 15 anos (dados diários históricos)", 86400,
+                   lambda: daemon.capture(["coingecko_15y"]))
+    daemon.add_job("📈 Coleta Kraken 5min (tempo real)", 300,
+                   lambda: daemon.capture(["kraken"]))
+    daemon.add_job("🔧 Calcula indicadores técnicos", 300, daemon.indicators)
     
     results = []
-    for script, desc in scripts:
-        result = run_script(script, desc)
-        results.append((desc, result))
+    for job in daemon.jobs:
+        results.append((job.name, job.run()))
         logging.info("")
+    daemon.close()
     
     # Resumo
     logging.info("=" * 70)
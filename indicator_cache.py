@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+import os
+import pickle
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import logging
+
+from calculate_indicators import IndicatorCalculator
+from candle_normalizer import DEFAULT_SYMBOL
+
+logging.basicConfig(level=logging.INFO)
+
+
+def _rolling(name, default_period, warmup_extra=0):
+    """Indicador de janela: estende recalculando só `period` (+extra) candles antes do novo trecho"""
+    def compute(calc, frame, params, state):
+        if name == "sma":
+            result = {"sma": calc.calculate_sma(frame['close'], **params)}
+        elif name == "rsi":
+            result = {"rsi": calc.calculate_rsi(frame['close'], **params)}
+        elif name == "atr":
+            result = {"atr": calc.calculate_atr(frame['high'], frame['low'], frame['close'], **params)}
+        elif name == "bollinger":
+            upper, lower = calc.calculate_bollinger_bands(frame['close'], **params)
+            result = {"upper": upper, "lower": lower}
+        else:
+            high, low = calc.calculate_donchian_channels(frame['high'], frame['low'], **params)
+            result = {"high": high, "low": low}
+        return result, None
+
+    def warmup(params):
+        return params.get("period", default_period) + warmup_extra
+
+    return compute, warmup
+
+
+def _compute_ema(calc, frame, params, state):
+    ema = calc.calculate_ema(frame['close'], seed=state and state["ema"], **params)
+    return {"ema": ema}, {"ema": float(ema.iloc[-1])}
+
+
+def _compute_macd(calc, frame, params, state):
+    state = state or {}
+    fast = calc.calculate_ema(frame['close'], period=params.get("fast", 12), seed=state.get("fast"))
+    slow = calc.calculate_ema(frame['close'], period=params.get("slow", 26), seed=state.get("slow"))
+    macd = fast - slow
+    signal = calc.calculate_ema(macd, period=params.get("signal", 9), seed=state.get("signal"))
+    new_state = {
+        "fast": float(fast.iloc[-1]),
+        "slow": float(slow.iloc[-1]),
+        "signal": float(signal.iloc[-1]),
+    }
+    return {"macd": macd, "signal": signal}, new_state
+
+
+def _compute_obv(calc, frame, params, state):
+    state = state or {}
+    obv = calc.calculate_obv(frame['close'], frame['volume'],
+                             seed=state.get("obv", 0.0), prev_close=state.get("prev_close"))
+    return {"obv": obv}, {"obv": float(obv.iloc[-1]), "prev_close": float(frame['close'].iloc[-1])}
+
+
+# nome -> (função de cálculo, candles de aquecimento para janelas; None = recursivo)
+INDICATORS = {
+    "sma": _rolling("sma", 50),
+    "rsi": _rolling("rsi", 14, warmup_extra=1),
+    "atr": _rolling("atr", 14, warmup_extra=1),
+    "bollinger": _rolling("bollinger", 20),
+    "donchian": _rolling("donchian", 20),
+    "ema": (_compute_ema, None),
+    "macd": (_compute_macd, None),
+    "obv": (_compute_obv, None),
+}
+
+
+class IndicatorCache:
+    """Cache LRU de resultados de indicadores, com extensão incremental ao chegar candle novo
+
+    A chave é (tabela, symbol, indicador, parâmetros): pares da mesma tabela nunca dividem
+    uma entrada. Cada entrada guarda a própria chave, a impressão digital da série de
+    entrada (nº de linhas, último openTime) e o estado final dos recursivos. Entradas
+    despejadas da memória vão para `spill_dir`, se informado.
+    """
+
+    def __init__(self, max_entries=64, spill_dir=None):
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir
+        self.calc = IndicatorCalculator()
+        self.entries = OrderedDict()
+        self.stats = {"hits": 0, "extends": 0, "misses": 0}
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(frame):
+        """(nº de linhas, último openTime) da série de entrada"""
+        if frame.empty:
+            return (0, None)
+        return (len(frame), int(frame['openTime'].iloc[-1]))
+
+    def _spill_path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.pkl")
+
+    def _load(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        if self.spill_dir and os.path.exists(self._spill_path(key)):
+            with open(self._spill_path(key), "rb") as f:
+                entry = pickle.load(f)
+            # Arquivo de outra série (ou de antes do symbol entrar na chave): não serve
+            if entry.get("key") != key:
+                return None
+            self._store(key, entry)
+            return entry
+
+        return None
+
+    def _store(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.max_entries:
+            old_key, old_entry = self.entries.popitem(last=False)
+            if self.spill_dir:
+                with open(self._spill_path(old_key), "wb") as f:
+                    pickle.dump(old_entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def get(self, table, indicator, frame, symbol=None, **params):
+        """Resultado do indicador para `frame` (colunas openTime/close/high/low/volume)
+
+        `symbol` é o par da série; sem ele vale a coluna symbol de `frame` ou, na falta
+        dela, DEFAULT_SYMBOL. Devolve dict de arrays NumPy alinhados às linhas de `frame`;
+        não altere os arrays.
+        """
+        if indicator not in INDICATORS:
+            raise ValueError(f"Indicador desconhecido: {indicator}")
+
+        compute, warmup = INDICATORS[indicator]
+        key = (table, self.frame_symbol(frame, symbol), indicator, tuple(sorted(params.items())))
+        rows, last_open_time = self.fingerprint(frame)
+        entry = self._load(key)
+
+        if entry is not None and entry["fingerprint"] == (rows, last_open_time):
+            self.stats["hits"] += 1
+            return entry["values"]
+
+        # Série cresceu e o trecho já calculado continua igual: estende a partir da cauda
+        cached_rows, cached_last = entry["fingerprint"] if entry is not None else (0, None)
+        if (entry is not None and 0 < cached_rows < rows
+                and int(frame['openTime'].iloc[cached_rows - 1]) == cached_last):
+            start = cached_rows if warmup is None else max(0, cached_rows - warmup(params))
+            result, state = compute(self.calc, frame.iloc[start:], params, entry["state"])
+            skip = cached_rows - start
+            values = {
+                name: np.concatenate([entry["values"][name], np.asarray(series, dtype=np.float64)[skip:]])
+                for name, series in result.items()
+            }
+            self.stats["extends"] += 1
+        else:
+            result, state = compute(self.calc, frame, params, None)
+            values = {name: np.asarray(series, dtype=np.float64) for name, series in result.items()}
+            self.stats["misses"] += 1
+
+        self._store(key, {"key": key, "fingerprint": (rows, last_open_time), "values": values, "state": state})
+        return values
+
+    @staticmethod
+    def frame_symbol(frame, symbol=None):
+        if symbol is not None:
+            return symbol
+        if 'symbol' in frame.columns and not frame.empty:
+            symbols = frame['symbol'].unique()
+            if len(symbols) > 1:
+                raise ValueError(f"frame com vários pares ({', '.join(map(str, symbols))}): um por chamada")
+            return str(symbols[0])
+        return DEFAULT_SYMBOL
+
+    def invalidate(self, table, symbol=None):
+        """Descarta as entradas de `table` (só de `symbol`, se informado), inclusive as em disco"""
+        def matches(key):
+            return key[0] == table and (symbol is None or key[1] == symbol)
+
+        for key in [k for k in self.entries if matches(k)]:
+            del self.entries[key]
+        if self.spill_dir:
+            for name in os.listdir(self.spill_dir):
+                if not name.endswith(".pkl"):
+                    continue
+                path = os.path.join(self.spill_dir, name)
+                with open(path, "rb") as f:
+                    key = pickle.load(f).get("key")
+                if key is None or matches(key):
+                    os.remove(path)
+
+    def clear(self):
+        """Esvazia a memória e os arquivos de spill"""
+        self.entries.clear()
+        if self.spill_dir:
+            for name in os.listdir(self.spill_dir):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.spill_dir, name))
+
+
+# Cache compartilhado pelos consumidores do mesmo processo
+default_cache = IndicatorCache()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+import time
+import numpy as np
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+# Tamanho do bloco da EMA vetorizada (decay^64 ainda é bem representável)
+EMA_BLOCK = 64
+
+
+def _as_periods(periods):
+    periods = np.asarray(periods, dtype=np.int64)
+    if periods.ndim != 1 or len(periods) == 0 or periods.min() < 1:
+        raise ValueError("periods deve ser uma lista não vazia de inteiros >= 1")
+    return periods
+
+
+def _window_sums(x, periods, dtype=np.longdouble):
+    """Somas móveis de x para cada período via soma acumulada: (len(periods), n), NaN no início
+
+    Por padrão a soma acumulada é feita em long double: em séries longas de preços o
+    total cresce muito e a diferença entre dois acumulados perderia dígitos em float64.
+    """
+    n = len(x)
+    csum = np.concatenate([[0.0], np.cumsum(x, dtype=dtype)])
+    out = np.full((len(periods), n), np.nan)
+    for row, p in enumerate(periods):
+        if p <= n:
+            out[row, p - 1:] = csum[p:] - csum[:-p]
+    return out
+
+
+def _rolling_moments(data, periods):
+    """Média e desvio padrão amostral (ddof=1) móveis, compartilhando as somas acumuladas"""
+    periods = _as_periods(periods)
+    x = np.asarray(data, dtype=np.float64)
+    if len(x) == 0:
+        empty = np.empty((len(periods), 0))
+        return empty, empty
+
+    # Centraliza no primeiro valor para a soma acumulada não perder precisão
+    offset = x[0]
+    centered = x - offset
+    sums = _window_sums(centered, periods)
+    sums_sq = _window_sums(centered * centered, periods)
+    p = periods[:, None].astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = (sums_sq - sums * sums / p) / (p - 1)
+    # Janela de 1: desvio amostral indefinido, NaN como rolling(1).std()
+    variance[periods < 2] = np.nan
+    return sums / p + offset, np.sqrt(np.clip(variance, 0.0, None))
+
+
+def sma_multi(data, periods):
+    """SMA para vários períodos de uma vez, igual a rolling(window=p).mean()"""
+    periods = _as_periods(periods)
+    x = np.asarray(data, dtype=np.float64)
+    if len(x) == 0:
+        return np.empty((len(periods), 0))
+
+    # Centraliza no primeiro valor para a soma acumulada não perder precisão
+    offset = x[0]
+    return _window_sums(x - offset, periods) / periods[:, None] + offset
+
+
+def std_multi(data, periods):
+    """Desvio padrão amostral móvel (ddof=1) para vários períodos"""
+    return _rolling_moments(data, periods)[1]
+
+
+def ema_multi(data, periods, block=EMA_BLOCK):
+    """EMA para vários períodos, igual a ewm(span=p, adjust=False).mean()
+
+    A recursão é resolvida em blocos: dentro de cada bloco a EMA é um produto por
+    uma matriz triangular de pesos; entre blocos só o último valor é propagado.
+    """
+    periods = _as_periods(periods)
+    x = np.asarray(data, dtype=np.float64)
+    n = len(x)
+    if n == 0:
+        return np.empty((len(periods), 0))
+
+    alpha = 2.0 / (periods + 1.0)
+    decay = 1.0 - alpha
+
+    pad = (-n) % block
+    blocks = np.concatenate([x, np.full(pad, x[-1])]).reshape(-1, block)
+
+    j = np.arange(block)
+    lag = j[:, None] - j[None, :]
+    weights = np.where(lag >= 0, alpha[:, None, None] * decay[:, None, None] ** np.clip(lag, 0, None), 0.0)
+    partial = blocks @ weights.transpose(0, 2, 1)
+
+    # Peso do valor anterior ao bloco em cada posição do bloco
+    carry = decay[:, None] ** (j + 1)
+
+    # adjust=False começa com y = x[0], equivalente a um valor anterior igual a x[0]
+    previous = np.empty((len(periods), len(blocks)))
+    prev = np.full(len(periods), x[0])
+    for b in range(len(blocks)):
+        previous[:, b] = prev
+        prev = partial[:, b, -1] + carry[:, -1] * prev
+
+    result = partial + carry[:, None, :] * previous[:, :, None]
+    return result.reshape(len(periods), -1)[:, :n]
+
+
+def rsi_multi(data, periods):
+    """RSI para vários períodos, com as mesmas médias simples do calculate_rsi"""
+    periods = _as_periods(periods)
+    x = np.asarray(data, dtype=np.float64)
+    if len(x) == 0:
+        return np.empty((len(periods), 0))
+
+    delta = np.concatenate([[0.0], np.diff(x)])
+    # Variações são pequenas: float64 basta para a soma acumulada
+    gain = _window_sums(np.where(delta > 0, delta, 0.0), periods, np.float64) / periods[:, None]
+    loss = _window_sums(np.where(delta < 0, -delta, 0.0), periods, np.float64) / periods[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100 - (100 / (1 + gain / loss))
+
+
+def bollinger_multi(data, periods, std_dev=2):
+    """Bollinger Bands para vários períodos: (upper, lower), cada um (len(periods), n)"""
+    sma, std = _rolling_moments(data, periods)
+    return sma + std_dev * std, sma - std_dev * std
+
+
+def _rolling_extreme_multi(x, periods, reducer):
+    """Máximo/mínimo móvel por tabela esparsa: janelas de 2^k combinadas em O(n) por período"""
+    n = len(x)
+    out = np.full((len(periods), n), np.nan)
+    if n == 0:
+        return out
+
+    # levels[k][s] = extremo de x[s : s + 2^k]
+    levels = [x]
+    while (1 << len(levels)) <= min(periods.max(), n):
+        prev = levels[-1]
+        half = 1 << (len(levels) - 1)
+        levels.append(reducer(prev[:-half], prev[half:]))
+
+    for row, p in enumerate(periods):
+        if p > n:
+            continue
+        k = int(p).bit_length() - 1
+        level = levels[k]
+        width = 1 << k
+        out[row, p - 1:] = reducer(level[:n - p + 1], level[p - width:n - width + 1])
+    return out
+
+
+def donchian_multi(high, low, periods):
+    """Donchian Channels para vários períodos: (high, low), cada um (len(periods), n)"""
+    periods = _as_periods(periods)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    return (
+        _rolling_extreme_multi(high, periods, np.maximum),
+        _rolling_extreme_multi(low, periods, np.minimum),
+    )
+
+
+def _best_time(func, repeat):
+    """Menor tempo entre `repeat` execuções, e o resultado da última"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark(n=100000, periods=range(5, 205, 5), repeat=3):
+    """Compara os kernels com um loop dos métodos calculate_* do IndicatorCalculator"""
+    import pandas as pd
+    from calculate_indicators import IndicatorCalculator
+
+    periods = list(periods)
+    rng = np.random.default_rng(42)
+    close = 30000 + np.cumsum(rng.normal(0, 50, n))
+    high = close + np.abs(rng.normal(0, 20, n))
+    low = close - np.abs(rng.normal(0, 20, n))
+    close_s, high_s, low_s = pd.Series(close), pd.Series(high), pd.Series(low)
+    calc = IndicatorCalculator()
+
+    cases = [
+        ("ema", lambda: [calc.calculate_ema(close_s, p) for p in periods],
+         lambda: ema_multi(close, periods)),
+        ("sma", lambda: [calc.calculate_sma(close_s, p) for p in periods],
+         lambda: sma_multi(close, periods)),
+        ("rsi", lambda: [calc.calculate_rsi(close_s, p) for p in periods],
+         lambda: rsi_multi(close, periods)),
+        ("bollinger", lambda: [calc.calculate_bollinger_bands(close_s, p)[0] for p in periods],
+         lambda: bollinger_multi(close, periods)[0]),
+        ("donchian", lambda: [calc.calculate_donchian_channels(high_s, low_s, p)[0] for p in periods],
+         lambda: donchian_multi(high, low, periods)[0]),
+    ]
+
+    results = {}
+    for name, loop, batched in cases:
+        loop_time, series = _best_time(loop, repeat)
+        batch_time, got = _best_time(batched, repeat)
+        expected = np.vstack([np.asarray(s, dtype=np.float64) for s in series])
+
+        # Diferença relativa ao loop pandas (o rolling().std() do pandas também acumula erro)
+        scale = np.maximum(1.0, np.abs(expected))
+        with np.errstate(invalid="ignore"):
+            max_err = float(np.nanmax(np.abs(got - expected) / scale))
+        results[name] = {
+            "loop_s": loop_time,
+            "batch_s": batch_time,
+            "speedup": loop_time / batch_time,
+            "max_rel_err": max_err,
+        }
+        logging.info(f"⏱️ {name}: loop {loop_time:.3f}s | batch {batch_time:.3f}s | "
+                     f"{loop_time / batch_time:.1f}x | erro máx {max_err:.1e}")
+    return results
+
+
+def main():
+    logging.info("🚀 Benchmark: kernels multi-período vs loop dos calculate_*")
+    benchmark()
+
+if __name__ == "__main__":
+    main()
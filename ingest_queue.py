@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import queue
+import socket
+import sqlite3
+import argparse
+import tempfile
+import threading
+import socketserver
+import multiprocessing
+from concurrent.futures import Future
+import numpy as np
+import logging
+
+from candle_store import CandleStore, DEFAULT_DB_PATH, INGEST_SOCKET_ENV
+from candle_normalizer import make_candle
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+INGEST_SOCKET = "/root/maria-helena-scripts/ingest.sock"
+
+# Group commit: o lote leva o que estiver na fila, até tantos candles ou tanto tempo (s)
+# juntando; produtores não esperam um prazo fixo quando a fila está vazia
+GROUP_COMMIT_ROWS = 5000
+GROUP_COMMIT_DELAY = 0.05
+
+# "database is locked" (outro processo gravando fora da fila): novas tentativas com espera crescente
+LOCKED_RETRIES = 5
+LOCKED_BACKOFF = 0.5
+
+# Espera máxima (s) pela resposta do escritor: depois disso o produtor grava direto.
+# Indicadores (recálculo completo de todas as séries) podem levar bem mais que um lote
+SUBMIT_TIMEOUT = 30
+INDICATORS_TIMEOUT = 1800
+
+# Operações sobre candles, aplicadas dentro da transação do lote
+CANDLE_OPS = ("insert", "merge")
+
+
+class IngestWriter:
+    """Escritor único: uma thread aplica tudo o que os produtores enfileiram
+
+    Os pedidos que se acumulam na fila enquanto o commit anterior roda (até GROUP_COMMIT_ROWS
+    candles ou GROUP_COMMIT_DELAY segundos juntando) entram numa única transação. Cada
+    produtor recebe o resultado da sua operação só depois do commit. Se o lote falhar, os
+    pedidos são refeitos um a um: um pedido inválido não derruba os demais.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_rows=GROUP_COMMIT_ROWS, max_delay=GROUP_COMMIT_DELAY):
+        self.db_path = db_path
+        # Conexão própria (fora do candle_store() do processo): só esta thread grava por ela
+        self.store = CandleStore(db_path)
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.stats = {"requests": 0, "candles": 0, "commits": 0, "failed": 0, "max_wait": 0.0}
+        self.thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self.thread.start()
+
+    def enqueue(self, op, **payload):
+        """Enfileira uma operação; o Future resolve depois do commit"""
+        future = Future()
+        self.queue.put((op, payload, future, time.monotonic()))
+        return future
+
+    def submit(self, op, **payload):
+        """Enfileira e espera o commit (mesma interface do IngestClient)"""
+        return self.enqueue(op, **payload).result()
+
+    def update_indicators(self, **kwargs):
+        return self.submit("indicators", **kwargs)
+
+    def _apply(self, op, payload):
+        store = self.store
+        if op == "insert":
+            return store.insert(payload["table"], payload["candles"], conflict=payload.get("conflict", "ignore"))
+        if op == "merge":
+            return store.merge(payload["table"], payload["candles"],
+                               rewind_indicators=payload.get("rewind_indicators", True))
+        if op == "indicators":
+            from calculate_indicators import IndicatorCalculator
+            # dtype vem pelo nome ("float32"), como no --float32 do calculate_indicators
+            payload = dict(payload)
+            calculator = IndicatorCalculator(self.db_path, dtype=np.dtype(payload.pop("dtype", "float64")).type)
+            with store.lock:
+                return calculator.update_indicators(conn=store.conn, **payload)
+        raise ValueError(f"Operação desconhecida: {op}")
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            rows = len(item[1].get("candles", ()))
+            deadline = time.monotonic() + self.max_delay
+            # Junta o que já está na fila; o que chegar durante o commit vai para o próximo lote
+            while rows < self.max_rows and time.monotonic() < deadline:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                rows += len(item[1].get("candles", ()))
+            self._commit(batch)
+
+    def _commit(self, batch):
+        candles = [item for item in batch if item[0] in CANDLE_OPS]
+        tasks = [item for item in batch if item[0] not in CANDLE_OPS]
+
+        if candles:
+            for attempt in range(LOCKED_RETRIES):
+                try:
+                    with self.store.transaction():
+                        results = [self._apply(op, payload) for op, payload, _, _ in candles]
+                    break
+                except sqlite3.OperationalError as e:
+                    if "locked" not in str(e) or attempt == LOCKED_RETRIES - 1:
+                        results = None
+                        break
+                    logging.warning(f"⏳ Banco ocupado, nova tentativa do lote em {LOCKED_BACKOFF * (attempt + 1):.1f}s")
+                    time.sleep(LOCKED_BACKOFF * (attempt + 1))
+                except Exception:
+                    results = None
+                    break
+
+            if results is None:
+                # Lote não entrou: cada pedido na sua própria transação
+                self._each(candles)
+            else:
+                self.stats["commits"] += 1
+                for (_, _, future, _), result in zip(candles, results):
+                    future.set_result(result)
+
+        # Indicadores fora da transação dos candles (o calculador controla a própria)
+        self._each(tasks)
+
+        now = time.monotonic()
+        self.stats["requests"] += len(batch)
+        self.stats["candles"] += sum(len(payload.get("candles", ())) for _, payload, _, _ in candles)
+        self.stats["max_wait"] = max(self.stats["max_wait"], max(now - queued for _, _, _, queued in batch))
+
+    def _each(self, items):
+        for op, payload, future, _ in items:
+            try:
+                with self.store.transaction():
+                    result = self._apply(op, payload)
+                self.stats["commits"] += 1
+                future.set_result(result)
+            except Exception as e:
+                self.stats["failed"] += 1
+                logging.error(f"❌ Escritor único: {op} em {payload.get('table', '-')} falhou: {str(e)}")
+                future.set_exception(e)
+
+    def attach(self, store):
+        """Faz insert/merge de `store` (ex.: o candle_store() do processo) passarem pela fila"""
+        store.writer = self
+        return store
+
+    def close(self):
+        """Aplica o que já está na fila e encerra a thread"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+            self.store.close()
+
+
+class _IngestHandler(socketserver.StreamRequestHandler):
+    """Uma conexão de produtor: um pedido JSON por linha, uma resposta JSON por linha"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                result = self.server.writer.submit(request.pop("op"), **request)
+                response = {"ok": True, "result": result}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            try:
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+            except OSError:
+                # Produtor desistiu (timeout) e fechou a conexão; o pedido já foi aplicado
+                return
+
+
+class IngestServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Socket Unix local na frente do IngestWriter (uma thread por produtor conectado)"""
+
+    daemon_threads = True
+
+    def __init__(self, writer, path=INGEST_SOCKET):
+        if os.path.exists(path):
+            # Só remove socket órfão (processo morto); com outro escritor no ar, não sobe
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except ConnectionRefusedError:
+                os.remove(path)
+            else:
+                raise RuntimeError(f"Já existe um escritor único em {path}")
+            finally:
+                probe.close()
+        self.writer = writer
+        super().__init__(path, _IngestHandler)
+
+
+class IngestClient:
+    """Produtor em outro processo: envia insert/merge ao escritor único pelo socket
+
+    Thread-safe; a conexão é aberta na primeira gravação e reaberta se cair. O retorno
+    só chega depois do commit, com o mesmo valor do CandleStore. Sem resposta em
+    SUBMIT_TIMEOUT segundos levanta ConnectionError e o CandleStore grava direto (o pedido
+    pode ainda entrar pelo escritor: insert ignora duplicados e merge não regrava o igual).
+    """
+
+    def __init__(self, path=INGEST_SOCKET):
+        self.path = path
+        self.lock = threading.Lock()
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        self._sock = sock
+        self._file = sock.makefile("rwb")
+
+    def submit(self, op, timeout=SUBMIT_TIMEOUT, **payload):
+        message = json.dumps(dict(payload, op=op), default=lambda value: value.item()).encode() + b"\n"
+        with self.lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.settimeout(timeout)
+                self._file.write(message)
+                self._file.flush()
+                line = self._file.readline()
+                if not line:
+                    raise ConnectionResetError("escritor único encerrou a conexão")
+            except socket.timeout:
+                # Resposta atrasada ficaria na conexão: descarta e reabre no próximo pedido
+                self._reset()
+                raise ConnectionError(f"escritor único não respondeu em {timeout:.0f}s")
+            except OSError:
+                self._reset()
+                raise
+        response = json.loads(line)
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def update_indicators(self, **kwargs):
+        return self.submit("indicators", timeout=INDICATORS_TIMEOUT, **kwargs)
+
+    def _reset(self):
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = None
+        self._file = None
+
+    def close(self):
+        with self.lock:
+            self._reset()
+
+
+def _stress_producer(args):
+    """Produtor do teste de carga (processo separado): candles em lotes pequenos, como um coletor"""
+    path, db_path, producer, candles, batch, direct = args
+    symbol = f"STRESS{producer:03d}"
+    store = CandleStore(db_path) if direct else None
+    client = None if direct else IngestClient(path)
+    lost = 0
+    for start in range(0, candles, batch):
+        rows = [
+            make_candle(i * 300000, (i + 1) * 300000, 100.0, 101.0, 99.0, 100.5, 1.0, symbol)
+            for i in range(start, min(start + batch, candles))
+        ]
+        try:
+            if direct:
+                store.insert("maria_helena_candles_5min", rows)
+            else:
+                client.submit("insert", table="maria_helena_candles_5min", candles=rows)
+        except Exception:
+            lost += len(rows)
+    return lost
+
+
+def stress(db_path, producers=32, candles=2000, batch=5, direct=False):
+    """Muitos produtores concorrentes gravando na mesma tabela; confere que nada se perdeu"""
+    path = os.path.join(tempfile.mkdtemp(), "ingest.sock")
+    writer = server = None
+    if not direct:
+        writer = IngestWriter(db_path)
+        server = IngestServer(writer, path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        CandleStore(db_path).close()  # schema criado antes dos produtores
+
+    started = time.perf_counter()
+    jobs = [(path, db_path, i, candles, batch, direct) for i in range(producers)]
+    with multiprocessing.get_context("spawn").Pool(producers) as pool:
+        lost = sum(pool.map(_stress_producer, jobs))
+    elapsed = time.perf_counter() - started
+
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+        writer.close()
+        logging.info(f"📦 {writer.stats['commits']} commits para {writer.stats['requests']} pedidos "
+                     f"({writer.stats['candles'] / max(writer.stats['commits'], 1):.0f} candles por commit), "
+                     f"maior espera na fila {writer.stats['max_wait'] * 1000:.0f} ms")
+
+    conn = sqlite3.connect(db_path)
+    stored = conn.execute(
+        "SELECT COUNT(*) FROM maria_helena_candles_5min WHERE symbol LIKE 'STRESS%'"
+    ).fetchone()[0]
+    conn.close()
+    expected = producers * candles
+    logging.info(f"{'✅' if stored == expected else '❌'} {'direto' if direct else 'escritor único'}: "
+                 f"{stored}/{expected} candles gravados, {lost} perdidos com erro, "
+                 f"{expected / elapsed:,.0f} candles/s ({elapsed:.2f}s)")
+    return stored == expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escritor único com group commit (socket Unix local)")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--socket", default=INGEST_SOCKET)
+    parser.add_argument("--indicators-interval", type=float, default=300,
+                        help="segundos entre atualizações de indicadores feitas pelo próprio escritor (0 desliga)")
+    parser.add_argument("--stress", action="store_true",
+                        help="teste de carga num banco temporário em vez de servir")
+    parser.add_argument("--producers", type=int, default=32)
+    parser.add_argument("--candles", type=int, default=2000, help="candles por produtor")
+    parser.add_argument("--batch", type=int, default=5, help="candles por pedido")
+    parser.add_argument("--direct", action="store_true",
+                        help="no teste de carga, cada produtor grava direto (comparação)")
+    args = parser.parse_args()
+
+    if args.stress:
+        with tempfile.TemporaryDirectory() as workdir:
+            ok = stress(os.path.join(workdir, "stress.sqlite"), args.producers, args.candles,
+                        args.batch, args.direct)
+        raise SystemExit(0 if ok else 1)
+
+    # O próprio escritor grava direto
+    os.environ.pop(INGEST_SOCKET_ENV, None)
+    writer = IngestWriter(args.db_path)
+    server = IngestServer(writer, args.socket)
+    logging.info(f"🚀 Escritor único em {args.socket} → {args.db_path}")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        while True:
+            if args.indicators_interval:
+                time.sleep(args.indicators_interval)
+                writer.update_indicators()
+            else:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        writer.close()
+        os.remove(args.socket)
+        logging.info(f"🛑 Escritor único encerrado: {writer.stats}")
+
+if __name__ == "__main__":
+    main()
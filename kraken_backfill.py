@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+import argparse
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import logging
+
+from http_client import shared_client
+from candle_store import candle_store, DEFAULT_DB_PATH
+from candle_normalizer import make_candle, kraken_result, canonical_symbol
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Tabela de destino por intervalo (minutos)
+INTERVAL_TABLES = {
+    5: "maria_helena_candles_5min",
+    1440: "maria_helena_candles",
+}
+
+# Kraken devolve no máximo 1000 trades por chamada
+TRADES_PAGE_SIZE = 1000
+RATE_LIMIT_BACKOFF = 5.0
+MAX_RETRIES = 5
+
+
+class KrakenBackfill:
+    """Backfill paginado da Kraken, retomável por checkpoint
+
+    O endpoint /OHLC só devolve os 720 candles mais recentes, seja qual for o `since`.
+    Para ir além, o backfill percorre /Trades seguindo o cursor `last` e agrega os trades
+    em candles do intervalo pedido. A próxima página é buscada em paralelo enquanto a
+    atual é agregada e gravada.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, pair="XXBTZUSD", interval=5, table=None):
+        self.db_path = db_path
+        self.api_url = "https://api.kraken.com/0/public"
+        self.pair = pair
+        self.symbol = canonical_symbol(pair)
+        self.interval = interval
+        self.interval_ms = interval * 60000
+        self.table = table or INTERVAL_TABLES[interval]
+        self.client = shared_client()
+        self.store = candle_store(db_path)
+
+    def fetch_trades(self, since):
+        """Uma página de trades a partir do cursor `since` (ns): (trades, próximo cursor)"""
+        for attempt in range(MAX_RETRIES):
+            # Espaçamento entre chamadas e 429 ficam com o shared_client; aqui só o erro de
+            # rate limit que a Kraken devolve no corpo (HTTP 200)
+            response = self.client.get(
+                f"{self.api_url}/Trades",
+                params={"pair": self.pair, "since": since},
+                timeout=15
+            )
+            response.raise_for_status()
+
+            data = response.json()
+            if any("Rate limit" in err for err in data.get('error', [])):
+                logging.warning(f"⚠️ Rate limit Kraken, aguardando {RATE_LIMIT_BACKOFF * (attempt + 1):.0f}s")
+                time.sleep(RATE_LIMIT_BACKOFF * (attempt + 1))
+                continue
+
+            trades = kraken_result(data, self.pair)
+            return trades, data['result']['last']
+
+        raise RuntimeError(f"Rate limit Kraken persistente após {MAX_RETRIES} tentativas")
+
+    def aggregate(self, trades):
+        """Agrega trades [price, volume, time, ...] ordenados em candles do intervalo
+
+        Devolve (candles fechados, trades do último bucket ainda aberto).
+        """
+        if len(trades) == 0:
+            return [], trades
+
+        price = np.array([float(t[0]) for t in trades])
+        volume = np.array([float(t[1]) for t in trades])
+        times_ms = np.array([float(t[2]) * 1000 for t in trades])
+        buckets = (times_ms // self.interval_ms).astype(np.int64) * self.interval_ms
+
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)] - 1
+
+        # O último bucket pode continuar na próxima página: fica de fora
+        closed = len(starts) - 1
+        candles = [
+            make_candle(open_time, open_time + self.interval_ms, o, h, l, c, v, self.symbol)
+            for open_time, o, h, l, c, v in zip(
+                buckets[starts[:closed]].tolist(),
+                price[starts[:closed]].tolist(),
+                np.maximum.reduceat(price, starts)[:closed].tolist(),
+                np.minimum.reduceat(price, starts)[:closed].tolist(),
+                price[ends[:closed]].tolist(),
+                np.add.reduceat(volume, starts)[:closed].tolist(),
+            )
+        ]
+        return candles, trades[starts[-1]:]
+
+    def ensure_tables(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS maria_helena_backfill_checkpoint (
+                source TEXT,
+                pair TEXT,
+                interval INTEGER,
+                cursor TEXT,
+                last_open_time INTEGER,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (source, pair, interval)
+            )
+        """)
+        self.store.ensure_table(self.table)
+    
+    def load_checkpoint(self, cursor):
+        cursor.execute("""
+            SELECT cursor FROM maria_helena_backfill_checkpoint
+            WHERE source = 'kraken' AND pair = ? AND interval = ?
+        """, (self.pair, self.interval))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def save_checkpoint(self, cursor, next_cursor, last_open_time):
+        cursor.execute("""
+            INSERT OR REPLACE INTO maria_helena_backfill_checkpoint
+            (source, pair, interval, cursor, last_open_time, updated_at)
+            VALUES ('kraken', ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (self.pair, self.interval, next_cursor, last_open_time))
+
+    def run(self, start, end=None, checkpoint=True):
+        """Backfill de `start` até `end` (datetime; padrão agora), retomando do checkpoint se houver
+
+        Com checkpoint=False o intervalo é buscado do zero e o checkpoint não é tocado
+        (usado no preenchimento de lacunas, que não deve mover o cursor do backfill).
+        """
+        try:
+            with self.store.transaction() as conn:
+                cursor = conn.cursor()
+                self.ensure_tables(cursor)
+
+            end_s = (end or datetime.now()).timestamp()
+            since = self.load_checkpoint(cursor) if checkpoint else None
+            if since:
+                logging.info(f"↩️ Retomando backfill {self.pair} {self.interval}min do cursor {since}")
+            else:
+                since = str(int(start.timestamp() * 1e9))
+                logging.info(f"📊 Backfill {self.pair} {self.interval}min desde {start}")
+
+            total = 0
+            pending = []
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                future = pool.submit(self.fetch_trades, since)
+                while True:
+                    trades, last = future.result()
+                    done = len(trades) < TRADES_PAGE_SIZE or float(trades[-1][2]) >= end_s
+
+                    # Busca a próxima página enquanto esta é agregada e gravada
+                    if not done:
+                        future = pool.submit(self.fetch_trades, last)
+
+                    candles, pending = self.aggregate(pending + trades)
+                    candles = [c for c in candles if c["openTime"] < end_s * 1000]
+
+                    # Checkpoint 1 ns antes do início do bucket aberto: ao retomar, os trades dele são
+                    # relidos. Vem do openTime (inteiro), não do horário do trade: em float64 os
+                    # segundos com 4 casas não viram ns exatos e o primeiro trade poderia ficar de fora
+                    if pending:
+                        open_bucket = int(float(pending[0][2]) * 1000) // self.interval_ms * self.interval_ms
+                        resume = str(open_bucket * 10**6 - 1)
+                    else:
+                        resume = last
+
+                    # Candles e checkpoint na mesma transação
+                    with self.store.transaction():
+                        if candles:
+                            self.store.insert(self.table, candles)
+                            total += len(candles)
+                        if checkpoint:
+                            self.save_checkpoint(cursor, resume, candles[-1]["openTime"] if candles else None)
+
+                    if candles:
+                        logging.info(f"💾 {total} candles | até {datetime.fromtimestamp(candles[-1]['openTime'] / 1000)}")
+
+                    if done:
+                        break
+
+            logging.info(f"✅ Backfill concluído: {total} candles em {self.table}")
+            return True
+
+        except Exception as e:
+            logging.error(f"❌ Erro no backfill Kraken: {str(e)}")
+            return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill paginado da Kraken (retomável)")
+    parser.add_argument("--pair", nargs="+", default=["XXBTZUSD"], help="um ou mais pares da Kraken")
+    parser.add_argument("--interval", type=int, default=5, choices=list(INTERVAL_TABLES))
+    parser.add_argument("--days", type=int, default=365, help="dias de histórico a partir de hoje")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--api-url", default=None, help="base alternativa da API (ex.: fake_exchange.py)")
+    args = parser.parse_args()
+
+    # Em sequência: o rate limit da Kraken é por IP, pares em paralelo não andariam mais rápido
+    for pair in args.pair:
+        backfill = KrakenBackfill(db_path=args.db_path, pair=pair, interval=args.interval)
+        if args.api_url:
+            backfill.api_url = args.api_url
+        backfill.run(start=datetime.now() - timedelta(days=args.days))
+
+if __name__ == "__main__":
+    main()
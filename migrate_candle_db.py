@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import re
+import time
+import argparse
+import logging
+
+from candle_store import candle_store, DEFAULT_DB_PATH, N8N_DB_PATH, STORE_TABLES
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Tabelas levadas para o banco de séries temporais
+TABLE_PREFIX = "maria_helena_"
+
+
+def source_tables(conn, prefix=TABLE_PREFIX):
+    """Tabelas do banco anexado `src` cujo nome começa com `prefix`"""
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM src.sqlite_master WHERE type = 'table' AND name LIKE ? ORDER BY name",
+        (prefix + "%",)
+    )]
+
+
+def columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def copy_table(store, conn, table):
+    """Copia `src.table` para o banco do store num único INSERT ... SELECT; devolve as linhas copiadas
+
+    Tabelas de candles (com openTime/close) ganham o schema do CandleStore, incluindo a
+    coluna symbol; as demais (estado dos indicadores, checkpoints) são recriadas com o
+    SQL de origem. Só as colunas presentes nos dois lados são copiadas, com os mesmos ids;
+    linhas já migradas são ignoradas, então o tool pode rodar de novo.
+    """
+    source = columns(conn, "src", table)
+    if {"openTime", "close"} <= set(source):
+        store.ensure_table(table)
+    else:
+        for (sql,) in conn.execute(
+            "SELECT sql FROM src.sqlite_master WHERE tbl_name = ? AND sql IS NOT NULL "
+            "ORDER BY type = 'index'", (table,)
+        ):
+            conn.execute(re.sub(r"^CREATE (TABLE|INDEX|UNIQUE INDEX) ", r"CREATE \1 IF NOT EXISTS ", sql))
+
+    target = set(columns(conn, "main", table))
+    shared = ", ".join(col for col in source if col in target)
+    before = conn.total_changes
+    conn.execute(f"""
+        INSERT OR IGNORE INTO main.{table} ({shared})
+        SELECT {shared} FROM src.{table} ORDER BY rowid
+    """)
+    return conn.total_changes - before
+
+
+def migrate(source_path=N8N_DB_PATH, target_path=DEFAULT_DB_PATH, tables=None):
+    """Copia as tabelas de candles/indicadores do banco do n8n para o banco próprio
+
+    A origem é anexada somente leitura e nunca é alterada; tudo entra numa transação e
+    as contagens são conferidas no fim. Devolve {tabela: (linhas na origem, no destino)}.
+    """
+    store = candle_store(target_path)
+    conn = store.conn
+    started = time.perf_counter()
+    result = {}
+
+    with store.lock:
+        conn.execute("ATTACH DATABASE ? AS src", (f"file:{source_path}?mode=ro",))
+        try:
+            tables = tables or source_tables(conn)
+            with store.transaction():
+                for table in tables:
+                    copied = copy_table(store, conn, table)
+                    logging.info(f"📥 {table}: {copied} linhas copiadas")
+
+            for table in tables:
+                result[table] = (
+                    conn.execute(f"SELECT COUNT(*) FROM src.{table}").fetchone()[0],
+                    conn.execute(f"SELECT COUNT(*) FROM main.{table}").fetchone()[0],
+                )
+        finally:
+            conn.execute("DETACH DATABASE src")
+        # Carga em lote: incorpora o WAL ao banco e o trunca
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    for table, (src_count, dst_count) in result.items():
+        ok = dst_count >= src_count
+        logging.info(f"{'✅' if ok else '❌'} {table}: {src_count} na origem, {dst_count} no destino")
+    logging.info(f"⏱️ Migração: {time.perf_counter() - started:.2f}s")
+    return result
+
+
+def n8n_attach_sql(db_path=DEFAULT_DB_PATH, tables=None):
+    """SQL para o n8n ler o banco de séries temporais (na mesma conexão, antes das consultas)
+
+    O banco é anexado somente leitura; as views TEMP (views persistentes não podem
+    apontar para outro banco) mantêm os nomes antigos das tabelas nas consultas dos
+    workflows e têm precedência sobre tabelas homônimas que ainda existam no n8n.
+    """
+    lines = [f"ATTACH DATABASE 'file:{db_path}?mode=ro' AS candles;"]
+    for table in tables or STORE_TABLES:
+        lines.append(f"CREATE TEMP VIEW IF NOT EXISTS {table} AS SELECT * FROM candles.{table};")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migra candles e indicadores do banco do n8n para o banco próprio")
+    parser.add_argument("--source", default=N8N_DB_PATH, help="banco do n8n (só leitura)")
+    parser.add_argument("--target", default=DEFAULT_DB_PATH, help="banco de séries temporais")
+    parser.add_argument("--table", action="append", help="tabela a migrar (padrão: todas maria_helena_*)")
+    parser.add_argument("--print-n8n-sql", action="store_true", help="só mostra o SQL de leitura para o n8n")
+    args = parser.parse_args()
+
+    if not args.print_n8n_sql:
+        logging.info("=" * 60)
+        logging.info(f"🚚 MIGRANDO {args.source} → {args.target}")
+        logging.info("=" * 60)
+        migrate(args.source, args.target, args.table)
+
+    logging.info("🔗 Leitura pelo n8n (somente leitura):")
+    print(n8n_attach_sql(args.target))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+import os
+import gzip
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+import logging
+
+from candle_store import candle_store, DEFAULT_DB_PATH
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+ARCHIVE_DIR = "/root/maria-helena-scripts/archive"
+
+
+class ResponseArchive:
+    """Arquivo das respostas brutas das APIs, em segmentos JSONL gzip por hora (UTC)
+
+    Cada resposta vira uma linha {"ts", "url", "params", "status", "body"} no segmento
+    <raiz>/AAAA/MM/DD/HH.jsonl.gz; o índice SQLite <raiz>/index.sqlite guarda host,
+    endpoint e segmento de cada uma, para o replay abrir só os segmentos necessários.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.index = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self.index.execute("PRAGMA journal_mode = WAL")
+        self.index.execute("PRAGMA synchronous = NORMAL")
+        self.index.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fetched_at REAL,
+                host TEXT,
+                path TEXT,
+                status INTEGER,
+                segment TEXT,
+                bytes INTEGER
+            )
+        """)
+        self.index.execute("CREATE INDEX IF NOT EXISTS responses_fetched_at ON responses (fetched_at)")
+        self.index.commit()
+        self._segment = None
+        self._file = None
+
+    def segment_for(self, ts):
+        """Caminho relativo do segmento que contém o instante `ts` (epoch s)"""
+        return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y/%m/%d/%H.jsonl.gz")
+
+    def _open_segment(self, segment):
+        if self._file is not None:
+            self._file.close()
+        path = os.path.join(self.root, segment)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Modo append cria um novo membro gzip; o leitor concatena os membros
+        self._file = gzip.open(path, "ab")
+        self._segment = segment
+
+    def append(self, url, params, response):
+        ts = time.time()
+        line = json.dumps({
+            "ts": ts,
+            "url": url,
+            "params": params,
+            "status": response.status_code,
+            "body": response.text,
+        }).encode() + b"\n"
+        parsed = urlparse(url)
+
+        with self.lock:
+            segment = self.segment_for(ts)
+            if segment != self._segment:
+                self._open_segment(segment)
+            self._file.write(line)
+            # Sync flush: o que já foi escrito fica legível mesmo se o processo cair
+            self._file.flush()
+
+            self.index.execute("""
+                INSERT INTO responses (fetched_at, host, path, status, segment, bytes)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (ts, parsed.netloc, parsed.path, response.status_code, segment, len(line)))
+            self.index.commit()
+
+    def records(self, start=None, end=None, host=None):
+        """Respostas arquivadas em ordem de chegada, filtradas por período (epoch s) e host"""
+        where, params = ["1 = 1"], []
+        if start is not None:
+            where.append("fetched_at >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("fetched_at < ?")
+            params.append(end)
+        if host is not None:
+            where.append("host = ?")
+            params.append(host)
+
+        with self.lock:
+            segments = [row[0] for row in self.index.execute(f"""
+                SELECT segment FROM responses WHERE {' AND '.join(where)}
+                GROUP BY segment ORDER BY MIN(fetched_at)
+            """, params)]
+            if self._file is not None:
+                self._file.flush()
+
+        for segment in segments:
+            with gzip.open(os.path.join(self.root, segment), "rb") as f:
+                try:
+                    for line in f:
+                        record = json.loads(line)
+                        if start is not None and record["ts"] < start:
+                            continue
+                        if end is not None and record["ts"] >= end:
+                            continue
+                        if host is not None and urlparse(record["url"]).netloc != host:
+                            continue
+                        yield record
+                except EOFError:
+                    # Segmento ainda aberto para escrita: termina no último flush
+                    pass
+
+    def summary(self):
+        with self.lock:
+            return self.index.execute("""
+                SELECT host, path, COUNT(*), SUM(bytes), MIN(fetched_at), MAX(fetched_at)
+                FROM responses GROUP BY host, path ORDER BY host, path
+            """).fetchall()
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._segment = None
+            self.index.close()
+
+
+def route(record, db_path, collectors):
+    """(parse, store) do coletor que originou a resposta, ou None se não houver replay para ela"""
+    from capture_binance_data import BinanceCollector
+    from capture_kraken_5min import KrakenCollector
+    from capture_kraken_historical import KrakenHistoricalCollector
+    from capture_15years_bitcoin import BitcoinHistoryCollector
+    from capture_real_data import RealMarketCollector
+
+    parsed = urlparse(record["url"])
+    params = {k: str(v) for k, v in (record.get("params") or {}).items()}
+
+    def collector(key, factory):
+        if key not in collectors:
+            collectors[key] = factory()
+        return collectors[key]
+
+    if parsed.path.endswith("/klines"):
+        c = collector(("binance", params.get("symbol"), params.get("interval")), lambda: BinanceCollector(
+            symbol=params.get("symbol", "BTCUSDT"), interval=params.get("interval", "5m"), db_path=db_path))
+        if params.get("limit") == "1":
+            return c.parse_latest, c.store_candle
+        return c.parse_klines, c.store_historical_candles
+
+    pair = params.get("pair", "XXBTZUSD")
+    if parsed.path.endswith("/OHLC") and params.get("interval") == "5":
+        c = collector(("kraken_5min", pair), lambda: KrakenCollector(db_path=db_path, pairs=[pair]))
+        # Sem `since` é a busca do último candle; com `since`, a do histórico
+        if "since" not in params:
+            return c.parse_latest, c.store_5min_candle
+        return c.parse_ohlc, c.store_multiple_5min
+
+    if parsed.path.endswith("/OHLC") and params.get("interval") == "1440":
+        c = collector(("kraken_daily", pair), lambda: KrakenHistoricalCollector(db_path=db_path, pairs=[pair]))
+        return c.parse_daily, c.store_candles
+
+    if parsed.path.endswith("/market_chart"):
+        # 15 anos (BitcoinHistoryCollector) ou janela curta (RealMarketCollector)
+        if int(params.get("days", 0)) > 365:
+            c = collector("coingecko_15y", lambda: BitcoinHistoryCollector(db_path=db_path))
+            return c.parse_market_chart, c.store_candles
+        coin = parsed.path.split("/")[-2]  # /coins/<id>/market_chart
+        c = collector(("coingecko", coin), lambda: RealMarketCollector(symbol=coin, db_path=db_path))
+        return c.parse_market_chart, c.store_multiple_candles
+
+    return None
+
+
+def replay(archive, db_path, start=None, end=None, host=None, indicators=True):
+    """Reprocessa respostas arquivadas: parse → store → indicadores, sem rede
+
+    Tudo entra numa única transação do CandleStore; os indicadores são atualizados uma
+    vez no fim. Uma resposta que falhe no parse ou na gravação (ex.: erro da Kraken no
+    corpo de um HTTP 200) é pulada com aviso, sem descartar as demais. Devolve
+    {endpoint: respostas reprocessadas}.
+    """
+    from calculate_indicators import IndicatorCalculator
+
+    store = candle_store(db_path)
+    collectors = {}
+    counts = {}
+    skipped = 0
+    failed = 0
+    started = time.perf_counter()
+
+    with store.transaction():
+        for record in archive.records(start=start, end=end, host=host):
+            handler = route(record, db_path, collectors) if record["status"] == 200 else None
+            if handler is None:
+                skipped += 1
+                continue
+
+            parse, store_candles = handler
+            endpoint = urlparse(record["url"]).path
+            try:
+                candles = parse(json.loads(record["body"]))
+                if candles and store_candles(candles) is False:
+                    raise RuntimeError("gravação recusada pelo coletor")
+            except Exception as e:
+                failed += 1
+                logging.warning(f"⚠️ Replay: resposta de {record['url']} pulada ({type(e).__name__}: {str(e)})")
+                continue
+            counts[endpoint] = counts.get(endpoint, 0) + 1
+
+    logging.info(f"⏩ Replay: {sum(counts.values())} respostas em {time.perf_counter() - started:.2f}s "
+                 f"({skipped} sem replay: erro HTTP ou endpoint sem coletor; {failed} com falha no parse/gravação)")
+
+    if indicators:
+        with store.lock:
+            IndicatorCalculator(db_path=db_path).update_indicators(conn=store.conn)
+    return counts
+
+
+def _epoch(value):
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arquivo de respostas brutas das APIs (listagem e replay)")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--replay", action="store_true", help="reprocessa as respostas no banco")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--start", default=None, help="ISO 8601 (ex.: 2024-01-01T00:00)")
+    parser.add_argument("--end", default=None, help="ISO 8601, exclusivo")
+    parser.add_argument("--host", default=None, help="ex.: api.kraken.com")
+    parser.add_argument("--no-indicators", action="store_true", help="não recalcula indicadores no fim")
+    args = parser.parse_args()
+
+    archive = ResponseArchive(args.archive_dir)
+    try:
+        if args.replay:
+            replay(archive, args.db_path, start=_epoch(args.start), end=_epoch(args.end),
+                   host=args.host, indicators=not args.no_indicators)
+            return
+
+        for host, path, count, size, first, last in archive.summary():
+            logging.info(f"📦 {host}{path}: {count} respostas, {size / 2**20:.1f} MB, "
+                         f"{datetime.fromtimestamp(first)} → {datetime.fromtimestamp(last)}")
+    finally:
+        archive.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 #!/bin/bash
 
-DB_PATH="/root/.n8n/database.sqlite"
+DB_PATH="/root/maria-helena-scripts/candles.sqlite"
 PYTHON_ENV="/root/maria-helena-env/bin/python3"
 SCRIPT_DIR="/root/maria-helena-scripts"
 
 source /root/maria-helena-env/bin/activate
 
+# Gravações pelo escritor único (ingest_queue.py, sem argumentos), se estiver no ar; sem ele, grava direto
+export MARIA_HELENA_INGEST_SOCKET="$SCRIPT_DIR/ingest.sock"
+
 echo "🚀 Iniciando coleta de dados..."
 $PYTHON_ENV $SCRIPT_DIR/capture_binance_data.py
 
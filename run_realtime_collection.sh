@@ -6,6 +6,9 @@ LOG_FILE="/root/maria-helena-scripts/collection.log"
 
 source /root/maria-helena-env/bin/activate
 
+# Gravações pelo escritor único (ingest_queue.py, sem argumentos), se estiver no ar; sem ele, grava direto
+export MARIA_HELENA_INGEST_SOCKET="$SCRIPT_DIR/ingest.sock"
+
 # Rodar coleta
 $PYTHON_ENV $SCRIPT_DIR/capture_real_data.py >> $LOG_FILE 2>&1
 
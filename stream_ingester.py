@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime, timezone
+import websockets
+import logging
+
+from http_client import shared_client
+from candle_store import candle_store, DEFAULT_DB_PATH, INTERVAL_TABLES
+from candle_normalizer import make_candle, canonical_symbol
+from capture_binance_data import BinanceCollector, WeightBudget, INTERVAL_MS, KLINES_PAGE
+from capture_kraken_5min import KrakenCollector
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+# Reconexão com backoff exponencial (1s, 2s, 4s, ... até 30s)
+RECONNECT_BASE = 1.0
+RECONNECT_MAX = 30.0
+
+# Sem nenhuma mensagem nesse tempo a conexão é dada como morta e refeita
+STALE_TIMEOUT = 60.0
+
+# Folga após o fim do intervalo antes de fechar um candle da Kraken pelo relógio
+CLOSE_GRACE = 0.25
+
+
+class CandleAssembler:
+    """Monta o candle em andamento a partir das atualizações do feed
+
+    `update` devolve os candles que fecharam: o anterior quando chega um intervalo novo,
+    ou o próprio candle quando o feed marca o fechamento (kline da Binance). `expire`
+    fecha pelo relógio, para feeds sem marcação de fechamento (OHLC da Kraken).
+    Nesses feeds, atualizações de um candle já fechado são devolvidas como correção;
+    nos demais só contam se vierem marcadas como fechadas.
+    """
+
+    def __init__(self, close_by_clock=False):
+        self.close_by_clock = close_by_clock
+        self.current = None
+        self.closed = False
+
+    def update(self, candle, closed=False):
+        current = self.current
+        if current is not None and candle["openTime"] < current["openTime"]:
+            return [candle] if closed or self.close_by_clock else []
+
+        emitted = []
+        if current is not None and candle["openTime"] > current["openTime"] and not self.closed:
+            emitted.append(current)
+        elif current is not None and candle["openTime"] == current["openTime"] and self.closed:
+            closed = True
+
+        self.current = candle
+        self.closed = closed
+        if closed:
+            emitted.append(candle)
+        return emitted
+
+    def expire(self, now_ms):
+        if self.current is None or self.closed or now_ms < self.current["closeTime"]:
+            return []
+        self.closed = True
+        return [self.current]
+
+
+class BinanceKlineFeed:
+    """Streams de klines da Binance (<symbol>@kline_<interval>), com campo `x` de fechamento
+
+    Todos os pares vão numa única conexão (stream combinada: /stream?streams=a/b/...).
+    """
+
+    name = "binance"
+    url = "wss://stream.binance.com:9443/stream"
+    close_by_clock = False
+
+    def __init__(self, symbols=("BTCUSDT",), interval="5m", url=None, rest_url=None):
+        # Coletor REST por par canônico, para o preenchimento de lacunas
+        self.collectors = {canonical_symbol(s): BinanceCollector(symbol=s, interval=interval) for s in symbols}
+        if rest_url:
+            for collector in self.collectors.values():
+                collector.api_url = rest_url
+        self.symbols = list(self.collectors)
+        self.table = INTERVAL_TABLES[interval]
+        self.interval_ms = INTERVAL_MS[interval]
+        self.budget = WeightBudget()
+        streams = "/".join(f"{s.lower()}@kline_{interval}" for s in symbols)
+        self.url = url or f"{self.url}?streams={streams}"
+
+    def subscribe_messages(self):
+        # As streams vão na própria URL
+        return []
+
+    def parse(self, message):
+        """Mensagem do feed -> [(candle, fechado)]"""
+        # Stream combinada embrulha o evento em {"stream", "data"}
+        message = message.get("data", message)
+        if message.get("e") != "kline":
+            return []
+        k = message["k"]
+        # Volume em quote (USDT), como from_binance_kline
+        return [(make_candle(k["t"], k["T"], k["o"], k["h"], k["l"], k["c"], k["q"],
+                             canonical_symbol(message["s"])), k["x"])]
+
+    def fetch_gap(self, symbol, start_ms, end_ms):
+        """Candles fechados de `symbol` em [start_ms, end_ms) via REST, página a página"""
+        candles = []
+        while start_ms < end_ms:
+            page = self.collectors[symbol].fetch_range(self.budget, start_ms, end_ms)
+            if not page:
+                break
+            candles.extend(page)
+            start_ms = page[-1]["openTime"] + self.interval_ms
+            if len(page) < KLINES_PAGE:
+                break
+        return candles
+
+
+class KrakenOHLCFeed:
+    """Canal ohlc da API WebSocket v2 da Kraken (sem marcação de fechamento)
+
+    Uma única assinatura cobre todos os pares (o campo `symbol` aceita uma lista).
+    """
+
+    name = "kraken"
+    url = "wss://ws.kraken.com/v2"
+    table = "maria_helena_candles_5min"
+    close_by_clock = True
+
+    # Nomes da API REST para os ativos que o WebSocket v2 chama pelo ticker comum
+    REST_ASSETS = {"BTC": "XBT", "DOGE": "XDG"}
+
+    def __init__(self, symbols=("BTC/USD",), interval=5, url=None, rest_url=None):
+        self.ws_symbols = list(symbols)
+        # Par REST de cada par canônico: "BTC/USD" -> "XBTUSD"
+        rest_pairs = {
+            canonical_symbol(s): "".join(self.REST_ASSETS.get(a, a) for a in s.split("/"))
+            for s in symbols
+        }
+        self.collector = KrakenCollector(pairs=list(rest_pairs.values()))
+        if rest_url:
+            self.collector.api_url = rest_url
+        self.rest_pairs = rest_pairs
+        self.symbols = list(rest_pairs)
+        self.interval = interval
+        self.interval_ms = interval * 60000
+        self.url = url or self.url
+
+    def subscribe_messages(self):
+        return [{
+            "method": "subscribe",
+            "params": {"channel": "ohlc", "symbol": self.ws_symbols, "interval": self.interval},
+        }]
+
+    def parse(self, message):
+        """Mensagem do feed -> [(candle, fechado)]; snapshot e update trazem a mesma estrutura"""
+        if message.get("channel") != "ohlc" or message.get("type") not in ("snapshot", "update"):
+            return []
+
+        updates = []
+        for row in message.get("data", []):
+            # interval_begin vem em RFC3339 com nanossegundos: "2024-01-01T12:05:00.000000000Z"
+            begin = datetime.strptime(row["interval_begin"][:19], "%Y-%m-%dT%H:%M:%S")
+            open_time = int(begin.replace(tzinfo=timezone.utc).timestamp() * 1000)
+            updates.append((make_candle(open_time, open_time + self.interval_ms, row["open"], row["high"],
+                                        row["low"], row["close"], row["volume"],
+                                        canonical_symbol(row["symbol"])), False))
+        return sorted(updates, key=lambda u: u[0]["openTime"])
+
+    def fetch_gap(self, symbol, start_ms, end_ms):
+        """Candles fechados de `symbol` em [start_ms, end_ms) via /OHLC (só os 720 mais recentes)"""
+        pair = self.rest_pairs[symbol]
+        data = shared_client().get_json(
+            f"{self.collector.api_url}/OHLC",
+            # `since` é exclusivo: parte do candle anterior
+            params=self.collector._params((start_ms - self.interval_ms) // 1000, pair),
+            timeout=10
+        )
+        candles = [c for c in self.collector.parse_ohlc(data, pair) if start_ms <= c["openTime"] < end_ms]
+        if end_ms - start_ms > 720 * self.interval_ms:
+            logging.warning(f"⚠️ Lacuna Kraken {symbol} maior que 720 candles desde {start_ms}: "
+                            "use kraken_backfill.py")
+        return candles
+
+
+FEEDS = {
+    "binance": BinanceKlineFeed,
+    "kraken": KrakenOHLCFeed,
+}
+
+
+class StreamIngester:
+    """Ingestão contínua dos feeds WebSocket nas tabelas de candles
+
+    Cada feed mantém o candle em andamento de cada par em memória e grava no fechamento,
+    com commit imediato. A cada (re)conexão a lacuna desde o último candle gravado de cada
+    par é preenchida via REST, em paralelo com a leitura do stream.
+    """
+
+    def __init__(self, feeds, db_path=DEFAULT_DB_PATH, record=None):
+        self.feeds = feeds
+        self.db_path = db_path
+        self.assemblers = {
+            (feed.name, symbol): CandleAssembler(feed.close_by_clock)
+            for feed in feeds for symbol in feed.symbols
+        }
+        self.record = open(record, "a", buffering=1) if record else None
+        self.started = time.monotonic()
+        self.db = candle_store(db_path)
+
+    @property
+    def current(self):
+        """Candles em andamento por (feed, par)"""
+        return {key: assembler.current for key, assembler in self.assemblers.items()}
+
+    def store(self, feed, candles, replace=True):
+        """Grava candles fechados num único commit; devolve (inseridos, atualizados)
+
+        Do stream o valor final substitui o que houver (ex.: candle parcial gravado pelo
+        polling). O preenchimento via REST (replace=False) faz merge: corrige só os candles
+        que diferem do já gravado, sem reescrever os iguais.
+        """
+        if replace:
+            return self.db.insert(feed.table, candles, conflict="update"), 0
+        inserted, updated, _ = self.db.merge(feed.table, candles)
+        return inserted, updated
+
+    def emit(self, feed, candles):
+        if not candles:
+            return
+        self.store(feed, candles)
+        last = candles[-1]
+        latency = time.time() * 1000 - last["closeTime"]
+        logging.info(
+            f"💾 {feed.name} {last['symbol']} {datetime.fromtimestamp(last['openTime'] / 1000)} fechado "
+            f"@ {last['close']:.2f} ({len(candles)} candle(s), {latency:.0f} ms após o fechamento)"
+        )
+
+    async def fill_gaps(self, feed):
+        """Preenche as lacunas de todos os pares do feed"""
+        await asyncio.gather(*(self.fill_gap(feed, symbol) for symbol in feed.symbols))
+
+    async def fill_gap(self, feed, symbol):
+        """Preenche via REST o intervalo entre o último candle gravado do par e o candle atual
+
+        O último candle gravado entra na busca: se era parcial (polling, ou o stream caiu
+        antes do fechamento), o valor fechado da REST o substitui.
+        """
+        last = self.db.last_open_time(feed.table, symbol)
+        if last is None:
+            logging.info(f"ℹ️ {feed.table} sem {symbol}: sem lacuna para preencher ({feed.name})")
+            return
+
+        now_ms = int(time.time() * 1000)
+        start_ms = last
+        end_ms = now_ms - now_ms % feed.interval_ms
+        if start_ms >= end_ms:
+            return
+
+        try:
+            candles = await asyncio.to_thread(feed.fetch_gap, symbol, start_ms, end_ms)
+        except Exception as e:
+            logging.error(f"❌ Falha ao preencher lacuna {feed.name} {symbol}: {str(e)}")
+            return
+        inserted, updated = self.store(feed, candles, replace=False) if candles else (0, 0)
+        logging.info(f"🩹 Lacuna {feed.name} {symbol}: {len(candles)} candles via REST "
+                     f"({inserted} novos, {updated} corrigidos)")
+
+    async def close_by_clock(self, feed):
+        """Fecha o candle em andamento de cada par assim que o intervalo termina"""
+        assemblers = [self.assemblers[feed.name, symbol] for symbol in feed.symbols]
+        while True:
+            # Acorda no fechamento mais próximo entre os pares
+            pending = [a.current["closeTime"] for a in assemblers if a.current is not None and not a.closed]
+            wait = CLOSE_GRACE
+            if pending:
+                wait = max(min(pending) / 1000 - time.time(), 0) + CLOSE_GRACE
+            await asyncio.sleep(wait)
+            now_ms = int(time.time() * 1000)
+            try:
+                self.emit(feed, [candle for a in assemblers for candle in a.expire(now_ms)])
+            except Exception as e:
+                # O preenchimento da próxima reconexão recupera o candle pelo REST
+                logging.error(f"❌ {feed.name}: falha ao gravar candles fechados pelo relógio: {str(e)}")
+
+    def handle(self, feed, raw):
+        if self.record:
+            self.record.write(json.dumps({
+                "at": round(time.monotonic() - self.started, 6), "feed": feed.name, "data": raw,
+            }) + "\n")
+
+        try:
+            updates = feed.parse(json.loads(raw))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            # Mensagem malformada ou fora do formato esperado: descarta só ela
+            logging.warning(f"⚠️ {feed.name}: mensagem ignorada ({type(e).__name__}: {str(e)}): {str(raw)[:200]}")
+            return
+
+        closed = []
+        for candle, is_closed in updates:
+            assembler = self.assemblers.get((feed.name, candle["symbol"]))
+            if assembler is not None:
+                closed.extend(assembler.update(candle, is_closed))
+        self.emit(feed, closed)
+
+    async def run_feed(self, feed):
+        """Loop de conexão de um feed: reconecta com backoff e preenche a lacuna a cada vez"""
+        delay = RECONNECT_BASE
+        clock = asyncio.create_task(self.close_by_clock(feed)) if feed.close_by_clock else None
+        try:
+            while True:
+                try:
+                    async with websockets.connect(feed.url) as ws:
+                        logging.info(f"🔌 {feed.name} conectado: {feed.url}")
+                        for message in feed.subscribe_messages():
+                            await ws.send(json.dumps(message))
+                        gap = asyncio.create_task(self.fill_gaps(feed))
+
+                        try:
+                            while True:
+                                raw = await asyncio.wait_for(ws.recv(), STALE_TIMEOUT)
+                                self.handle(feed, raw)
+                                delay = RECONNECT_BASE
+                        finally:
+                            # A próxima conexão refaz o preenchimento
+                            gap.cancel()
+
+                except (websockets.WebSocketException, OSError, asyncio.TimeoutError) as e:
+                    logging.warning(f"⚠️ {feed.name} desconectado ({type(e).__name__}), "
+                                    f"reconectando em {delay:.0f}s")
+                except Exception as e:
+                    # Ex.: falha ao gravar no banco; a reconexão preenche o que faltou via REST
+                    logging.error(f"❌ {feed.name}: erro inesperado ({type(e).__name__}: {str(e)}), "
+                                  f"reconectando em {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+        finally:
+            if clock:
+                clock.cancel()
+
+    async def run(self, duration=None):
+        """Roda todos os feeds até ser interrompido (ou por `duration` segundos)"""
+        try:
+            tasks = asyncio.gather(*(self.run_feed(feed) for feed in self.feeds))
+            try:
+                await asyncio.wait_for(tasks, duration)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            if self.record:
+                self.record.close()
+
+
+async def serve_replay(path, host="localhost", port=8765, speed=1.0):
+    """Stand-in local dos feeds: reenvia mensagens gravadas com `--record`
+
+    Cada conexão em ws://host:port/<feed> recebe as mensagens daquele feed no ritmo
+    original (dividido por `speed`) e é encerrada no fim, o que exercita a reconexão.
+    """
+    with open(path) as f:
+        recorded = [json.loads(line) for line in f if line.strip()]
+
+    async def handler(ws):
+        feed = ws.request.path.strip("/")
+        messages = [m for m in recorded if m.get("feed", feed) == feed]
+        logging.info(f"▶️ Replay de {len(messages)} mensagens ({feed})")
+
+        previous = messages[0]["at"] if messages else 0.0
+        for message in messages:
+            await asyncio.sleep(max(message["at"] - previous, 0) / speed)
+            previous = message["at"]
+            await ws.send(message["data"])
+
+    async with websockets.serve(handler, host, port):
+        logging.info(f"🎞️ Replay em ws://{host}:{port}/<feed>")
+        await asyncio.Future()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestão contínua de candles via WebSocket")
+    parser.add_argument("--feeds", nargs="+", default=["binance", "kraken"], choices=list(FEEDS))
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH)
+    parser.add_argument("--ws-url", default=None,
+                        help="base alternativa dos feeds (ex.: ws://localhost:8765 para o replay)")
+    parser.add_argument("--rest-url", nargs=2, action="append", metavar=("FEED", "URL"), default=[],
+                        help="URL REST alternativa para o preenchimento de lacunas de um feed")
+    parser.add_argument("--binance-symbols", nargs="+", default=["BTCUSDT"], help="ex.: BTCUSDT ETHUSDT")
+    parser.add_argument("--kraken-symbols", nargs="+", default=["BTC/USD"], help="ex.: BTC/USD ETH/USD")
+    parser.add_argument("--record", default=None, help="grava as mensagens recebidas (JSONL)")
+    parser.add_argument("--duration", type=float, default=None, help="encerra após N segundos")
+    parser.add_argument("--replay", default=None, help="serve um arquivo gravado em vez de ingerir")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.replay:
+        asyncio.run(serve_replay(args.replay, port=args.port, speed=args.speed))
+        return
+
+    rest_urls = dict(args.rest_url)
+    symbols = {"binance": args.binance_symbols, "kraken": args.kraken_symbols}
+    feeds = [
+        FEEDS[name](
+            symbols=symbols[name],
+            url=f"{args.ws_url.rstrip('/')}/{name}" if args.ws_url else None,
+            rest_url=rest_urls.get(name),
+        )
+        for name in args.feeds
+    ]
+
+    logging.info("=" * 60)
+    logging.info(f"🚀 INGESTÃO WEBSOCKET: {', '.join(args.feeds)}")
+    logging.info("=" * 60)
+
+    ingester = StreamIngester(feeds, db_path=args.db_path, record=args.record)
+    try:
+        asyncio.run(ingester.run(duration=args.duration))
+    except KeyboardInterrupt:
+        logging.info("🛑 Ingestão interrompida")
+
+if __name__ == "__main__":
+    main()
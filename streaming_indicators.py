@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+import math
+import time
+from collections import deque
+import logging
+
+from candle_normalizer import DEFAULT_SYMBOL
+from candle_store import candle_store, DEFAULT_DB_PATH
+
+logging.basicConfig(level=logging.INFO)
+
+NAN = float("nan")
+
+
+class StreamingEMA:
+    """EMA recursiva, igual a ewm(span=period, adjust=False)"""
+
+    def __init__(self, period):
+        self.alpha = 2.0 / (period + 1)
+        self.value = None
+
+    def update(self, x):
+        if self.value is None:
+            self.value = x
+        else:
+            self.value = self.alpha * x + (1 - self.alpha) * self.value
+        return self.value
+
+    def snapshot(self):
+        return {"value": self.value}
+
+    def restore(self, state):
+        self.value = state["value"]
+
+
+class RollingWindow:
+    """Janela móvel com soma e soma dos quadrados acumuladas (média e desvio em O(1))"""
+
+    def __init__(self, period):
+        self.period = period
+        self.values = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.updates = 0
+
+    def update(self, x):
+        self.values.append(x)
+        self.total += x
+        self.total_sq += x * x
+        if len(self.values) > self.period:
+            old = self.values.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+
+        # Ressoma a janela a cada `period` candles para não acumular erro de arredondamento
+        self.updates += 1
+        if self.updates % self.period == 0:
+            self.total = math.fsum(self.values)
+            self.total_sq = math.fsum(v * v for v in self.values)
+
+    @property
+    def full(self):
+        return len(self.values) == self.period
+
+    def mean(self):
+        return self.total / self.period if self.full else NAN
+
+    def std(self):
+        """Desvio padrão amostral (ddof=1), como rolling().std()"""
+        if not self.full:
+            return NAN
+        n = self.period
+        variance = (self.total_sq - self.total * self.total / n) / (n - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    def snapshot(self):
+        return {"values": list(self.values), "updates": self.updates}
+
+    def restore(self, state):
+        self.values = deque(state["values"])
+        self.total = math.fsum(self.values)
+        self.total_sq = math.fsum(v * v for v in self.values)
+        self.updates = state["updates"]
+
+
+class RollingExtreme:
+    """Máximo (ou mínimo) móvel com deque monotônica: O(1) amortizado por candle"""
+
+    def __init__(self, period, mode="max"):
+        self.period = period
+        self.mode = mode
+        self.window = deque()  # pares (índice, valor), valores monotônicos
+        self.index = -1
+
+    def update(self, x):
+        self.index += 1
+        if self.mode == "max":
+            while self.window and self.window[-1][1] <= x:
+                self.window.pop()
+        else:
+            while self.window and self.window[-1][1] >= x:
+                self.window.pop()
+        self.window.append((self.index, x))
+        if self.window[0][0] <= self.index - self.period:
+            self.window.popleft()
+
+    def value(self):
+        if self.index + 1 < self.period:
+            return NAN
+        return self.window[0][1]
+
+    def snapshot(self):
+        return {"window": [list(item) for item in self.window], "index": self.index}
+
+    def restore(self, state):
+        self.window = deque(tuple(item) for item in state["window"])
+        self.index = state["index"]
+
+
+class StreamingIndicators:
+    """Indicadores do IndicatorCalculator atualizados candle a candle em tempo constante"""
+
+    def __init__(self, ema_period=200, sma_short=20, sma_long=50, rsi_period=14,
+                 atr_period=14, bb_period=20, bb_std=2, macd_fast=12, macd_slow=26,
+                 macd_signal=9, donchian_period=20):
+        self.bb_std = bb_std
+        self.ema = StreamingEMA(ema_period)
+        self.sma_short = RollingWindow(sma_short)
+        self.sma_long = RollingWindow(sma_long)
+        self.bb = RollingWindow(bb_period)
+        self.gains = RollingWindow(rsi_period)
+        self.losses = RollingWindow(rsi_period)
+        self.true_range = RollingWindow(atr_period)
+        self.macd_fast = StreamingEMA(macd_fast)
+        self.macd_slow = StreamingEMA(macd_slow)
+        self.macd_signal = StreamingEMA(macd_signal)
+        self.donchian_high = RollingExtreme(donchian_period, "max")
+        self.donchian_low = RollingExtreme(donchian_period, "min")
+        self.obv = 0.0
+        self.prev_close = None
+        self.last_open_time = None
+
+    def _components(self):
+        return {
+            "ema": self.ema,
+            "sma_short": self.sma_short,
+            "sma_long": self.sma_long,
+            "bb": self.bb,
+            "gains": self.gains,
+            "losses": self.losses,
+            "true_range": self.true_range,
+            "macd_fast": self.macd_fast,
+            "macd_slow": self.macd_slow,
+            "macd_signal": self.macd_signal,
+            "donchian_high": self.donchian_high,
+            "donchian_low": self.donchian_low,
+        }
+
+    def update(self, candle):
+        """Processa um candle fechado e devolve os indicadores (NaN enquanto a janela enche)"""
+        close = candle["close"]
+        high = candle["high"]
+        low = candle["low"]
+        volume = candle["volume"]
+        prev_close = self.prev_close
+
+        # RSI: a primeira variação (sem candle anterior) conta como 0, igual ao batch
+        delta = 0.0 if prev_close is None else close - prev_close
+        self.gains.update(delta if delta > 0 else 0.0)
+        self.losses.update(-delta if delta < 0 else 0.0)
+
+        # ATR: sem candle anterior o true range é só high - low
+        if prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        self.true_range.update(tr)
+
+        # OBV: volume negativo só quando o fechamento cai
+        if prev_close is not None and close < prev_close:
+            self.obv -= volume
+        else:
+            self.obv += volume
+
+        self.sma_short.update(close)
+        self.sma_long.update(close)
+        self.bb.update(close)
+        self.donchian_high.update(high)
+        self.donchian_low.update(low)
+
+        macd = self.macd_fast.update(close) - self.macd_slow.update(close)
+        signal = self.macd_signal.update(macd)
+
+        self.prev_close = close
+        self.last_open_time = candle.get("openTime", self.last_open_time)
+
+        return {
+            "ema_200": self.ema.update(close),
+            "sma_short": self.sma_short.mean(),
+            "sma_long": self.sma_long.mean(),
+            "rsi_14": self._rsi(),
+            "atr_14": self.true_range.mean(),
+            "bb_upper": self.bb.mean() + self.bb_std * self.bb.std(),
+            "bb_lower": self.bb.mean() - self.bb_std * self.bb.std(),
+            "macd": macd,
+            "macd_signal": signal,
+            "donchian_high": self.donchian_high.value(),
+            "donchian_low": self.donchian_low.value(),
+            "obv": self.obv,
+        }
+
+    def _rsi(self):
+        gain = self.gains.mean()
+        loss = self.losses.mean()
+        if math.isnan(gain) or (gain == 0 and loss == 0):
+            return NAN
+        if loss == 0:
+            return 100.0
+        return 100 - (100 / (1 + gain / loss))
+
+    def warm_up(self, candles):
+        """Alimenta candles históricos e devolve os indicadores do último"""
+        result = None
+        for candle in candles:
+            result = self.update(candle)
+        return result
+
+    def snapshot(self):
+        """Estado completo em dict serializável (JSON)"""
+        state = {name: part.snapshot() for name, part in self._components().items()}
+        state["obv"] = self.obv
+        state["prev_close"] = self.prev_close
+        state["last_open_time"] = self.last_open_time
+        return state
+
+    def restore(self, state):
+        """Restaura um estado gerado por snapshot()"""
+        for name, part in self._components().items():
+            part.restore(state[name])
+        self.obv = state["obv"]
+        self.prev_close = state["prev_close"]
+        self.last_open_time = state["last_open_time"]
+        return self
+
+
+def load_candles(db_path, interval, limit, symbol=DEFAULT_SYMBOL):
+    """Lê os últimos `limit` candles de `symbol` no intervalo, em ordem cronológica"""
+    columns = candle_store(db_path).range(symbol, interval, limit=limit)
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*(columns[key].tolist() for key in keys))]
+
+
+def main():
+    db_path = DEFAULT_DB_PATH
+
+    try:
+        candles = load_candles(db_path, "5m", 1000)
+    except Exception as e:
+        logging.error(f"❌ Erro ao ler candles 5min: {str(e)}")
+        return
+
+    if not candles:
+        logging.warning("⚠️ Nenhum candle 5min no banco")
+        return
+
+    engine = StreamingIndicators()
+    start = time.perf_counter()
+    latest = engine.warm_up(candles)
+    elapsed = time.perf_counter() - start
+
+    logging.info(f"📊 {len(candles)} candles processados ({elapsed / len(candles) * 1e6:.1f} µs/candle)")
+    for name, value in latest.items():
+        logging.info(f"   {name}: {value:.2f}")
+
+if __name__ == "__main__":
+    main()